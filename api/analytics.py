@@ -0,0 +1,322 @@
+"""Analítica de compras por paciente: valor de vida, frecuencia y segmentos RFM.
+
+Todo sale de los contadores que mantiene api.patient_stats, sin leer el
+histórico de ventas. Los puntajes RFM (1 a 5) son quintiles entre los
+pacientes con compras: recencia por el día de la última compra,
+frecuencia por la cantidad de ventas y monto por el gasto total. Como los
+segmentos dependen solo de recencia y frecuencia (el mapa RFM clásico),
+sus cortes y los totales por segmento salen de PatientActivityRollup,
+que tiene una fila por (ventas, día de la última compra) y no crece con
+la cantidad de pacientes.
+"""
+from bisect import bisect_left
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import serializers
+from .models import Patient, PatientActivityRollup
+
+SCORES = 5
+TOP_DEFAULT = 10
+TOP_MAX = 100
+DAYS_PER_MONTH = 30.44
+
+SEGMENT_CHOICES = [
+    ('campeones', 'Campeones'),
+    ('leales', 'Leales'),
+    ('nuevos', 'Nuevos'),
+    ('potenciales', 'Potenciales'),
+    ('en_riesgo', 'En riesgo'),
+    ('hibernando', 'Hibernando'),
+    ('perdidos', 'Perdidos'),
+    ('sin_compras', 'Sin compras'),
+]
+SEGMENT_LABELS = dict(SEGMENT_CHOICES)
+
+ORDERINGS = {
+    'spend': ['-lifetime_spend', 'id'],
+    'frequency': ['-sale_count', 'id'],
+    'recency': [F('last_purchase_at').desc(nulls_last=True), 'id'],
+}
+
+
+class AnalyticsError(ValueError):
+    pass
+
+
+def segment_for(recency, frequency):
+    if recency >= 4 and frequency >= 4:
+        return 'campeones'
+    if recency >= 3 and frequency >= 3:
+        return 'leales'
+    if recency >= 4 and frequency == 1:
+        return 'nuevos'
+    if recency >= 3:
+        return 'potenciales'
+    if frequency >= 3:
+        return 'en_riesgo'
+    if recency == 2:
+        return 'hibernando'
+    return 'perdidos'
+
+
+def cells():
+    return list(PatientActivityRollup.objects.filter(patients__gt=0).values_list(
+        'sale_count', 'last_purchase_date', 'patients', 'lifetime_spend',
+    ))
+
+
+def _weighted_cuts(weights):
+    """Cortes de quintil de una distribución dada como ``{valor: pacientes}``"""
+    total = sum(weights.values())
+    if not total:
+        return []
+    positions = [total * position // SCORES for position in range(1, SCORES)]
+    cuts = []
+    seen = 0
+    for value in sorted(weights):
+        seen += weights[value]
+        while positions and positions[0] < seen:
+            cuts.append(value)
+            positions.pop(0)
+    return cuts
+
+
+def thresholds(cells):
+    """Cortes ascendentes de los quintiles de cada métrica
+
+    Recencia y frecuencia salen del resumen; el monto, que no se puede
+    agrupar, con una consulta por quintil sobre el índice de la columna.
+    """
+    recency, frequency = {}, {}
+    for sale_count, last_date, count, _ in cells:
+        recency[last_date] = recency.get(last_date, 0) + count
+        frequency[sale_count] = frequency.get(sale_count, 0) + count
+    ordered = (
+        Patient.objects
+        .filter(lifetime_spend__gt=0)
+        .order_by('lifetime_spend')
+        .values_list('lifetime_spend', flat=True)
+    )
+    total = ordered.count()
+    return {
+        'recency': _weighted_cuts(recency),
+        'frequency': _weighted_cuts(frequency),
+        'monetary': (
+            [ordered[total * position // SCORES] for position in range(1, SCORES)]
+            if total
+            else []
+        ),
+    }
+
+
+def score(value, cuts):
+    """1 más los cortes por debajo del valor; si empata con un corte, queda abajo"""
+    return 1 + bisect_left(cuts, value)
+
+
+def _next_day(value):
+    return timezone.make_aware(datetime.combine(value + timedelta(days=1), time.min))
+
+
+# Columna de cada métrica y el menor valor de la columna que supera un corte
+BOUNDS = {
+    'recency': ('last_purchase_at', _next_day),
+    'frequency': ('sale_count', lambda value: value + 1),
+}
+
+
+def _runs(values):
+    """Tramos contiguos ``(desde, hasta)`` de una lista ordenada de puntajes"""
+    runs = []
+    for value in values:
+        if runs and runs[-1][1] == value - 1:
+            runs[-1] = (runs[-1][0], value)
+        else:
+            runs.append((value, value))
+    return runs
+
+
+def _score_range(metric, cuts, low, high):
+    """Pacientes con puntaje entre ``low`` y ``high`` en la métrica, o None si no hay"""
+    field, bound = BOUNDS[metric]
+    if low > len(cuts) + 1:
+        return None
+    bounds = [bound(cut) for cut in cuts]
+    start = bounds[low - 2] if low > 1 else None
+    end = bounds[high - 1] if high <= len(bounds) else None
+    if start is not None and end is not None and start >= end:
+        return None
+    lookup = Q()
+    if start is not None:
+        lookup &= Q(**{f'{field}__gte': start})
+    if end is not None:
+        lookup &= Q(**{f'{field}__lt': end})
+    return lookup
+
+
+def _segment_filter(segment, cuts):
+    """Una condición por rango de frecuencia y de recencia del segmento"""
+    recency_by_frequency = [
+        (
+            frequency,
+            tuple(
+                _runs([
+                    r
+                    for r in range(1, SCORES + 1)
+                    if segment_for(r, frequency) == segment
+                ])
+            ),
+        )
+        for frequency in range(1, SCORES + 1)
+    ]
+    lookups = []
+    for low, high in _runs([
+        frequency for frequency, runs in recency_by_frequency if runs
+    ]):
+        # Frecuencias contiguas con los mismos tramos de recencia comparten la condición
+        group = [
+            runs for frequency, runs in recency_by_frequency if low <= frequency <= high
+        ]
+        start = low
+        for position in range(1, len(group) + 1):
+            if position < len(group) and group[position] == group[position - 1]:
+                continue
+            frequency_range = _score_range(
+                'frequency', cuts['frequency'], start, low + position - 1
+            )
+            for recency_low, recency_high in group[position - 1]:
+                recency_range = _score_range(
+                    'recency', cuts['recency'], recency_low, recency_high
+                )
+                if frequency_range is not None and recency_range is not None:
+                    lookups.append(frequency_range & recency_range)
+            start = low + position
+    return reduce(or_, lookups, Q(pk__in=[]))
+
+
+def segments(cells, cuts):
+    """Pacientes, ventas y gasto por segmento a partir del resumen"""
+    totals = {
+        code: {'patients': 0, 'sales': 0, 'lifetime_spend': Decimal('0')}
+        for code, _ in SEGMENT_CHOICES
+    }
+    for sale_count, last_date, count, lifetime_spend in cells:
+        entry = totals[
+            segment_for(
+                score(last_date, cuts['recency']), score(sale_count, cuts['frequency'])
+            )
+        ]
+        entry['patients'] += count
+        entry['sales'] += sale_count * count
+        entry['lifetime_spend'] += lifetime_spend
+    customers = sum(entry['patients'] for entry in totals.values())
+    totals['sin_compras']['patients'] = Patient.objects.count() - customers
+    return totals
+
+
+def patients(cuts, segment='', order='spend'):
+    """Pacientes con sus contadores, opcionalmente de un segmento, en el orden pedido"""
+    if order not in ORDERINGS:
+        raise AnalyticsError(
+            f'Orden no soportado "{order}", use {", ".join(ORDERINGS)}'
+        )
+    queryset = Patient.objects.all()
+    if segment == 'sin_compras':
+        queryset = queryset.filter(sale_count=0)
+    elif segment:
+        if segment not in SEGMENT_LABELS:
+            raise AnalyticsError(
+                f'Segmento desconocido "{segment}", use {", ".join(SEGMENT_LABELS)}'
+            )
+        queryset = queryset.filter(sale_count__gt=0).filter(
+            _segment_filter(segment, cuts)
+        )
+    return serializers.PATIENT_ANALYTICS.values(queryset.order_by(*ORDERINGS[order]))
+
+
+def top_patients(top):
+    return serializers.PATIENT_ANALYTICS.values(
+        Patient.objects.order_by(*ORDERINGS['spend'])[:top]
+    )
+
+
+def _patient_data(rows, cuts, now):
+    data = serializers.PATIENT_ANALYTICS.serialize(rows)
+    for patient, row in zip(data, rows, strict=True):
+        count = row['sale_count']
+        if not count:
+            patient.update({
+                'average_ticket': 0.0,
+                'purchases_per_month': 0.0,
+                'days_since_last_purchase': None,
+                'rfm': None,
+                'segment': SEGMENT_LABELS['sin_compras'],
+            })
+            continue
+        rfm = {
+            'recency': score(
+                timezone.localtime(row['last_purchase_at']).date(), cuts['recency']
+            ),
+            'frequency': score(row['sale_count'], cuts['frequency']),
+            'monetary': score(row['lifetime_spend'], cuts['monetary']),
+        }
+        months = max(1.0, (now - row['first_purchase_at']).days / DAYS_PER_MONTH)
+        patient.update({
+            'average_ticket': round(float(row['lifetime_spend']) / count, 2),
+            'purchases_per_month': round(count / months, 2),
+            'days_since_last_purchase': (now - row['last_purchase_at']).days,
+            'rfm': rfm,
+            'segment': SEGMENT_LABELS[segment_for(rfm['recency'], rfm['frequency'])],
+        })
+    return data
+
+
+def patient_analytics(cuts, segment_totals, top_rows, rows, pagination):
+    now = timezone.now()
+    customers = sum(
+        entry['patients']
+        for code, entry in segment_totals.items()
+        if code != 'sin_compras'
+    )
+    lifetime_spend = sum(entry['lifetime_spend'] for entry in segment_totals.values())
+    return {
+        'summary': {
+            'patients': customers + segment_totals['sin_compras']['patients'],
+            'customers': customers,
+            'sales': sum(entry['sales'] for entry in segment_totals.values()),
+            'lifetime_spend': round(float(lifetime_spend), 2),
+            'average_lifetime_spend': (
+                round(float(lifetime_spend) / customers, 2) if customers else 0.0
+            ),
+        },
+        'segments': [
+            {
+                'segment': code,
+                'label': label,
+                'patients': segment_totals[code]['patients'],
+                'sales': segment_totals[code]['sales'],
+                'lifetime_spend': round(
+                    float(segment_totals[code]['lifetime_spend']), 2
+                ),
+            }
+            for code, label in SEGMENT_CHOICES
+        ],
+        'thresholds': {
+            'recency': [cut.isoformat() for cut in cuts['recency']],
+            'frequency': cuts['frequency'],
+            'monetary': [float(cut) for cut in cuts['monetary']],
+        },
+        'top_patients': _patient_data(top_rows, cuts, now),
+        'patients': _patient_data(rows, cuts, now),
+        'pagination': pagination,
+        'filters': {
+            'segments': [code for code, _ in SEGMENT_CHOICES],
+            'orders': list(ORDERINGS),
+        },
+    }
@@ -0,0 +1,17 @@
+from django.apps import AppConfig
+
+
+class ApiConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'api'
+
+    def ready(self):
+        from django.core import checks
+        from django.db.backends.signals import connection_created
+
+        from . import response_cache, signals, sqlite  # noqa: F401 (signals registra los receptores al importarse)
+
+        connection_created.connect(
+            sqlite.configure_connection, dispatch_uid='api_sqlite_profile'
+        )
+        checks.register(response_cache.check_version_cache, checks.Tags.caches)
@@ -0,0 +1,114 @@
+"""Vistas asíncronas (ASGI) del dashboard y los listados.
+
+Mismas rutas y respuestas que las de api.views; api.urls las usa cuando
+``API_ASYNC_VIEWS`` está activo (por defecto al servir con
+django_project.asgi). Las lecturas usan el ORM asíncrono y el dashboard
+lanza sus bloques de consultas a la vez (ver api.dashboard.abuild), así
+una petición lenta no ocupa un hilo mientras espera a la base. Las
+escrituras (POST) delegan en la vista síncrona con sync_to_async porque
+usan transacciones, que el ORM asíncrono no soporta.
+"""
+from asgiref.sync import sync_to_async
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from . import dashboard, facets, listings, scheduling, views
+from .models import (
+    Appointment,
+    Patient,
+    PatientPurchaseHistory,
+    Product,
+    Sale,
+    SaleItem,
+)
+from .pagination import InvalidPagination, apaginate
+from .response_cache import cached_response
+from .responses import JsonResponse
+from .routers import replica_reads
+
+
+async def _sync_view(view, request):
+    return await sync_to_async(view)(request)
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@replica_reads
+@cached_response(Sale, SaleItem, Appointment, Patient, Product)
+async def dashboard_view(request):
+    """Vista del dashboard con datos completos"""
+    return JsonResponse(await dashboard.abuild(dashboard.today()))
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+@replica_reads
+@cached_response(Product)
+async def products_view(request):
+    """Vista para gestión de productos"""
+    if request.method == 'POST':
+        return await _sync_view(views.products_view, request)
+
+    try:
+        rows, pagination = await apaginate(
+            request, listings.products(request.GET), listings.PRODUCT_CURSOR_ORDERING
+        )
+    except InvalidPagination as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    product_facets = await sync_to_async(facets.product_facets)()
+    return JsonResponse(listings.product_list(rows, pagination, product_facets))
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+@replica_reads
+@cached_response(Patient, PatientPurchaseHistory, Product)
+async def patients_view(request):
+    """Vista para gestión de pacientes"""
+    if request.method == 'POST':
+        return await _sync_view(views.patients_view, request)
+
+    try:
+        rows, pagination = await apaginate(
+            request, listings.patients(request.GET), listings.PATIENT_CURSOR_ORDERING
+        )
+    except InvalidPagination as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    history = [
+        row async for row in listings.recent_purchases([row['id'] for row in rows])
+    ]
+    return JsonResponse(listings.patient_list(rows, history, pagination))
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+@replica_reads
+@cached_response(Appointment, Patient)
+async def appointments_view(request):
+    """Vista para gestión de citas"""
+    if request.method == 'POST':
+        return await _sync_view(views.appointments_view, request)
+
+    try:
+        start, end = scheduling.parse_range(request.GET)
+    except scheduling.ScheduleError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    rows = [row async for row in listings.appointments(start, end, request.GET)]
+    return JsonResponse(listings.appointment_list(rows, start, end))
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+@replica_reads
+@cached_response(Sale, SaleItem, Patient, Product)
+async def sales_view(request):
+    """Vista para gestión de ventas"""
+    if request.method == 'POST':
+        return await _sync_view(views.sales_view, request)
+
+    try:
+        rows, pagination = await apaginate(request, listings.sales(request.GET))
+    except (InvalidPagination, listings.InvalidFilter) as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    items = [row async for row in listings.sale_items([row['id'] for row in rows])]
+    return JsonResponse(listings.sale_list(rows, items, pagination))
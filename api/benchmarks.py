@@ -0,0 +1,694 @@
+"""Benchmarks de los endpoints de la API con el cliente de pruebas de Django.
+
+Cada escenario es una petición HTTP a la API que se repite varias veces
+midiendo la latencia (incluido el consumo completo de las respuestas en
+streaming) y las consultas SQL. Los escenarios que escriben corren
+dentro de una transacción que se deshace al final, así se pueden
+repetir sobre la misma base sin cambiar los datos. Los resultados se
+pueden guardar como línea base en JSON y comparar en corridas
+posteriores: hay regresión si la mediana empeora más que la tolerancia
+o si aumenta el número de consultas.
+
+Pensado para correr sobre los datos de ``seed_data`` y con la caché de
+respuestas apagada (salvo que se pida lo contrario), para medir el
+trabajo real de cada vista.
+"""
+import io
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+import django
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from . import exports, purchases, serializers, sqlite
+from .models import (
+    Appointment,
+    Patient,
+    PatientPurchaseHistory,
+    Product,
+    Purchase,
+    Sale,
+)
+
+DEFAULT_REPEAT = 10
+DEFAULT_TOLERANCE = 0.25
+# Diferencias menores no cuentan como regresión aunque superen la tolerancia
+MIN_REGRESSION_MS = 5.0
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+class Fixtures:
+    """Ids de datos existentes que usan los escenarios, cargados una sola vez"""
+
+    def __init__(self):
+        self.product_ids = list(
+            Product.objects.order_by('pk').values_list('pk', flat=True)[:500]
+        )
+        self.patient_id = (
+            Patient.objects.order_by('pk').values_list('pk', flat=True).first()
+        )
+        if not self.product_ids or self.patient_id is None:
+            raise BenchmarkError(
+                'No hay datos para los benchmarks, ejecute primero seed_data'
+            )
+
+
+class Scenario:
+    def __init__(
+        self,
+        name,
+        path=None,
+        method='get',
+        params=None,
+        prepare=None,
+        writes=False,
+        max_repeat=None,
+    ):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.params = params or {}
+        # prepare(fixtures) -> (ruta, cuerpo, content_type); corre fuera de la medición
+        self.prepare = prepare
+        self.writes = writes
+        self.max_repeat = max_repeat
+
+    def request(self, fixtures):
+        if self.prepare is None:
+            return self.path, self.params, None
+        return self.prepare(fixtures)
+
+
+def _json(path, body):
+    return path, json.dumps(body), 'application/json'
+
+
+def _purchase_body(fixtures, lines):
+    return {
+        'supplier': 'Benchmark',
+        'items': [
+            {'product': product_id, 'quantity': 3, 'unit_cost': '10.00'}
+            for product_id in (fixtures.product_ids * lines)[:lines]
+        ],
+    }
+
+
+def _create_purchase(fixtures):
+    return _json('/api/purchases/', _purchase_body(fixtures, 200))
+
+
+def _receive_purchase(fixtures):
+    purchase = purchases.create_purchase(_purchase_body(fixtures, 500))
+    return _json(f'/api/purchases/{purchase.pk}/receive/', {})
+
+
+def _create_sales(fixtures):
+    sales = [
+        {
+            'patient': fixtures.patient_id,
+            'items': [{'product': product_id, 'quantity': 1}],
+        }
+        for product_id in fixtures.product_ids[:20]
+    ]
+    return _json('/api/sales/', {'sales': sales})
+
+
+def _import_products(_fixtures):
+    lines = ['name,category,supplier,stock,price']
+    lines += [
+        f'Benchmark {number},armazones,Benchmark,5,49.90' for number in range(5000)
+    ]
+    return (
+        '/api/products/import/?format=csv',
+        '\n'.join(lines).encode('utf-8'),
+        'text/csv',
+    )
+
+
+SCENARIOS = [
+    Scenario('dashboard', '/api/dashboard/'),
+    Scenario('products_first_page', '/api/products/', params={'page_size': 20}),
+    Scenario(
+        'products_filtered',
+        '/api/products/',
+        params={'category': 'armazones', 'type': 'propio', 'page_size': 20},
+    ),
+    Scenario(
+        'products_deep_page', '/api/products/', params={'page': 200, 'page_size': 50}
+    ),
+    Scenario(
+        'products_search',
+        '/api/products/',
+        params={'search': 'ray ban', 'page_size': 20},
+    ),
+    Scenario('product_facets', '/api/products/facets/'),
+    Scenario('patients_first_page', '/api/patients/', params={'page_size': 20}),
+    Scenario(
+        'patients_search',
+        '/api/patients/',
+        params={'search': 'garcía', 'page_size': 20},
+    ),
+    Scenario('appointments_week', '/api/appointments/'),
+    Scenario('appointment_availability', '/api/appointments/availability/'),
+    Scenario('sales_first_page', '/api/sales/', params={'page_size': 20}),
+    Scenario(
+        'products_page_10k', '/api/products/', params={'page_size': 10000}, max_repeat=5
+    ),
+    Scenario(
+        'patients_page_10k', '/api/patients/', params={'page_size': 10000}, max_repeat=5
+    ),
+    Scenario(
+        'sales_page_10k', '/api/sales/', params={'page_size': 10000}, max_repeat=5
+    ),
+    Scenario('purchases_first_page', '/api/purchases/', params={'page_size': 20}),
+    Scenario('consignment_settlement', '/api/consignments/settlement/'),
+    Scenario(
+        'export_products_csv',
+        '/api/products/export/',
+        params={'format': 'csv'},
+        max_repeat=3,
+    ),
+    Scenario(
+        'export_patients_csv',
+        '/api/patients/export/',
+        params={'format': 'csv'},
+        max_repeat=3,
+    ),
+    Scenario(
+        'export_purchases_xlsx',
+        '/api/purchases/export/',
+        params={'format': 'xlsx'},
+        max_repeat=3,
+    ),
+    Scenario('create_sales_20', method='post', prepare=_create_sales, writes=True),
+    Scenario(
+        'create_purchase_200_lines',
+        method='post',
+        prepare=_create_purchase,
+        writes=True,
+    ),
+    Scenario(
+        'receive_purchase_500_lines',
+        method='post',
+        prepare=_receive_purchase,
+        writes=True,
+    ),
+    Scenario(
+        'import_products_5000',
+        method='post',
+        prepare=_import_products,
+        writes=True,
+        max_repeat=3,
+    ),
+]
+
+
+def _consume(response):
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(percent * len(ordered)))]
+
+
+def _call(client, scenario, path, data, content_type):
+    method = getattr(client, scenario.method)
+    if content_type:
+        return method(path, data, content_type=content_type)
+    return method(path, data)
+
+
+def run_scenario(client, scenario, fixtures, repeat=DEFAULT_REPEAT, warmup=1):
+    repeat = min(repeat, scenario.max_repeat or repeat)
+    timings = []
+    queries = 0
+    size = 0
+    for run in range(warmup + repeat):
+        with transaction.atomic():
+            path, data, content_type = scenario.request(fixtures)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = _call(client, scenario, path, data, content_type)
+                size = _consume(response)
+                elapsed = time.perf_counter() - started
+            if scenario.writes:
+                transaction.set_rollback(True)
+        if response.status_code >= 400:
+            raise BenchmarkError(f'{scenario.name}: respuesta {response.status_code}')
+        if run >= warmup:
+            timings.append(elapsed * 1000)
+            queries = len(captured)
+
+    return {
+        'runs': len(timings),
+        'median_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(_percentile(timings, 0.95), 2),
+        'min_ms': round(min(timings), 2),
+        'queries': queries,
+        'bytes': size,
+    }
+
+
+def dataset():
+    return {
+        'products': Product.objects.count(),
+        'patients': Patient.objects.count(),
+        'sales': Sale.objects.count(),
+        'appointments': Appointment.objects.count(),
+        'purchases': Purchase.objects.count(),
+    }
+
+
+def run(names=None, repeat=DEFAULT_REPEAT, use_cache=False, log=lambda *args: None):
+    """Corre los escenarios (todos o los de ``names``) y devuelve el informe"""
+    scenarios = [
+        scenario for scenario in SCENARIOS if not names or scenario.name in names
+    ]
+    unknown = set(names or ()) - {scenario.name for scenario in scenarios}
+    if unknown:
+        raise BenchmarkError(f'Escenarios desconocidos: {", ".join(sorted(unknown))}')
+
+    report = {
+        'created_at': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'dataset': dataset(),
+        'results': {},
+    }
+    hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+    with override_settings(
+        ALLOWED_HOSTS=hosts, API_CACHE_ENABLED=use_cache, API_METRICS_ENABLED=False
+    ):
+        fixtures = Fixtures()
+        client = Client()
+        for scenario in scenarios:
+            report['results'][scenario.name] = result = run_scenario(
+                client, scenario, fixtures, repeat
+            )
+            log(scenario.name, result)
+    return report
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Lista de regresiones de ``report`` frente a ``baseline``"""
+    regressions = []
+    for name, result in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None:
+            continue
+        limit = previous['median_ms'] * (1 + tolerance)
+        if (
+            result['median_ms'] > limit
+            and result['median_ms'] - previous['median_ms'] > MIN_REGRESSION_MS
+        ):
+            regressions.append(
+                f"{name}: mediana {result['median_ms']:.1f} ms "
+                f"(base {previous['median_ms']:.1f} ms)"
+            )
+        if result['queries'] > previous['queries']:
+            regressions.append(
+                f"{name}: {result['queries']} consultas (base {previous['queries']})"
+            )
+    return regressions
+
+
+# Microbenchmark de serialización
+
+def _instance_products(queryset):
+    """Referencia: un diccionario por instancia con get_*_display()"""
+    return [
+        {
+            'id': product.id,
+            'code': product.code,
+            'name': product.name,
+            'category': product.get_category_display(),
+            'supplier': product.supplier,
+            'stock': product.stock,
+            'price': float(product.price),
+            'status': product.get_status_display(),
+            'type': product.get_type_display(),
+            'created_at': product.created_at.isoformat(),
+        }
+        for product in queryset
+    ]
+
+
+def _timed(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+def serializer_microbenchmark(rows=10000, repeat=5):
+    """Costo por fila (µs) de armar y codificar una página de ``rows`` productos"""
+    queryset = Product.objects.all()[:rows]
+    count = len(queryset)
+    if not count:
+        raise BenchmarkError('No hay productos, ejecute primero seed_data')
+
+    results = {}
+    elapsed, data = _timed(
+        lambda: _instance_products(Product.objects.all()[:rows]), repeat
+    )
+    results['instancias + get_*_display()'] = elapsed
+    elapsed, _ = _timed(
+        lambda: serializers.PRODUCT_LIST.serialize(
+            serializers.PRODUCT_LIST.values(Product.objects.all()[:rows])
+        ),
+        repeat,
+    )
+    results['values() + serializers'] = elapsed
+    elapsed, _ = _timed(
+        lambda: json.dumps({'products': data}, cls=serializers.DjangoJSONEncoder),
+        repeat,
+    )
+    results['codificación json estándar'] = elapsed
+    if serializers.orjson is not None:
+        elapsed, _ = _timed(lambda: serializers.dumps({'products': data}), repeat)
+        results['codificación orjson'] = elapsed
+    return count, {
+        name: round(value / count * 1e6, 2) for name, value in results.items()
+    }
+
+
+# Exportación de pacientes: conteo por paciente frente a la consulta anotada
+
+def _per_patient_count_export():
+    """Referencia: la exportación de pacientes con un conteo de compras por fila"""
+    return exports.ExportDefinition(
+        'pacientes',
+        [
+            exports.Column('Nombre', 'name'),
+            exports.Column('Email', 'email'),
+            exports.Column('Teléfono', 'phone'),
+            exports.Column(
+                'Estado', 'status', serializers.choice_label(Patient.STATUS_CHOICES)
+            ),
+            exports.Column('Dirección', 'address', serializers.or_empty),
+            exports.Column('Notas', 'notes', serializers.or_empty),
+            exports.Column(
+                'Total Compras',
+                'id',
+                lambda pk: PatientPurchaseHistory.objects.filter(patient_id=pk).count(),
+            ),
+            exports.Column('Fecha Registro', 'created_at', serializers.as_datetime),
+        ],
+        Patient.objects.all,
+        'Pacientes',
+    )
+
+
+class _QueryCounter:
+    """Cuenta consultas sin guardarlas; CaptureQueriesContext guarda solo 9000"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def patient_export_comparison(repeat=3, export_format='csv'):
+    """Tiempo y consultas de exportar todos los pacientes, con y sin totales anotados
+
+    Pensado para una base con muchos pacientes, p. ej. ``seed_data
+    --patients 50000``: la versión de referencia hace una consulta por
+    paciente y la actual una sola.
+    """
+    patients = Patient.objects.count()
+    if not patients:
+        raise BenchmarkError('No hay pacientes, ejecute primero seed_data')
+
+    results = {}
+    variants = (
+        ('per_patient_count', _per_patient_count_export()),
+        ('annotated', exports.EXPORTS['pacientes']),
+    )
+    for name, definition in variants:
+        timings = []
+        for _ in range(repeat):
+            counter = _QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                exports.write_export(io.BytesIO(), definition, export_format)
+                timings.append((time.perf_counter() - started) * 1000)
+        results[name] = {
+            'median_ms': round(statistics.median(timings), 2),
+            'min_ms': round(min(timings), 2),
+            'queries': counter.count,
+        }
+    return {
+        'created_at': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'dataset': dataset(),
+        'patients': patients,
+        'format': export_format,
+        'runs': repeat,
+        'results': results,
+    }
+
+
+# Carga concurrente contra un servidor en marcha
+
+def _fetch(url, timeout):
+    started = time.perf_counter()
+    try:
+        with urlopen(url, timeout=timeout) as response:
+            response.read()
+            ok = response.status < 400
+    except (URLError, OSError):
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def load_test(base_url, names=None, clients=200, requests_per_client=10, timeout=60):
+    """Latencias con ``clients`` clientes concurrentes contra un servidor en marcha
+
+    Usa los escenarios de lectura; cada cliente recorre la lista en orden
+    desde una posición distinta, así todos los endpoints reciben carga a la
+    vez. Para comparar despliegues se corre lo mismo contra cada servidor.
+    """
+    scenarios = [
+        scenario
+        for scenario in SCENARIOS
+        if not scenario.writes
+        and scenario.max_repeat is None
+        and (not names or scenario.name in names)
+    ]
+    if not scenarios:
+        raise BenchmarkError('No hay escenarios de lectura para la prueba de carga')
+    urls = [
+        f"{base_url.rstrip('/')}{scenario.path}"
+        + (f'?{urlencode(scenario.params)}' if scenario.params else '')
+        for scenario in scenarios
+    ]
+    timings = {scenario.name: [] for scenario in scenarios}
+    errors = {scenario.name: 0 for scenario in scenarios}
+    lock = threading.Lock()
+
+    def client(number):
+        for step in range(requests_per_client):
+            index = (number + step) % len(urls)
+            elapsed, ok = _fetch(urls[index], timeout)
+            with lock:
+                timings[scenarios[index].name].append(elapsed * 1000)
+                if not ok:
+                    errors[scenarios[index].name] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(client, range(clients)))
+    elapsed = time.perf_counter() - started
+
+    everything = [value for values in timings.values() for value in values]
+    results = {
+        name: {
+            'requests': len(values),
+            'errors': errors[name],
+            'median_ms': round(statistics.median(values), 2),
+            'p95_ms': round(_percentile(values, 0.95), 2),
+            'p99_ms': round(_percentile(values, 0.99), 2),
+        }
+        for name, values in timings.items() if values
+    }
+    return {
+        'base_url': base_url,
+        'clients': clients,
+        'requests': len(everything),
+        'errors': sum(errors.values()),
+        'throughput_rps': round(len(everything) / elapsed, 1),
+        'p95_ms': round(_percentile(everything, 0.95), 2),
+        'results': results,
+    }
+
+
+# Concurrencia sobre SQLite: lectores del dashboard y escritores de ventas
+
+def _concurrency_worker(role, duration, barrier, product_ids, patient_id, seed):
+    """Corre en un proceso aparte: peticiones en bucle durante ``duration`` segundos"""
+    # Los "database is locked" se cuentan como errores, sin volcar cada traza
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    rng = random.Random(seed)
+    timings = []
+    errors = 0
+    hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+    with override_settings(
+        ALLOWED_HOSTS=hosts, API_CACHE_ENABLED=False, API_METRICS_ENABLED=False
+    ):
+        client = Client(raise_request_exception=False)
+        barrier.wait()
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            if role == 'read':
+                response = client.get('/api/dashboard/')
+            else:
+                items = [
+                    {'product': product_id, 'quantity': 1}
+                    for product_id in rng.sample(product_ids, 3)
+                ]
+                response = client.post(
+                    '/api/sales/',
+                    json.dumps({'patient': patient_id, 'items': items}),
+                    content_type='application/json',
+                )
+            _consume(response)
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+    connection.close()
+    return role, timings, errors
+
+
+def _copy_database(path):
+    """Copia la base actual a ``path`` con stock de sobra para todas las ventas"""
+    source = sqlite3.connect(settings.DATABASES['default']['NAME'])
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target)
+        target.execute(f'UPDATE {Product._meta.db_table} SET stock = stock + 1000000')
+        target.commit()
+    finally:
+        source.close()
+        target.close()
+
+
+def _summary(timings, errors, elapsed):
+    if not timings:
+        return {
+            'requests': 0,
+            'errors': errors,
+            'per_second': 0.0,
+            'median_ms': 0.0,
+            'p95_ms': 0.0,
+        }
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'per_second': round(len(timings) / elapsed, 1),
+        'median_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(_percentile(timings, 0.95), 2),
+    }
+
+
+def concurrency(
+    profiles=None, readers=8, writers=2, duration=10.0, log=lambda *args: None
+):
+    """Lecturas y escrituras por segundo con cada perfil de SQLite (ver api.sqlite)
+
+    Cada perfil corre sobre su propia copia de la base, con ``readers``
+    procesos que consultan el dashboard y ``writers`` que registran
+    ventas de tres líneas a la vez, sin caché de respuestas. Los procesos
+    arrancan juntos y miden durante ``duration`` segundos.
+    """
+    if connection.vendor != 'sqlite':
+        raise BenchmarkError('El benchmark de concurrencia compara perfiles de SQLite')
+    profiles = profiles or list(sqlite.PROFILES)
+    unknown = set(profiles) - set(sqlite.PROFILES)
+    if unknown:
+        raise BenchmarkError(f'Perfiles desconocidos: {", ".join(sorted(unknown))}')
+    fixtures = Fixtures()
+
+    report = {
+        'created_at': timezone.now().isoformat(),
+        'dataset': dataset(),
+        'readers': readers,
+        'writers': writers,
+        'duration_s': duration,
+        'results': {},
+    }
+    roles = ['read'] * readers + ['write'] * writers
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in profiles:
+            path = os.path.join(directory, f'{profile}.sqlite3')
+            _copy_database(path)
+            # Los procesos hijos leen la base y el perfil del entorno al iniciar Django
+            environ = {'SQLITE_PATH': path, 'SQLITE_PROFILE': profile}
+            previous = {name: os.environ.get(name) for name in environ}
+            os.environ.update(environ)
+            try:
+                with (
+                    context.Manager() as manager,
+                    ProcessPoolExecutor(
+                        max_workers=len(roles),
+                        mp_context=context,
+                        initializer=django.setup,
+                    ) as pool,
+                ):
+                    barrier = manager.Barrier(len(roles))
+                    futures = [
+                        pool.submit(
+                            _concurrency_worker, role, duration, barrier,
+                            fixtures.product_ids, fixtures.patient_id, number,
+                        )
+                        for number, role in enumerate(roles)
+                    ]
+                    outcomes = [future.result() for future in futures]
+            finally:
+                for name, value in previous.items():
+                    if value is None:
+                        os.environ.pop(name, None)
+                    else:
+                        os.environ[name] = value
+
+            result = {}
+            for role in ('read', 'write'):
+                timings = [
+                    value
+                    for outcome in outcomes
+                    if outcome[0] == role
+                    for value in outcome[1]
+                ]
+                errors = sum(outcome[2] for outcome in outcomes if outcome[0] == role)
+                result[role] = _summary(timings, errors, duration)
+            report['results'][profile] = result
+            log(profile, result)
+    return report
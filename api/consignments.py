@@ -0,0 +1,330 @@
+"""Libro de consignaciones por proveedor.
+
+Los movimientos (recepciones y devoluciones) se guardan en
+ConsignmentMovement y mueven el stock del producto; lo vendido sale de
+SaleItem (ventas no canceladas de productos en consignación). El saldo
+de cada proveedor y producto es recibido - devuelto - vendido.
+
+Para que los reportes no recorran todo el histórico, los totales
+acumulados se guardan periódicamente en ConsignmentSnapshot (comando
+``snapshot_consignments``). Los acumulados a una fecha se arman con la
+última foto anterior más un recorrido agrupado de lo ocurrido después:
+pocas consultas y un volumen acotado al período desde la última foto.
+
+Las fotos solo se toman de días ya cerrados (las ventas del día se
+crean en bloque, sin señales) y se borran desde la fecha afectada
+cuando cambia algo que ya contaban: un movimiento con fecha pasada, una
+venta cancelada, reactivada o borrada, una línea de venta editada o un
+producto que cambia de proveedor o de tipo (ver api.signals).
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Max, Min, Q, Sum
+from django.utils import timezone
+
+from . import stock
+from .models import ConsignmentMovement, ConsignmentSnapshot, Product, Sale, SaleItem
+
+CONSIGNMENT_TYPE = 'consignacion'
+SOLD_EXCLUDED_STATUSES = ['cancelado']
+TOTAL_FIELDS = ('received', 'returned', 'sold', 'sold_amount')
+
+
+class ConsignmentError(ValueError):
+    pass
+
+
+def _empty_totals():
+    return {'received': 0, 'returned': 0, 'sold': 0, 'sold_amount': Decimal('0')}
+
+
+def _add(totals, key, values):
+    entry = totals.setdefault(key, _empty_totals())
+    for field, value in values.items():
+        entry[field] += value or 0
+
+
+def _scan(totals, after, until, supplier=None, product_ids=None):
+    """Suma a ``totals`` los movimientos y ventas con fecha en (after, until]"""
+    movements = ConsignmentMovement.objects.filter(date__lte=until)
+    sales = SaleItem.objects.filter(
+        product__type=CONSIGNMENT_TYPE, sale__created_at__date__lte=until
+    ).exclude(sale__status__in=SOLD_EXCLUDED_STATUSES)
+    if after:
+        movements = movements.filter(date__gt=after)
+        sales = sales.filter(sale__created_at__date__gt=after)
+    if supplier:
+        movements = movements.filter(supplier=supplier)
+        sales = sales.filter(product__supplier=supplier)
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=product_ids)
+        sales = sales.filter(product_id__in=product_ids)
+
+    for row in movements.values('supplier', 'product_id').annotate(
+        received=Sum('quantity', filter=Q(kind='recepcion')),
+        returned=Sum('quantity', filter=Q(kind='devolucion')),
+    ).order_by():
+        _add(totals, (row['supplier'], row['product_id']), {
+            'received': row['received'], 'returned': row['returned'],
+        })
+    for row in sales.values('product__supplier', 'product_id').annotate(
+        sold=Sum('quantity'), sold_amount=Sum('total_price'),
+    ).order_by():
+        _add(totals, (row['product__supplier'], row['product_id']), {
+            'sold': row['sold'], 'sold_amount': row['sold_amount'],
+        })
+
+
+def latest_snapshot_date(until):
+    return ConsignmentSnapshot.objects.filter(as_of__lte=until).aggregate(
+        as_of=Max('as_of')
+    )['as_of']
+
+
+def totals_as_of(until, supplier=None, product_ids=None):
+    """Acumulados por ``(proveedor, producto)`` hasta ``until`` inclusive"""
+    totals = {}
+    snapshot_date = latest_snapshot_date(until)
+    if snapshot_date:
+        snapshots = ConsignmentSnapshot.objects.filter(as_of=snapshot_date)
+        if supplier:
+            snapshots = snapshots.filter(supplier=supplier)
+        if product_ids is not None:
+            snapshots = snapshots.filter(product_id__in=product_ids)
+        for row in snapshots.values('supplier', 'product_id', *TOTAL_FIELDS):
+            _add(
+                totals,
+                (row['supplier'], row['product_id']),
+                {field: row[field] for field in TOTAL_FIELDS},
+            )
+    _scan(totals, snapshot_date, until, supplier, product_ids)
+    return totals
+
+
+def balance(totals):
+    return totals['received'] - totals['returned'] - totals['sold']
+
+
+def take_snapshot(as_of):
+    """Guarda la foto de acumulados al cierre de ``as_of`` (reemplaza la existente)"""
+    if as_of >= timezone.localdate():
+        raise ConsignmentError('La fecha de la foto debe ser anterior a hoy')
+    totals = totals_as_of(as_of)
+    with transaction.atomic():
+        ConsignmentSnapshot.objects.filter(as_of=as_of).delete()
+        ConsignmentSnapshot.objects.bulk_create(
+            [
+                ConsignmentSnapshot(
+                    as_of=as_of, supplier=supplier, product_id=product_id, **values
+                )
+                for (supplier, product_id), values in totals.items()
+            ],
+            batch_size=500,
+        )
+    return len(totals)
+
+
+def rebuild_snapshots():
+    """Recalcula todas las fotos existentes desde cero, en orden cronológico
+
+    Las de hoy o posteriores (de antes de exigir días cerrados) se descartan.
+    """
+    dates = sorted(
+        set(
+            ConsignmentSnapshot.objects.filter(
+                as_of__lt=timezone.localdate()
+            ).values_list('as_of', flat=True)
+        )
+    )
+    ConsignmentSnapshot.objects.all().delete()
+    for as_of in dates:
+        take_snapshot(as_of)
+    return len(dates)
+
+
+def record_movement(data):
+    """Registra una recepción o devolución y ajusta el stock del producto"""
+    kind = data.get('kind', 'recepcion')
+    if kind not in dict(ConsignmentMovement.KIND_CHOICES):
+        raise ConsignmentError(f'Tipo de movimiento inválido "{kind}"')
+    try:
+        quantity = int(data.get('quantity', 0))
+    except (TypeError, ValueError):
+        quantity = 0
+    if quantity <= 0:
+        raise ConsignmentError('quantity debe ser un entero positivo')
+    try:
+        movement_date = (
+            date.fromisoformat(data['date'])
+            if data.get('date')
+            else timezone.localdate()
+        )
+    except ValueError as e:
+        raise ConsignmentError('Fecha inválida, use el formato YYYY-MM-DD') from e
+    if movement_date > timezone.localdate():
+        raise ConsignmentError('La fecha del movimiento no puede ser futura')
+
+    product_id = int(data['product'])
+
+    with transaction.atomic():
+        # Bloquea el producto antes de leer el saldo: otra devolución o una
+        # venta del mismo producto esperan a que termine esta transacción
+        Product.objects.filter(pk=product_id).update(stock=F('stock'))
+        product = Product.objects.select_for_update().filter(pk=product_id).first()
+        if product is None or product.type != CONSIGNMENT_TYPE:
+            raise ConsignmentError('El producto no existe o no está en consignación')
+        supplier = data.get('supplier') or product.supplier
+        if supplier != product.supplier:
+            raise ConsignmentError(
+                f'{product.name} está en consignación de {product.supplier}, '
+                f'no de {supplier}'
+            )
+        if kind == 'devolucion':
+            current = totals_as_of(timezone.localdate(), supplier, [product.pk]).get((
+                supplier,
+                product.pk,
+            ))
+            if current is None or balance(current) < quantity:
+                raise ConsignmentError(
+                    f'No hay saldo suficiente de {product.name} '
+                    f'para devolver a {supplier}'
+                )
+        movement = ConsignmentMovement.objects.create(
+            supplier=supplier,
+            product=product,
+            kind=kind,
+            quantity=quantity,
+            date=movement_date,
+            notes=data.get('notes', ''),
+        )
+        stock.apply_stock_deltas({
+            product.pk: quantity if kind == 'recepcion' else -quantity
+        })
+        # Un movimiento con fecha pasada deja desactualizadas las fotos posteriores
+        invalidate_snapshots(movement_date)
+    return movement
+
+
+def invalidate_snapshots(since):
+    """Borra las fotos al cierre de ``since`` o posteriores"""
+    if since is not None:
+        ConsignmentSnapshot.objects.filter(as_of__gte=since).delete()
+
+
+def _first_date(sales):
+    first = sales.aggregate(first=Min('created_at'))['first']
+    return timezone.localtime(first).date() if first else None
+
+
+def _is_sold(status):
+    return status not in SOLD_EXCLUDED_STATUSES
+
+
+def record_sales_changed(sale_ids):
+    """Invalida las fotos desde la primera de estas ventas con consignación"""
+    invalidate_snapshots(_first_date(Sale.objects.filter(
+        pk__in=sale_ids, items__product__type=CONSIGNMENT_TYPE,
+    )))
+
+
+def record_sale_saving(sale):
+    """Cancelar o reactivar una venta cambia lo vendido a su fecha"""
+    previous = Sale.objects.filter(pk=sale.pk).values_list('status', flat=True).first()
+    if previous is not None and _is_sold(previous) != _is_sold(sale.status):
+        record_sales_changed([sale.pk])
+
+
+def record_sale_item_saving(item):
+    """Una línea nueva, editada o movida cambia lo vendido a la fecha de su venta"""
+    sale_ids, product_ids = {item.sale_id}, {item.product_id}
+    previous = (
+        SaleItem.objects.filter(pk=item.pk).values_list('sale_id', 'product_id').first()
+    )
+    if previous is not None:
+        sale_ids.add(previous[0])
+        product_ids.add(previous[1])
+    if Product.objects.filter(pk__in=product_ids, type=CONSIGNMENT_TYPE).exists():
+        invalidate_snapshots(_first_date(Sale.objects.filter(pk__in=sale_ids)))
+
+
+def record_sale_item_deleting(item, origin=None):
+    """Borra las fotos afectadas por una línea borrada sola
+
+    Si se borra la venta, el paciente o el producto completo, ya lo
+    resuelve el receptor de ese borrado.
+    """
+    if isinstance(origin, SaleItem) or getattr(origin, 'model', None) is SaleItem:
+        record_sales_changed([item.sale_id])
+
+
+def record_product_saving(product):
+    """Un cambio de proveedor o de tipo mueve lo vendido del producto entre saldos"""
+    previous = (
+        Product.objects.filter(pk=product.pk).values_list('supplier', 'type').first()
+    )
+    if previous is None or previous == (product.supplier, product.type):
+        return
+    if CONSIGNMENT_TYPE in (previous[1], product.type):
+        record_product_sales_changed(product.pk)
+
+
+def record_product_sales_changed(product_id):
+    """Invalida las fotos desde la primera venta del producto al cambiarlo o borrarlo"""
+    invalidate_snapshots(_first_date(Sale.objects.filter(items__product_id=product_id)))
+
+
+def _rows(totals):
+    names = dict(
+        Product.objects.filter(
+            pk__in={product_id for _, product_id in totals}
+        ).values_list('id', 'name')
+    )
+    return [
+        {
+            'supplier': supplier,
+            'product_id': product_id,
+            'product': names.get(product_id, ''),
+            **values,
+        }
+        for (supplier, product_id), values in sorted(
+            totals.items(), key=lambda item: (item[0][0], names.get(item[0][1], ''))
+        )
+    ]
+
+
+def balances(until=None, supplier=None):
+    """Saldo actual por proveedor y producto, con totales por proveedor"""
+    rows = _rows(totals_as_of(until or timezone.localdate(), supplier))
+    suppliers = {}
+    for row in rows:
+        row['balance'] = balance(row)
+        _add(suppliers, row['supplier'], {field: row[field] for field in TOTAL_FIELDS})
+    return rows, [
+        {'supplier': name, **values, 'balance': balance(values)}
+        for name, values in sorted(suppliers.items())
+    ]
+
+
+def settlement(start, end, supplier=None):
+    """Liquidación del período: saldo inicial, movimientos, ventas y saldo final
+
+    Solo se leen dos fotos y lo ocurrido desde cada una, sin recorrer el
+    histórico completo.
+    """
+    opening = totals_as_of(start - timedelta(days=1), supplier)
+    closing = totals_as_of(end, supplier)
+    report = {}
+    for key in set(opening) | set(closing):
+        before = opening.get(key, _empty_totals())
+        after = closing.get(key, _empty_totals())
+        period = {field: after[field] - before[field] for field in TOTAL_FIELDS}
+        if not any(period.values()) and not balance(after):
+            continue
+        report[key] = {
+            'opening_balance': balance(before),
+            **period,
+            'closing_balance': balance(after),
+        }
+    return _rows(report)
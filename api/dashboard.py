@@ -0,0 +1,277 @@
+"""Agregaciones del dashboard.
+
+Los totales (ventas e inventario por categoría, citas, pacientes y
+ventas activas) salen de una sola consulta UNION ALL de agregados, y las
+tres listas cortas (ventas recientes, próximas citas, stock bajo) de una
+consulta cada una: cuatro consultas en total, sin importar cuántas
+categorías o filas existan. Las ventas y el inventario se leen de las
+tablas de resumen (ver api.rollups), cuyo tamaño no crece con el
+histórico.
+
+``build`` arma la respuesta completa con las consultas una tras otra;
+``abuild`` (vistas asíncronas) lanza los bloques a la vez, cada uno en
+un hilo con su propia conexión.
+"""
+import asyncio
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.db.models import CharField, Count, DecimalField, F, Q, Sum, Value
+
+from .models import (
+    Appointment,
+    CategoryStockRollup,
+    DailySalesRollup,
+    Patient,
+    Product,
+    Sale,
+)
+
+ACTIVE_SALE_STATUSES = ['nuevo', 'en_proceso']
+
+CATEGORY_LABELS = dict(Product.CATEGORY_CHOICES)
+CATEGORY_ORDER = {
+    code: index for index, (code, _) in enumerate(Product.CATEGORY_CHOICES)
+}
+
+
+def _by_category_order(rows, key):
+    return sorted(
+        rows, key=lambda row: CATEGORY_ORDER.get(row[key], len(CATEGORY_ORDER))
+    )
+
+
+# Columnas numéricas comunes a todas las partes de la consulta de totales
+NUMBER = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _totals_part(queryset, kind, key=None, **columns):
+    """Parte de la consulta de totales: filas ``(kind, key, first, second, third)``"""
+    zero = Value(0, output_field=NUMBER)
+    return queryset.annotate(
+        kind=Value(kind, output_field=CharField()),
+        key=key if key is not None else Value(None, output_field=CharField()),
+    ).values('kind', 'key').annotate(
+        first=columns.get('first', zero),
+        second=columns.get('second', zero),
+        third=columns.get('third', zero),
+    ).order_by()
+
+
+def totals_query(today, start_of_month):
+    """Resúmenes y conteos del dashboard en una sola consulta (UNION ALL)"""
+    return _totals_part(
+        DailySalesRollup.objects.filter(date__gte=start_of_month),
+        'sales',
+        F('category'),
+        first=Sum('amount', filter=Q(date=today)),
+        second=Sum('quantity'),
+        third=Sum('amount'),
+    ).union(
+        _totals_part(
+            CategoryStockRollup.objects.filter(product_count__gt=0),
+            'inventory',
+            F('category'),
+            first=F('product_count'),
+            second=F('consignment_count'),
+            third=F('total_stock'),
+        ),
+        _totals_part(Patient.objects.all(), 'patients', first=Count('id')),
+        _totals_part(
+            Sale.objects.filter(status__in=ACTIVE_SALE_STATUSES),
+            'active_sales',
+            first=Count('id'),
+        ),
+        _totals_part(
+            Appointment.objects.all(),
+            'appointments',
+            first=Count('id', filter=Q(date=today)),
+            second=Count('id', filter=Q(status='pendiente')),
+        ),
+        all=True,
+    )
+
+
+def sales_kpis(rows):
+    """Ventas del día, del mes y por categoría desde las filas del resumen diario"""
+    daily_sales = 0
+    monthly_sales = 0
+    by_category = []
+    for row in _by_category_order(rows, 'key'):
+        daily_sales += row['first'] or 0
+        monthly_sales += row['third'] or 0
+        if not row['second']:
+            continue
+        by_category.append({
+            'category': CATEGORY_LABELS.get(row['key'], row['key']),
+            'quantity': int(row['second']),
+            'amount': float(row['third'] or 0),
+        })
+
+    return {
+        'daily_sales': daily_sales,
+        'monthly_sales': monthly_sales,
+        'sales_by_category': by_category,
+    }
+
+
+def inventory_kpis(rows):
+    """Totales de inventario y resumen por categoría desde el resumen de stock"""
+    by_category = []
+    total_products = 0
+    total_inventory = 0
+    consignments = 0
+    for row in _by_category_order(rows, 'key'):
+        count, consignment_count, stock = (
+            int(row['first']),
+            int(row['second']),
+            int(row['third']),
+        )
+        total_products += count
+        total_inventory += stock
+        consignments += consignment_count
+        by_category.append({
+            'category': CATEGORY_LABELS.get(row['key'], row['key']),
+            'count': count,
+            'total_stock': stock,
+        })
+
+    return {
+        'total_products': total_products,
+        'total_inventory': total_inventory,
+        'consignments': consignments,
+        'inventory_by_category': by_category,
+    }
+
+
+def totals(today, start_of_month):
+    """KPIs de ventas, inventario, citas, pacientes y ventas activas con una consulta"""
+    rows = {}
+    for row in totals_query(today, start_of_month):
+        rows.setdefault(row['kind'], []).append(row)
+    count = {
+        kind: rows[kind][0] for kind in ('patients', 'active_sales', 'appointments')
+    }
+    return {
+        'sales': sales_kpis(rows.get('sales', [])),
+        'inventory': inventory_kpis(rows.get('inventory', [])),
+        'appointments': {
+            'today_appointments': int(count['appointments']['first']),
+            'pending_appointments': int(count['appointments']['second']),
+        },
+        'patients': int(count['patients']['first']),
+        'active_sales': int(count['active_sales']['first']),
+    }
+
+
+def recent_sales():
+    """Ventas recientes (últimas 5)"""
+    return [
+        {
+            'id': sale.id,
+            'customer': sale.patient.name,
+            'amount': float(sale.total_amount),
+            'date': sale.created_at.strftime('%Y-%m-%d'),
+            'status': sale.get_status_display()
+        }
+        for sale in Sale.objects.select_related('patient')[:5]
+    ]
+
+
+def upcoming_appointments(today):
+    """Citas recientes (próximas 5)"""
+    appointments = Appointment.objects.select_related('patient').filter(
+        date__gte=today
+    ).order_by('date', 'time')[:5]
+    return [
+        {
+            'id': apt.id,
+            'patient': apt.patient.name,
+            'time': apt.time.strftime('%H:%M'),
+            'date': apt.date.strftime('%Y-%m-%d'),
+            'type': apt.get_type_display(),
+            'status': apt.get_status_display()
+        }
+        for apt in appointments
+    ]
+
+
+def low_stock_products():
+    """Productos con stock bajo/crítico"""
+    products = Product.objects.filter(
+        status__in=['bajo', 'critico']
+    ).order_by('stock')[:10]
+    return [
+        {
+            'id': product.id,
+            'name': product.name,
+            'code': product.code,
+            'stock': product.stock,
+            'status': product.get_status_display(),
+            'category': product.get_category_display()
+        }
+        for product in products
+    ]
+
+
+def today():
+    return datetime.now().date()
+
+
+def _blocks(today):
+    return {
+        'totals': (totals, today, today.replace(day=1)),
+        'recent_sales': (recent_sales,),
+        'recent_appointments': (upcoming_appointments, today),
+        'low_stock': (low_stock_products,),
+    }
+
+
+def _data(results):
+    sales = results['totals']['sales']
+    appointments = results['totals']['appointments']
+    inventory = results['totals']['inventory']
+    return {
+        'dailySales': float(sales['daily_sales']),
+        'monthlySales': float(sales['monthly_sales']),
+        'appointments': appointments['today_appointments'],
+        'inventory': inventory['total_inventory'],
+        'consignments': inventory['consignments'],
+        'recentSales': results['recent_sales'],
+        'recentAppointments': results['recent_appointments'],
+        'inventoryByCategory': inventory['inventory_by_category'],
+        'salesByCategory': sales['sales_by_category'],
+        'lowStockProducts': results['low_stock'],
+        'stats': {
+            'totalProducts': inventory['total_products'],
+            'totalPatients': results['totals']['patients'],
+            'pendingAppointments': appointments['pending_appointments'],
+            'activeSales': results['totals']['active_sales']
+        }
+    }
+
+
+def build(today):
+    return _data({
+        name: function(*args) for name, (function, *args) in _blocks(today).items()
+    })
+
+
+def _in_own_thread(function, *args):
+    try:
+        return function(*args)
+    finally:
+        # La conexión de este hilo se cierra o se conserva según CONN_MAX_AGE
+        close_old_connections()
+
+
+async def abuild(today):
+    blocks = _blocks(today)
+    results = await asyncio.gather(
+        *(
+            sync_to_async(_in_own_thread, thread_sensitive=False)(*block)
+            for block in blocks.values()
+        )
+    )
+    return _data(dict(zip(blocks, results, strict=True)))
@@ -0,0 +1,409 @@
+"""Exportación de listados a CSV, XLSX y XLS.
+
+Las filas se leen con ``values_list(...).iterator(chunk_size=...)``, sin
+instanciar modelos. CSV y XLSX se envían con StreamingHttpResponse, así
+la memoria se mantiene constante sin importar el tamaño del catálogo.
+XLS (xlwt) siempre se arma en memoria, por eso solo es el formato por
+defecto cuando las filas caben en una hoja; si no, se cambia a XLSX.
+Cuando una hoja se llena, el resto de filas pasa a hojas nuevas.
+
+``EXPORTS`` define los listados exportables; los usan tanto las vistas
+de exportación directa como las exportaciones en segundo plano
+(api.jobs), que escriben el archivo a disco con ``write_export``.
+"""
+import csv
+import io
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.db.models import Count, DecimalField, F, Max, Sum
+from django.http import HttpResponse, StreamingHttpResponse
+
+from . import serializers
+from .models import Patient, Product, Purchase
+
+EXPORT_CHUNK_SIZE = 2000
+
+XLS_MAX_ROWS = 65536
+XLSX_MAX_ROWS = 1048576
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'xls': 'application/ms-excel',
+}
+
+_ILLEGAL_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class Column:
+    """Columna exportada: encabezado, campo de values_list y formateador opcional"""
+
+    def __init__(self, header, field, formatter=None):
+        self.header = header
+        self.field = field
+        self.formatter = formatter
+
+
+def iter_rows(queryset, columns):
+    """Recorre el queryset por bloques devolviendo tuplas ya formateadas"""
+    formatters = [column.formatter for column in columns]
+    rows = queryset.values_list(*[column.field for column in columns]).iterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    )
+    for row in rows:
+        yield tuple(
+            formatter(value) if formatter else value
+            for formatter, value in zip(formatters, row, strict=True)
+        )
+
+
+def _sheet_name(base, index):
+    return base if index == 1 else f'{base} {index}'
+
+
+class _Echo:
+    """Pseudo-buffer para csv.writer: devuelve lo escrito en vez de guardarlo"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_stream(headers, rows):
+    writer = csv.writer(_Echo())
+    # BOM para que Excel detecte UTF-8 (acentos en encabezados y nombres)
+    yield '\ufeff' + writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """Destino no buscable para zipfile; los bytes escritos se recogen con drain()"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_cell(ref, value):
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    text = _ILLEGAL_XML_CHARS.sub('', '' if value is None else str(value))
+    return (
+        f'<c r="{ref}" t="inlineStr">'
+        f'<is><t xml:space="preserve">{escape(text)}</t></is></c>'
+    )
+
+
+def _xlsx_row(number, values):
+    cells = ''.join(
+        _xlsx_cell(f'{_column_letter(col)}{number}', value)
+        for col, value in enumerate(values)
+    )
+    return f'<row r="{number}">{cells}</row>'.encode('utf-8')
+
+
+_XLSX_SHEET_START = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    b'<sheetData>'
+)
+_XLSX_SHEET_END = b'</sheetData></worksheet>'
+
+
+def _xlsx_stream(headers, rows, sheet_name):
+    """Genera el XLSX como un zip al vuelo; las hojas se comprimen según llegan"""
+    buffer = _ChunkBuffer()
+    sheet_names = []
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        sheet = None
+        number = XLSX_MAX_ROWS
+        for row in rows:
+            if number == XLSX_MAX_ROWS:
+                if sheet is not None:
+                    sheet.write(_XLSX_SHEET_END)
+                    sheet.close()
+                sheet_names.append(_sheet_name(sheet_name, len(sheet_names) + 1))
+                sheet = archive.open(
+                    f'xl/worksheets/sheet{len(sheet_names)}.xml', 'w', force_zip64=True
+                )
+                sheet.write(_XLSX_SHEET_START + _xlsx_row(1, headers))
+                number = 1
+            number += 1
+            sheet.write(_xlsx_row(number, row))
+            if number % EXPORT_CHUNK_SIZE == 0:
+                data = buffer.drain()
+                if data:
+                    yield data
+        if sheet is None:
+            sheet_names.append(sheet_name)
+            archive.writestr(
+                'xl/worksheets/sheet1.xml',
+                _XLSX_SHEET_START + _xlsx_row(1, headers) + _XLSX_SHEET_END,
+            )
+        else:
+            sheet.write(_XLSX_SHEET_END)
+            sheet.close()
+        _write_xlsx_parts(archive, sheet_names)
+    yield buffer.drain()
+
+
+def _write_xlsx_parts(archive, sheet_names):
+    overrides = ''.join(
+        f'<Override PartName="/xl/worksheets/sheet{index}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for index in range(1, len(sheet_names) + 1)
+    )
+    archive.writestr(
+        '[Content_Types].xml',
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" '
+        'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        f'{overrides}</Types>',
+    )
+    archive.writestr(
+        '_rels/.rels',
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+        'officeDocument" '
+        'Target="xl/workbook.xml"/></Relationships>',
+    )
+    sheets = ''.join(
+        f'<sheet name="{escape(name[:31])}" sheetId="{index}" r:id="rId{index}"/>'
+        for index, name in enumerate(sheet_names, 1)
+    )
+    archive.writestr(
+        'xl/workbook.xml',
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets>{sheets}</sheets></workbook>',
+    )
+    relationships = ''.join(
+        f'<Relationship Id="rId{index}" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+        'worksheet" '
+        f'Target="worksheets/sheet{index}.xml"/>'
+        for index in range(1, len(sheet_names) + 1)
+    )
+    archive.writestr(
+        'xl/_rels/workbook.xml.rels',
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'{relationships}</Relationships>',
+    )
+
+
+def _xls_workbook(headers, rows, sheet_name):
+    import xlwt
+
+    wb = xlwt.Workbook(encoding='utf-8')
+    ws = None
+    row_number = XLS_MAX_ROWS
+    sheet_count = 0
+    for row in rows:
+        if row_number == XLS_MAX_ROWS:
+            sheet_count += 1
+            ws = _xls_sheet(wb, _sheet_name(sheet_name, sheet_count), headers)
+            row_number = 1
+        for col, value in enumerate(row):
+            ws.write(row_number, col, value)
+        row_number += 1
+    if ws is None:
+        _xls_sheet(wb, sheet_name, headers)
+    return wb
+
+
+def _xls_response(headers, rows, sheet_name):
+    response = HttpResponse(content_type=FORMATS['xls'])
+    _xls_workbook(headers, rows, sheet_name).save(response)
+    return response
+
+
+def _xls_sheet(wb, name, headers):
+    ws = wb.add_sheet(name)
+    for col, header in enumerate(headers):
+        ws.write(0, col, header)
+    return ws
+
+
+def _stream(headers, rows, export_format, sheet_name):
+    if export_format == 'csv':
+        return _csv_stream(headers, rows)
+    return _xlsx_stream(headers, rows, sheet_name)
+
+
+def resolve_format(requested, queryset):
+    if requested in FORMATS:
+        return requested
+    # XLS por defecto, salvo que no quepa en una hoja
+    return 'xls' if queryset.count() < XLS_MAX_ROWS else 'xlsx'
+
+
+def export_response(request, definition):
+    """Respuesta de exportación en el formato pedido con ``?format=csv|xlsx|xls``"""
+    # Fija la base ahora: las filas se leen al enviar la respuesta, fuera de la vista
+    # (ver api.routers)
+    queryset = definition.queryset()
+    queryset = queryset.using(queryset.db)
+    export_format = resolve_format(request.GET.get('format', ''), queryset)
+
+    headers = [column.header for column in definition.columns]
+    rows = iter_rows(queryset, definition.columns)
+
+    if export_format == 'xls':
+        response = _xls_response(headers, rows, definition.sheet_name)
+    else:
+        response = StreamingHttpResponse(
+            _stream(headers, rows, export_format, definition.sheet_name),
+            content_type=FORMATS[export_format],
+        )
+
+    response['Content-Disposition'] = (
+        f'attachment; filename="{definition.name}.{export_format}"'
+    )
+    return response
+
+
+def write_export(fileobj, definition, export_format, progress=None):
+    """Escribe la exportación en ``fileobj``; llama ``progress(filas)`` por bloque"""
+    headers = [column.header for column in definition.columns]
+    rows = iter_rows(definition.queryset(), definition.columns)
+    if progress is not None:
+        rows = _counted(rows, progress)
+
+    if export_format == 'xls':
+        _xls_workbook(headers, rows, definition.sheet_name).save(fileobj)
+        return
+    for chunk in _stream(headers, rows, export_format, definition.sheet_name):
+        fileobj.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+
+
+def _counted(rows, progress):
+    count = 0
+    for row in rows:
+        yield row
+        count += 1
+        if count % EXPORT_CHUNK_SIZE == 0:
+            progress(count)
+    progress(count)
+
+
+# Listados exportables
+
+class ExportDefinition:
+    """Qué se exporta: nombre (también del archivo), columnas, queryset y hoja"""
+
+    def __init__(self, name, columns, queryset, sheet_name):
+        self.name = name
+        self.columns = columns
+        # Función que arma el queryset en cada exportación
+        self.queryset = queryset
+        self.sheet_name = sheet_name
+
+
+def _patients_with_totals():
+    # Totales de compras calculados en la misma consulta del listado
+    return Patient.objects.annotate(
+        total_purchases=Count('purchase_history'),
+        total_spent=Sum(
+            F('purchase_history__price') * F('purchase_history__quantity'),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        last_purchase=Max('purchase_history__date'),
+    ).order_by('name')
+
+
+EXPORTS = {
+    definition.name: definition
+    for definition in (
+        ExportDefinition(
+            'productos',
+            [
+                Column('Código', 'code'),
+                Column('Nombre', 'name'),
+                Column(
+                    'Categoría',
+                    'category',
+                    serializers.choice_label(Product.CATEGORY_CHOICES),
+                ),
+                Column('Proveedor', 'supplier'),
+                Column('Stock', 'stock'),
+                Column('Precio', 'price', serializers.as_float),
+                Column(
+                    'Estado', 'status', serializers.choice_label(Product.STATUS_CHOICES)
+                ),
+                Column('Tipo', 'type', serializers.choice_label(Product.TYPE_CHOICES)),
+                Column('Fecha Creación', 'created_at', serializers.as_datetime),
+            ],
+            Product.objects.all,
+            'Productos',
+        ),
+        ExportDefinition(
+            'pacientes',
+            [
+                Column('Nombre', 'name'),
+                Column('Email', 'email'),
+                Column('Teléfono', 'phone'),
+                Column(
+                    'Estado', 'status', serializers.choice_label(Patient.STATUS_CHOICES)
+                ),
+                Column('Dirección', 'address', serializers.or_empty),
+                Column('Notas', 'notes', serializers.or_empty),
+                Column('Total Compras', 'total_purchases'),
+                Column('Total Gastado', 'total_spent', serializers.as_float),
+                Column('Última Compra', 'last_purchase', serializers.as_datetime),
+                Column('Fecha Registro', 'created_at', serializers.as_datetime),
+            ],
+            _patients_with_totals,
+            'Pacientes',
+        ),
+        ExportDefinition(
+            'compras',
+            [
+                Column('Número', 'purchase_number'),
+                Column('Proveedor', 'supplier'),
+                Column('Valor Total', 'total_amount', serializers.as_float),
+                Column(
+                    'Estado',
+                    'status',
+                    serializers.choice_label(Purchase.STATUS_CHOICES),
+                ),
+                Column('Notas', 'notes', serializers.or_empty),
+                Column('Fecha Creación', 'created_at', serializers.as_datetime),
+            ],
+            Purchase.objects.all,
+            'Compras',
+        ),
+    )
+}
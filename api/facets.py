@@ -0,0 +1,66 @@
+"""Facetas de filtrado del listado de productos, servidas desde caché.
+
+Se calculan con dos consultas (proveedores distintos y un GROUP BY por
+categoría, tipo y estado). La clave incluye la versión de Product de
+api.response_cache, que vive en la caché compartida y cambia con cada
+escritura de productos en cualquier proceso (señales, importaciones,
+movimientos de stock, trabajos): así una caché local a cada proceso
+nunca sirve facetas de una versión anterior.
+"""
+from django.core.cache import cache
+from django.db.models import Count
+
+from . import response_cache
+from .models import Product
+
+PRODUCT_FACETS_CACHE_KEY = 'api:product_facets'
+PRODUCT_FACETS_TIMEOUT = 300
+
+
+def _compute_product_facets():
+    suppliers = list(
+        Product.objects
+        .order_by('supplier')
+        .values_list('supplier', flat=True)
+        .distinct()
+    )
+    counts = {'category': {}, 'type': {}, 'status': {}}
+    rows = (
+        Product.objects
+        .values('category', 'type', 'status')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    for row in rows:
+        for field, totals in counts.items():
+            totals[row[field]] = totals.get(row[field], 0) + row['count']
+
+    return {
+        'suppliers': suppliers,
+        'categories': [choice[0] for choice in Product.CATEGORY_CHOICES],
+        'types': [choice[0] for choice in Product.TYPE_CHOICES],
+        'statuses': [choice[0] for choice in Product.STATUS_CHOICES],
+        'counts': {
+            'categories': {
+                code: counts['category'].get(code, 0)
+                for code, _ in Product.CATEGORY_CHOICES
+            },
+            'types': {
+                code: counts['type'].get(code, 0) for code, _ in Product.TYPE_CHOICES
+            },
+            'statuses': {
+                code: counts['status'].get(code, 0)
+                for code, _ in Product.STATUS_CHOICES
+            },
+        },
+    }
+
+
+def _cache_key():
+    return f'{PRODUCT_FACETS_CACHE_KEY}:{response_cache.model_version(Product)}'
+
+
+def product_facets():
+    return cache.get_or_set(
+        _cache_key(), _compute_product_facets, PRODUCT_FACETS_TIMEOUT
+    )
@@ -0,0 +1,443 @@
+"""Importación masiva de productos desde CSV o XLSX.
+
+El archivo se lee fila a fila (CSV con csv.reader sobre el archivo
+subido, XLSX con iterparse sobre la hoja dentro del zip), así la
+memoria no depende del tamaño del catálogo. Las filas válidas se
+guardan por lotes: las que traen ``code`` se insertan o actualizan con
+``bulk_create(update_conflicts=True)`` sobre ese código y las nuevas
+sin código reciben uno generado en bloque. El estado se calcula desde
+el stock al armar el lote. Como bulk_create no emite señales, cada lote
+actualiza a mano el resumen de inventario y el índice de búsqueda, y
+cambia la versión de Product de la caché de respuestas (de la que
+dependen también las facetas de filtrado).
+
+Los encabezados aceptan el nombre del campo o el de la exportación
+(``Código``, ``Nombre``, ``Categoría``...); las columnas que no se
+importan (``Estado``, ``Fecha Creación``) se ignoran. Si el archivo no
+tiene columna de stock o de tipo, los productos existentes conservan
+el valor que tenían. El stock de un producto existente no puede quedar
+por debajo de las unidades apartadas por reservas: esa fila se informa
+como error y el producto no se toca.
+
+Los CSV se leen como UTF-8; las líneas que no lo son se leen como
+Windows-1252 (lo que guarda Excel en español por defecto).
+"""
+import csv
+import itertools
+import re
+import uuid
+import zipfile
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from xml.etree import ElementTree
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import response_cache, rollups, search
+from .models import Product
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_ERRORS = 1000
+
+MAX_PRICE = Decimal('99999999.99')
+
+COLUMN_ALIASES = {
+    'code': ('code', 'código', 'codigo'),
+    'name': ('name', 'nombre'),
+    'category': ('category', 'categoría', 'categoria'),
+    'supplier': ('supplier', 'proveedor'),
+    'stock': ('stock',),
+    'price': ('price', 'precio'),
+    'type': ('type', 'tipo'),
+}
+REQUIRED_COLUMNS = ('name', 'category', 'supplier', 'price')
+# Columnas que un archivo puede omitir; entonces no se tocan en los productos existentes
+OPTIONAL_UPDATE_COLUMNS = ('stock', 'type')
+
+_HEADER_FIELDS = {
+    alias: field for field, aliases in COLUMN_ALIASES.items() for alias in aliases
+}
+
+_XLSX_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_XLSX_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_CELL_COLUMN = re.compile(r'[A-Z]+')
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def _choice_values(choices):
+    """Acepta el código o la etiqueta de cada opción, sin distinguir mayúsculas"""
+    values = {}
+    for code, label in choices:
+        values[code.lower()] = code
+        values[label.lower()] = code
+    return values
+
+
+CATEGORY_VALUES = _choice_values(Product.CATEGORY_CHOICES)
+TYPE_VALUES = _choice_values(Product.TYPE_CHOICES)
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, row_number, errors):
+        self.error_count += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+
+# Lectura de archivos
+
+def _decode_line(line, first):
+    try:
+        return line.decode('utf-8-sig' if first else 'utf-8')
+    except UnicodeDecodeError:
+        pass
+    try:
+        return line.decode('cp1252')
+    except UnicodeDecodeError:
+        # Los cinco bytes sin asignar en Windows-1252 se leen como Latin-1
+        return line.decode('latin-1')
+
+
+def _decoded_lines(fileobj):
+    for number, line in enumerate(fileobj):
+        yield _decode_line(line, number == 0)
+
+
+def _csv_rows(fileobj):
+    lines = _decoded_lines(fileobj)
+    first = next(lines, '')
+    # Excel en español guarda CSV separados por punto y coma
+    delimiter = ';' if first.count(';') > first.count(',') else ','
+    return csv.reader(itertools.chain([first], lines), delimiter=delimiter)
+
+
+def _xlsx_sheet_path(archive):
+    """Ruta de la primera hoja según workbook.xml y sus relaciones"""
+    try:
+        workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+        relationships = ElementTree.fromstring(
+            archive.read('xl/_rels/workbook.xml.rels')
+        )
+        rel_id = workbook.find(f'{_XLSX_NS}sheets/{_XLSX_NS}sheet').get(
+            f'{_XLSX_REL_NS}id'
+        )
+        target = next(
+            rel.get('Target') for rel in relationships if rel.get('Id') == rel_id
+        )
+    except (KeyError, AttributeError, StopIteration):
+        return 'xl/worksheets/sheet1.xml'
+    return target.lstrip('/') if target.startswith('/') else f'xl/{target}'
+
+
+def _xlsx_shared_strings(archive):
+    try:
+        data = archive.open('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+    strings = []
+    with data:
+        for _, element in ElementTree.iterparse(data):
+            if element.tag == f'{_XLSX_NS}si':
+                strings.append(
+                    ''.join(text.text or '' for text in element.iter(f'{_XLSX_NS}t'))
+                )
+                element.clear()
+    return strings
+
+
+def _xlsx_column(reference):
+    index = 0
+    for letter in _CELL_COLUMN.match(reference).group():
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def _xlsx_value(cell, strings):
+    cell_type = cell.get('t')
+    if cell_type == 'inlineStr':
+        return ''.join(text.text or '' for text in cell.iter(f'{_XLSX_NS}t'))
+    value = cell.findtext(f'{_XLSX_NS}v') or ''
+    if cell_type == 's' and value:
+        return strings[int(value)]
+    return value
+
+
+def _xlsx_rows(archive):
+    try:
+        with archive:
+            strings = _xlsx_shared_strings(archive)
+            with archive.open(_xlsx_sheet_path(archive)) as sheet:
+                for _, element in ElementTree.iterparse(sheet):
+                    if element.tag != f'{_XLSX_NS}row':
+                        continue
+                    values = []
+                    for cell in element.iter(f'{_XLSX_NS}c'):
+                        reference = cell.get('r')
+                        column = _xlsx_column(reference) if reference else len(values)
+                        values.extend([''] * (column - len(values)))
+                        values.append(_xlsx_value(cell, strings))
+                    element.clear()
+                    yield values
+    # Hoja ausente, XML truncado o índices fuera de rango: el zip no es un libro válido
+    except (
+        KeyError,
+        IndexError,
+        ValueError,
+        AttributeError,
+        ElementTree.ParseError,
+        zipfile.BadZipFile,
+    ) as e:
+        raise ImportFormatError('El archivo no es un XLSX válido') from e
+
+
+def read_rows(fileobj, file_format):
+    """Filas del archivo como listas de textos, empezando por el encabezado"""
+    if file_format == 'csv':
+        return _csv_rows(fileobj)
+    if file_format == 'xlsx':
+        try:
+            archive = zipfile.ZipFile(fileobj)
+        except zipfile.BadZipFile as e:
+            raise ImportFormatError('El archivo no es un XLSX válido') from e
+        return _xlsx_rows(archive)
+    raise ImportFormatError(f'Formato no soportado "{file_format}", use csv o xlsx')
+
+
+def detect_format(filename, requested=''):
+    if requested:
+        return requested.lower()
+    return 'xlsx' if filename.lower().endswith('.xlsx') else 'csv'
+
+
+# Validación
+
+def _columns(header):
+    columns = {}
+    for position, title in enumerate(header):
+        field = _HEADER_FIELDS.get(str(title).strip().lower())
+        if field and field not in columns:
+            columns[field] = position
+    missing = [field for field in REQUIRED_COLUMNS if field not in columns]
+    if missing:
+        raise ImportFormatError(f'Faltan columnas obligatorias: {", ".join(missing)}')
+    return columns
+
+
+def _text(value):
+    return str(value).strip() if value is not None else ''
+
+
+def _parse_row(values, columns):
+    """Devuelve ``(campos, errores)`` de una fila del archivo"""
+    raw = {
+        field: _text(values[position]) if position < len(values) else ''
+        for field, position in columns.items()
+    }
+    fields = {}
+    errors = {}
+
+    if raw.get('code'):
+        if len(raw['code']) > 20:
+            errors['code'] = 'Máximo 20 caracteres'
+        fields['code'] = raw['code']
+    for field, max_length in (('name', 200), ('supplier', 100)):
+        if not raw[field]:
+            errors[field] = 'Campo obligatorio'
+        elif len(raw[field]) > max_length:
+            errors[field] = f'Máximo {max_length} caracteres'
+        fields[field] = raw[field]
+
+    category = CATEGORY_VALUES.get(raw['category'].lower())
+    if category is None:
+        errors['category'] = f'Categoría inválida "{raw["category"]}"'
+    fields['category'] = category
+
+    try:
+        price = Decimal(raw['price'].replace(',', '.')).quantize(Decimal('0.01'))
+        if price < 0 or price > MAX_PRICE:
+            raise InvalidOperation
+        fields['price'] = price
+    except InvalidOperation:
+        errors['price'] = f'Precio inválido "{raw["price"]}"'
+
+    if 'stock' in columns:
+        try:
+            stock = Decimal(raw['stock'] or '0')
+            if stock < 0 or stock != stock.to_integral_value():
+                raise InvalidOperation
+            fields['stock'] = int(stock)
+        except InvalidOperation:
+            errors['stock'] = f'Stock inválido "{raw["stock"]}"'
+
+    if 'type' in columns:
+        product_type = TYPE_VALUES.get((raw['type'] or 'propio').lower())
+        if product_type is None:
+            errors['type'] = f'Tipo inválido "{raw["type"]}"'
+        fields['type'] = product_type
+
+    return fields, errors
+
+
+# Escritura por lotes
+
+def _generate_codes(products):
+    """Asigna códigos nuevos en bloque, regenerando los que ya existan"""
+    pending = products
+    while pending:
+        for product in pending:
+            product.code = f"PROD-{str(uuid.uuid4())[:8].upper()}"
+        codes = Counter(product.code for product in pending)
+        taken = set(
+            Product.objects.filter(code__in=list(codes)).values_list('code', flat=True)
+        )
+        pending = [
+            product
+            for product in pending
+            if product.code in taken or codes[product.code] > 1
+        ]
+
+
+def _save_batch(batch, columns, result):
+    """Guarda ``batch`` (pares ``(número de fila, campos)``) en una transacción"""
+    now = timezone.now()
+    update_fields = ['name', 'category', 'supplier', 'price', 'updated_at']
+    update_fields += [field for field in OPTIONAL_UPDATE_COLUMNS if field in columns]
+    if 'stock' in columns:
+        update_fields.append('status')
+
+    with transaction.atomic():
+        codes = [fields['code'] for _, fields in batch if 'code' in fields]
+        # Las filas existentes se bloquean antes de leerlas (ver Product.locked_row):
+        # una venta o reserva simultánea no cambia el stock entre la lectura y el upsert
+        existing = Product.objects.filter(code__in=codes)
+        existing.update(stock=F('stock'))
+        previous = {}
+        reserved = {}
+        for (
+            code,
+            pk,
+            category,
+            stock,
+            product_type,
+            units,
+        ) in existing.select_for_update().values_list(
+            'code', 'id', 'category', 'stock', 'type', 'reserved'
+        ):
+            previous[code] = (pk, category, stock, product_type)
+            reserved[code] = units
+
+        upserts = []
+        inserts = []
+        for row_number, fields in batch:
+            code = fields.get('code')
+            if 'stock' in fields and fields['stock'] < reserved.get(code, 0):
+                result.add_error(row_number, {
+                    'stock': (
+                        f'Stock {fields["stock"]} menor que las unidades reservadas '
+                        f'({reserved[code]})'
+                    ),
+                })
+                del previous[code]
+                continue
+            product = Product(**fields, created_at=now, updated_at=now)
+            if code in previous:
+                # Lo que el archivo no trae se conserva, también para el resumen
+                if 'stock' not in columns:
+                    product.stock = previous[code][2]
+                if 'type' not in columns:
+                    product.type = previous[code][3]
+            product.status = Product.status_for_stock(product.stock)
+            (upserts if product.code else inserts).append(product)
+
+        if inserts:
+            _generate_codes(inserts)
+            Product.objects.bulk_create(inserts)
+        if upserts:
+            Product.objects.bulk_create(
+                upserts,
+                update_conflicts=True,
+                unique_fields=['code'],
+                update_fields=update_fields,
+            )
+            for product in upserts:
+                if product.code in previous:
+                    product.pk = previous[product.code][0]
+            missing_pk = [product for product in upserts if product.pk is None]
+            if missing_pk:
+                # Motores sin RETURNING en upserts
+                ids = dict(
+                    Product.objects.filter(
+                        code__in=[product.code for product in missing_pk]
+                    ).values_list('code', 'id')
+                )
+                for product in missing_pk:
+                    product.pk = ids[product.code]
+
+        products = inserts + upserts
+        rollups.record_products_upserted(
+            products,
+            {
+                pk: (category, stock, product_type)
+                for pk, category, stock, product_type in previous.values()
+            },
+        )
+        search.index_instances(products)
+        response_cache.invalidate(Product)
+
+    result.updated += len(previous)
+    result.created += len(products) - len(previous)
+
+
+def import_products(rows, batch_size=IMPORT_BATCH_SIZE):
+    """Valida e importa las filas (encabezado primero); devuelve un ImportResult"""
+    rows = iter(rows)
+    header = next(rows, None)
+    if not header:
+        raise ImportFormatError('El archivo está vacío')
+    columns = _columns(header)
+
+    result = ImportResult()
+    seen_codes = set()
+    batch = []
+    for row_number, values in enumerate(rows, 2):
+        if not any(_text(value) for value in values):
+            continue
+        result.rows += 1
+        fields, errors = _parse_row(values, columns)
+        code = fields.get('code')
+        if code and code in seen_codes:
+            errors['code'] = f'Código repetido en el archivo "{code}"'
+        if errors:
+            result.add_error(row_number, errors)
+            continue
+        if code:
+            seen_codes.add(code)
+        batch.append((row_number, fields))
+        if len(batch) >= batch_size:
+            _save_batch(batch, columns, result)
+            batch = []
+    if batch:
+        _save_batch(batch, columns, result)
+
+    return result
@@ -0,0 +1,204 @@
+"""Cola de exportaciones en segundo plano sobre la base de datos.
+
+Sin broker externo: cada pedido es una fila de ExportJob. El comando
+``run_jobs`` toma los pendientes con un UPDATE condicional (de
+``pendiente`` a ``en_proceso``), así varios procesos o máquinas pueden
+atender la cola sin tomar dos veces el mismo trabajo, y los ejecuta en
+un pool de procesos. Cada trabajo escribe el archivo en
+``EXPORT_JOBS_DIR`` con extensión ``.part`` y lo renombra al terminar;
+el avance (filas escritas) se guarda en cada bloque.
+
+Cancelar es pasar el estado a ``cancelado``: si el trabajo está
+corriendo lo nota en la siguiente actualización de avance, que es
+condicional al estado, y borra el archivo parcial. Dos pedidos iguales
+mientras uno sigue activo devuelven el mismo trabajo; la restricción
+única parcial sobre ``dedup_key`` lo garantiza aun con pedidos
+simultáneos.
+"""
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connections, transaction
+from django.utils import timezone
+
+from . import exports, routers
+from .models import ExportJob
+
+# Un trabajo en proceso sin avance en este tiempo se considera abandonado (worker caído)
+JOB_STALE_AFTER = timedelta(minutes=10)
+JOB_RETENTION = timedelta(days=7)
+FINISHED_STATUSES = ['completado', 'fallido', 'cancelado']
+
+
+class JobError(ValueError):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def jobs_dir():
+    return Path(
+        getattr(settings, 'EXPORT_JOBS_DIR', Path(settings.MEDIA_ROOT) / 'exports')
+    )
+
+
+def _dedup_key(export, export_format):
+    return hashlib.sha1(f'{export}:{export_format}'.encode('utf-8')).hexdigest()
+
+
+def enqueue(export, export_format=''):
+    """Encola la exportación o reutiliza una activa igual; da ``(trabajo, creado)``"""
+    definition = exports.EXPORTS.get(export)
+    if definition is None:
+        raise JobError(
+            f'Exportación desconocida "{export}", use {", ".join(exports.EXPORTS)}'
+        )
+    if export_format and export_format not in exports.FORMATS:
+        raise JobError(
+            f'Formato no soportado "{export_format}", use {", ".join(exports.FORMATS)}'
+        )
+    export_format = exports.resolve_format(export_format, definition.queryset())
+
+    key = _dedup_key(export, export_format)
+    for _ in range(3):
+        existing = ExportJob.objects.filter(
+            dedup_key=key, status__in=ExportJob.ACTIVE_STATUSES
+        ).first()
+        if existing is not None:
+            return existing, False
+        try:
+            with transaction.atomic():
+                return ExportJob.objects.create(
+                    export=export, format=export_format, dedup_key=key
+                ), True
+        except IntegrityError:
+            # Otro pedido igual se encoló entre la consulta y el INSERT
+            continue
+    raise JobError('No se pudo encolar la exportación, intente de nuevo')
+
+
+def cancel(token):
+    """Cancela el trabajo si sigue activo; devuelve si se canceló"""
+    now = timezone.now()
+    return bool(
+        ExportJob.objects.filter(
+            token=token, status__in=ExportJob.ACTIVE_STATUSES
+        ).update(
+            status='cancelado',
+            finished_at=now,
+            updated_at=now,
+        )
+    )
+
+
+def claim_next():
+    """Marca como en proceso el pendiente más antiguo y devuelve su id (o None)"""
+    pending = (
+        ExportJob.objects
+        .filter(status='pendiente')
+        .order_by('created_at')
+        .values_list('id', flat=True)[:20]
+    )
+    for job_id in pending:
+        now = timezone.now()
+        if ExportJob.objects.filter(pk=job_id, status='pendiente').update(
+            status='en_proceso', started_at=now, updated_at=now,
+        ):
+            return job_id
+    return None
+
+
+def release(job_ids):
+    """Devuelve a la cola trabajos tomados que no se van a terminar (worker detenido)"""
+    return ExportJob.objects.filter(pk__in=job_ids, status='en_proceso').update(
+        status='pendiente', progress=0, updated_at=timezone.now(),
+    )
+
+
+def requeue_stale():
+    now = timezone.now()
+    return ExportJob.objects.filter(
+        status='en_proceso', updated_at__lt=now - JOB_STALE_AFTER
+    ).update(
+        status='pendiente',
+        progress=0,
+        updated_at=now,
+    )
+
+
+def purge(older_than=JOB_RETENTION):
+    """Borra los trabajos terminados hace más de ``older_than`` y sus archivos"""
+    finished = ExportJob.objects.filter(
+        status__in=FINISHED_STATUSES, finished_at__lt=timezone.now() - older_than
+    )
+    for file_path in finished.exclude(file_path='').values_list('file_path', flat=True):
+        Path(file_path).unlink(missing_ok=True)
+    return finished.delete()[0]
+
+
+def _update(job_id, **fields):
+    """Actualiza el trabajo solo si sigue en proceso; si no, fue cancelado"""
+    if not ExportJob.objects.filter(pk=job_id, status='en_proceso').update(
+        updated_at=timezone.now(), **fields
+    ):
+        raise JobCancelled
+
+
+def _finish(job_id, **fields):
+    now = timezone.now()
+    return ExportJob.objects.filter(pk=job_id, status='en_proceso').update(
+        finished_at=now, updated_at=now, **fields
+    )
+
+
+def run(job_id):
+    """Ejecuta un trabajo ya tomado con ``claim_next`` (en un proceso del pool)"""
+    # La exportación se lee con un cursor abierto de principio a fin; en SQLite
+    # esa conexión no puede escribir si otra escribió mientras tanto, así que
+    # el avance y el estado se guardan desde otro hilo, con su propia conexión.
+    writer = ThreadPoolExecutor(max_workers=1)
+
+    def write(function, **fields):
+        return writer.submit(function, job_id, **fields).result()
+
+    try:
+        job = ExportJob.objects.get(pk=job_id)
+        definition = exports.EXPORTS[job.export]
+        directory = jobs_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'{job.token}.{job.format}'
+        partial = path.with_name(f'{path.name}.part')
+
+        try:
+            # Los datos se leen de la réplica, si hay; el estado va a la primaria
+            with routers.reading_from_replica():
+                write(_update, total=definition.queryset().count())
+                with open(partial, 'wb') as fileobj:
+                    exports.write_export(
+                        fileobj,
+                        definition,
+                        job.format,
+                        progress=lambda rows: write(_update, progress=rows),
+                    )
+            os.replace(partial, path)
+            if not write(_finish, status='completado', file_path=str(path)):
+                raise JobCancelled
+        except JobCancelled:
+            partial.unlink(missing_ok=True)
+            path.unlink(missing_ok=True)
+            return 'cancelado'
+        except Exception as e:
+            partial.unlink(missing_ok=True)
+            write(_finish, status='fallido', error=str(e))
+            raise
+        return 'completado'
+    finally:
+        writer.submit(connections.close_all).result()
+        writer.shutdown()
+        close_old_connections()
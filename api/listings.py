@@ -0,0 +1,176 @@
+"""Consultas y respuestas de los listados de la API.
+
+Las comparten las vistas síncronas (api.views) y las asíncronas
+(api.async_views): cada función arma el queryset ya filtrado y
+reducido a las columnas del serializador sin tocar la base, y las
+vistas lo paginan y lo recorren con el ORM síncrono o el asíncrono. Las
+filas relacionadas (últimas compras, líneas de venta) se piden en una
+consulta por página y se agrupan al armar la respuesta. Un filtro con
+un valor no válido lanza InvalidFilter, que las vistas contestan con
+un 400.
+"""
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from . import serializers
+from .models import (
+    Appointment,
+    Patient,
+    PatientPurchaseHistory,
+    Product,
+    Sale,
+    SaleItem,
+)
+from .search import search as full_text_search
+
+RECENT_PURCHASES_LIMIT = 5
+
+PRODUCT_CURSOR_ORDERING = ['-created_at', '-id']
+PATIENT_CURSOR_ORDERING = ['name', 'id']
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+def _id_param(params, name):
+    try:
+        value = int(params[name])
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise InvalidFilter(f'{name} debe ser un id válido')
+    return value
+
+
+# Productos
+
+def products(params):
+    products = Product.objects.all()
+    if params.get('search'):
+        products = full_text_search(products, params['search'])
+    if params.get('category'):
+        products = products.filter(category=params['category'])
+    if params.get('supplier'):
+        products = products.filter(supplier__icontains=params['supplier'])
+    if params.get('type'):
+        products = products.filter(type=params['type'])
+    # Solo las columnas del listado, sin instanciar modelos
+    return serializers.PRODUCT_LIST.values(products)
+
+
+def product_list(rows, pagination, product_facets):
+    return {
+        'products': serializers.PRODUCT_LIST.serialize(rows),
+        'pagination': pagination,
+        'filters': {
+            'suppliers': product_facets['suppliers'],
+            'categories': product_facets['categories'],
+            'types': product_facets['types'],
+        }
+    }
+
+
+# Pacientes
+
+def patients(params):
+    patients = Patient.objects.all()
+    if params.get('search'):
+        patients = full_text_search(patients, params['search'])
+    if params.get('status'):
+        patients = patients.filter(status=params['status'])
+
+    patients = serializers.PATIENT_LIST.values(
+        patients.annotate(total_purchases=Count('purchase_history')), 'total_purchases'
+    )
+    if not params.get('search'):
+        # El GROUP BY del annotate descarta el ordering por defecto del modelo;
+        # el id desempata nombres repetidos para que las páginas no se solapen
+        patients = patients.order_by(*PATIENT_CURSOR_ORDERING)
+    return patients
+
+
+def recent_purchases(patient_ids):
+    """Últimas compras de los pacientes de la página en una consulta con ventana"""
+    return serializers.RECENT_PURCHASE.values(
+        PatientPurchaseHistory.objects
+        .filter(patient_id__in=patient_ids)
+        .annotate(
+            position=Window(
+                RowNumber(), partition_by=[F('patient_id')], order_by=[F('date').desc()]
+            )
+        )
+        .filter(position__lte=RECENT_PURCHASES_LIMIT),
+        'patient_id',
+    )
+
+
+def patient_list(rows, history_rows, pagination):
+    history = serializers.group_by(history_rows, 'patient_id')
+    patients_data = serializers.PATIENT_LIST.serialize(rows)
+    for patient, row in zip(patients_data, rows, strict=True):
+        patient['purchase_history'] = serializers.RECENT_PURCHASE.serialize(
+            history.get(row['id'], ())
+        )
+        patient['total_purchases'] = row['total_purchases']
+    return {
+        'patients': patients_data,
+        'pagination': pagination,
+        'filters': {
+            'statuses': [choice[0] for choice in Patient.STATUS_CHOICES],
+        }
+    }
+
+
+# Ventas
+
+def sales(params):
+    sales = Sale.objects.all()
+    if params.get('status'):
+        sales = sales.filter(status=params['status'])
+    if params.get('patient'):
+        sales = sales.filter(patient_id=_id_param(params, 'patient'))
+    return serializers.SALE_LIST.values(sales)
+
+
+def sale_items(sale_ids):
+    """Líneas de toda la página en una sola consulta"""
+    return serializers.SALE_ITEM.values(
+        SaleItem.objects.filter(sale_id__in=sale_ids).order_by('id'), 'sale_id'
+    )
+
+
+def sale_list(rows, item_rows, pagination):
+    items = serializers.group_by(item_rows, 'sale_id')
+    sales_data = serializers.SALE_LIST.serialize(rows)
+    for sale, row in zip(sales_data, rows, strict=True):
+        sale['items'] = serializers.SALE_ITEM.serialize(items.get(row['id'], ()))
+    return {
+        'sales': sales_data,
+        'pagination': pagination,
+        'filters': {
+            'statuses': [choice[0] for choice in Sale.STATUS_CHOICES],
+        }
+    }
+
+
+# Citas
+
+def appointments(start, end, params):
+    appointments = Appointment.objects.filter(date__range=(start, end))
+    if params.get('doctor'):
+        appointments = appointments.filter(doctor=params['doctor'])
+    if params.get('status'):
+        appointments = appointments.filter(status=params['status'])
+    return serializers.APPOINTMENT_LIST.values(appointments)
+
+
+def appointment_list(rows, start, end):
+    return {
+        'appointments': serializers.APPOINTMENT_LIST.serialize(rows),
+        'range': {'start': start.isoformat(), 'end': end.isoformat()},
+        'filters': {
+            'statuses': [choice[0] for choice in Appointment.STATUS_CHOICES],
+            'types': [choice[0] for choice in Appointment.TYPE_CHOICES],
+        }
+    }
@@ -0,0 +1,240 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Mide latencia y consultas de los endpoints y compara con una línea base'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios', nargs='*', help='Escenarios a correr (por defecto, todos)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=benchmarks.DEFAULT_REPEAT,
+            help='Repeticiones medidas por escenario',
+        )
+        parser.add_argument(
+            '--baseline', help='JSON de una corrida anterior con el que comparar'
+        )
+        parser.add_argument('--save-baseline', help='Guarda el resultado en este JSON')
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=benchmarks.DEFAULT_TOLERANCE,
+            help='Empeoramiento de la mediana tolerado (0.25 = 25%%)',
+        )
+        parser.add_argument(
+            '--with-cache',
+            action='store_true',
+            help='Mide con la caché de respuestas activa',
+        )
+        parser.add_argument(
+            '--list', action='store_true', help='Lista los escenarios disponibles'
+        )
+        parser.add_argument(
+            '--load', metavar='URL',
+            help='Prueba de carga contra un servidor (p. ej. http://127.0.0.1:8000)',
+        )
+        parser.add_argument(
+            '--clients',
+            type=int,
+            default=200,
+            help='Clientes concurrentes de la prueba de carga',
+        )
+        parser.add_argument('--requests-per-client', type=int, default=10)
+        parser.add_argument(
+            '--serializers',
+            action='store_true',
+            help='Microbenchmark de serialización por fila (página de 10k productos)',
+        )
+        parser.add_argument(
+            '--patient-export', action='store_true',
+            help='Exporta los pacientes con un conteo por fila y con totales anotados',
+        )
+        parser.add_argument(
+            '--concurrency', action='store_true',
+            help='Lecturas del dashboard y ventas a la vez con cada perfil de SQLite',
+        )
+        parser.add_argument(
+            '--readers',
+            type=int,
+            default=8,
+            help='Procesos lectores del benchmark de concurrencia',
+        )
+        parser.add_argument(
+            '--writers',
+            type=int,
+            default=2,
+            help='Procesos escritores del benchmark de concurrencia',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10.0,
+            help='Segundos de medición por perfil',
+        )
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for scenario in benchmarks.SCENARIOS:
+                self.stdout.write(scenario.name)
+            return
+        if options['load']:
+            self._load(options)
+            return
+        if options['concurrency']:
+            self._concurrency(options)
+            return
+        if options['patient_export']:
+            self._patient_export(options)
+            return
+        if options['serializers']:
+            try:
+                rows, costs = benchmarks.serializer_microbenchmark()
+            except benchmarks.BenchmarkError as e:
+                raise CommandError(str(e)) from e
+            for name, cost in costs.items():
+                self.stdout.write(f'{name:<32} {cost:>8.2f} µs/fila')
+            self.stdout.write(self.style.SUCCESS(f'Medido sobre {rows} productos'))
+            return
+        if options['repeat'] < 1:
+            raise CommandError('--repeat debe ser al menos 1')
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as fileobj:
+                    baseline = json.load(fileobj)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'No se pudo leer la línea base: {e}') from e
+
+        def log(name, result):
+            previous = (baseline or {}).get('results', {}).get(name)
+            reference = (
+                f"  (base {previous['median_ms']:.1f} ms, {previous['queries']} q)"
+                if previous
+                else ''
+            )
+            self.stdout.write(
+                f"{name:<30} mediana {result['median_ms']:>9.1f} ms  "
+                f"p95 {result['p95_ms']:>9.1f} ms  "
+                f"{result['queries']:>5} consultas{reference}"
+            )
+
+        self.stdout.write(
+            f"Datos: {', '.join(f'{k}={v}' for k, v in benchmarks.dataset().items())}"
+        )
+        try:
+            report = benchmarks.run(
+                options['scenarios'], options['repeat'], options['with_cache'], log=log
+            )
+        except benchmarks.BenchmarkError as e:
+            raise CommandError(str(e)) from e
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w', encoding='utf-8') as fileobj:
+                json.dump(report, fileobj, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultado guardado en {options['save_baseline']}")
+
+        if baseline is None:
+            self.stdout.write(
+                self.style.SUCCESS(f"{len(report['results'])} escenarios medidos")
+            )
+            return
+        if baseline.get('dataset') != report['dataset']:
+            self.stderr.write(self.style.WARNING(
+                'Los datos no coinciden con los de la línea base; '
+                'la comparación es orientativa'
+            ))
+        regressions = benchmarks.compare(report, baseline, options['tolerance'])
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(self.style.ERROR(regression))
+            raise CommandError(f'{len(regressions)} regresiones frente a la línea base')
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(report['results'])} escenarios sin regresiones")
+        )
+
+    def _load(self, options):
+        try:
+            report = benchmarks.load_test(
+                options['load'],
+                options['scenarios'],
+                options['clients'],
+                options['requests_per_client'],
+            )
+        except benchmarks.BenchmarkError as e:
+            raise CommandError(str(e)) from e
+        for name, result in report['results'].items():
+            self.stdout.write(
+                f"{name:<30} mediana {result['median_ms']:>9.1f} ms  "
+                f"p95 {result['p95_ms']:>9.1f} ms  "
+                f"p99 {result['p99_ms']:>9.1f} ms  {result['errors']:>4} errores"
+            )
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w', encoding='utf-8') as fileobj:
+                json.dump(report, fileobj, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['requests']} peticiones con {report['clients']} clientes: "
+            f"{report['throughput_rps']} req/s, "
+            f"p95 {report['p95_ms']:.1f} ms, {report['errors']} errores"
+        ))
+
+    def _patient_export(self, options):
+        try:
+            report = benchmarks.patient_export_comparison(min(options['repeat'], 3))
+        except benchmarks.BenchmarkError as e:
+            raise CommandError(str(e)) from e
+        labels = {
+            'per_patient_count': 'conteo por paciente',
+            'annotated': 'consulta anotada',
+        }
+        for name, result in report['results'].items():
+            self.stdout.write(
+                f"{labels[name]:<22} mediana {result['median_ms']:>10.1f} ms  "
+                f"{result['queries']:>7} consultas"
+            )
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w', encoding='utf-8') as fileobj:
+                json.dump(report, fileobj, indent=2, ensure_ascii=False)
+        self.stdout.write(
+            self.style.SUCCESS(f"Medido sobre {report['patients']} pacientes")
+        )
+
+    def _concurrency(self, options):
+        if (
+            options['readers'] < 0
+            or options['writers'] < 0
+            or options['readers'] + options['writers'] == 0
+        ):
+            raise CommandError('Se necesita al menos un proceso lector o escritor')
+
+        def log(profile, result):
+            for role, label in (('read', 'lecturas'), ('write', 'ventas')):
+                summary = result[role]
+                self.stdout.write(
+                    f"{profile:<12} {label:<9} {summary['per_second']:>8.1f}/s  "
+                    f"mediana {summary['median_ms']:>8.1f} ms  "
+                    f"p95 {summary['p95_ms']:>8.1f} ms  {summary['errors']:>4} errores"
+                )
+
+        try:
+            report = benchmarks.concurrency(
+                readers=options['readers'],
+                writers=options['writers'],
+                duration=options['duration'],
+                log=log,
+            )
+        except benchmarks.BenchmarkError as e:
+            raise CommandError(str(e)) from e
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w', encoding='utf-8') as fileobj:
+                json.dump(report, fileobj, indent=2, ensure_ascii=False)
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(report['results'])} perfiles medidos")
+        )
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import imports
+
+
+class Command(BaseCommand):
+    help = 'Importa o actualiza productos desde un archivo CSV o XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo a importar')
+        parser.add_argument(
+            '--format',
+            default='',
+            choices=['', 'csv', 'xlsx'],
+            help='Formato del archivo (por defecto, según la extensión)',
+        )
+        parser.add_argument('--batch-size', type=int, default=imports.IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        file_format = imports.detect_format(options['path'], options['format'])
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                result = imports.import_products(
+                    imports.read_rows(fileobj, file_format), options['batch_size']
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e)) from e
+        elapsed = time.perf_counter() - started
+
+        for error in result.errors:
+            messages = '; '.join(
+                f'{field}: {message}' for field, message in error['errors'].items()
+            )
+            self.stderr.write(f"Fila {error['row']}: {messages}")
+        self.stdout.write(self.style.SUCCESS(
+            f'{result.rows} filas en {elapsed:.1f}s '
+            f'({result.rows / elapsed if elapsed else 0:.0f} filas/s): '
+            f'{result.created} creados, {result.updated} actualizados, '
+            f'{result.error_count} con errores'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api import patient_stats
+from api.models import Patient, PatientActivityRollup
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores de compras de los pacientes y su resumen'
+
+    def handle(self, *args, **options):
+        patient_stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Contadores reconstruidos para {Patient.objects.count()} pacientes, '
+            f'{Patient.objects.filter(sale_count__gt=0).count()} con compras, '
+            f'{PatientActivityRollup.objects.count()} filas de resumen'
+        ))
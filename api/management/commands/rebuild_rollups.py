@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api import rollups
+from api.models import CategoryStockRollup, DailySalesRollup
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las tablas de resumen de ventas e inventario del dashboard'
+
+    def handle(self, *args, **options):
+        rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rollups reconstruidos: '
+            f'{DailySalesRollup.objects.count()} filas de ventas, '
+            f'{CategoryStockRollup.objects.count()} categorías de inventario'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api import search
+
+
+class Command(BaseCommand):
+    help = 'Reindexa desde cero la búsqueda de texto completo de productos y pacientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        search.rebuild(using=options['database'])
+        self.stdout.write(self.style.SUCCESS('Índice de búsqueda reconstruido'))
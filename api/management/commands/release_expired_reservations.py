@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from api import stock
+
+
+class Command(BaseCommand):
+    help = 'Libera las reservas de stock vencidas'
+
+    def handle(self, *args, **options):
+        released = stock.release_expired()
+        self.stdout.write(
+            self.style.SUCCESS(f'Reservas liberadas en {released} productos')
+        )
@@ -0,0 +1,105 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api import jobs
+
+# Cada cuánto se devuelven a la cola los trabajos abandonados y se borran los viejos
+MAINTENANCE_INTERVAL = 300
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta las exportaciones en segundo plano pendientes en un pool de procesos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help='Procesos del pool',
+        )
+        parser.add_argument(
+            '--once', action='store_true', help='Ejecuta los pendientes y termina'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Segundos entre consultas a la cola',
+        )
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        if processes < 1:
+            raise CommandError('--processes debe ser al menos 1')
+        if processes > 1 and not self._concurrent_writes():
+            # Sin WAL cada exportación bloquea la base mientras lee, y dos a la vez
+            # se bloquean entre sí
+            self.stderr.write('SQLite sin WAL: se usa un solo proceso')
+            processes = 1
+
+        # spawn: cada proceso abre su propia conexión en lugar de heredar la del padre
+        pool = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
+        running = {}
+        finished = 0
+        last_maintenance = 0.0
+        try:
+            while True:
+                if time.monotonic() - last_maintenance > MAINTENANCE_INTERVAL:
+                    requeued, purged = jobs.requeue_stale(), jobs.purge()
+                    if requeued or purged:
+                        self.stdout.write(
+                            f'{requeued} trabajos devueltos a la cola, '
+                            f'{purged} borrados'
+                        )
+                    last_maintenance = time.monotonic()
+
+                while len(running) < processes:
+                    job_id = jobs.claim_next()
+                    if job_id is None:
+                        break
+                    running[pool.submit(jobs.run, job_id)] = job_id
+
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, _ = wait(
+                    running,
+                    timeout=options['poll_interval'],
+                    return_when=FIRST_COMPLETED,
+                )
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        self.stdout.write(f'Trabajo {job_id}: {future.result()}')
+                    except Exception as e:
+                        self.stderr.write(f'Trabajo {job_id}: fallido ({e})')
+                    finished += 1
+        except KeyboardInterrupt:
+            # Los trabajos interrumpidos vuelven a la cola para otro worker
+            jobs.release(list(running.values()))
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+        self.stdout.write(self.style.SUCCESS(f'{finished} trabajos ejecutados'))
+
+    def _concurrent_writes(self):
+        if connection.vendor != 'sqlite':
+            return True
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            return cursor.fetchone()[0].lower() == 'wal'
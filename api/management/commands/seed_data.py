@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import seed
+
+
+class Command(BaseCommand):
+    help = 'Genera datos sintéticos de la óptica para pruebas de carga'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            default='small',
+            choices=list(seed.SCALES),
+            help='Volumen base: small=10k, medium=100k, large=1M',
+        )
+        parser.add_argument(
+            '--products',
+            type=int,
+            help='Cantidad de productos (por defecto, la de la escala)',
+        )
+        parser.add_argument('--patients', type=int, help='Cantidad de pacientes')
+        parser.add_argument('--sales', type=int, help='Cantidad de ventas')
+        parser.add_argument('--appointments', type=int, help='Cantidad de citas')
+        parser.add_argument(
+            '--seed', type=int, default=42, help='Semilla del generador aleatorio'
+        )
+        parser.add_argument('--batch-size', type=int, default=seed.SEED_BATCH_SIZE)
+        parser.add_argument(
+            '--flush', action='store_true', help='Borra antes todos los datos de la app'
+        )
+
+    def handle(self, *args, **options):
+        counts = seed.SeedCounts.for_scale(options['scale'])
+        for field in ('products', 'patients', 'sales', 'appointments'):
+            if options[field] is not None:
+                if options[field] < 0:
+                    raise CommandError(f'--{field} no puede ser negativo')
+                setattr(counts, field, options[field])
+        if (counts.sales or counts.appointments) and not counts.patients:
+            raise CommandError('Las ventas y citas necesitan pacientes')
+        if counts.sales and not counts.products:
+            raise CommandError('Las ventas necesitan productos')
+
+        started = time.perf_counter()
+        if options['flush']:
+            seed.flush()
+            self.stdout.write('Datos anteriores borrados')
+        seed.generate(
+            counts, options['seed'], options['batch_size'], log=self.stdout.write
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Datos generados en {time.perf_counter() - started:.1f}s: '
+            f'{counts.products} productos, '
+            f'{counts.patients} pacientes, {counts.sales} ventas, '
+            f'{counts.appointments} citas'
+        ))
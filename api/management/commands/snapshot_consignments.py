@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api import consignments
+
+
+class Command(BaseCommand):
+    help = 'Guarda la foto de acumulados de consignación (por defecto, mes anterior)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date', help='Fecha de cierre de la foto (YYYY-MM-DD, anterior a hoy)'
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recalcula todas las fotos existentes',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = consignments.rebuild_snapshots()
+            self.stdout.write(
+                self.style.SUCCESS(f'Fotos de consignación recalculadas: {count}')
+            )
+            return
+        if options['date']:
+            try:
+                as_of = date.fromisoformat(options['date'])
+            except ValueError as e:
+                raise CommandError('Fecha inválida, use el formato YYYY-MM-DD') from e
+        else:
+            as_of = timezone.localdate().replace(day=1) - timedelta(days=1)
+        try:
+            rows = consignments.take_snapshot(as_of)
+        except consignments.ConsignmentError as e:
+            raise CommandError(str(e)) from e
+        self.stdout.write(
+            self.style.SUCCESS(f'Foto de consignación al {as_of}: {rows} productos')
+        )
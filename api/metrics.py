@@ -0,0 +1,273 @@
+"""Métricas por endpoint de la API: consultas SQL, tiempos y percentiles.
+
+MetricsMiddleware mide cada petición a ``/api/``, síncrona o asíncrona:
+número de consultas y tiempo en SQL (un execute_wrapper instalado en
+cada conexión al crearla), tiempo de serialización (ver api.responses)
+y latencia total. Los valores se agregan en memoria por método y ruta,
+con una ventana de las últimas muestras para los percentiles, y se
+publican en ``/api/_metrics`` en formato de texto de Prometheus. Cada
+proceso tiene sus propias métricas.
+El endpoint solo responde a usuarios staff o a quien mande
+``Authorization: Bearer <API_METRICS_TOKEN>`` (``bearer_token`` en la
+configuración de Prometheus); detrás de un proxy la dirección de origen
+no sirve para distinguir a la propia máquina.
+Las consultas que hace una respuesta en streaming después de salir de
+la vista (exportaciones) no se cuentan.
+
+Con ``API_METRICS_ENABLED = False`` el middleware se descarta al
+arrancar (MiddlewareNotUsed) y no agrega ningún costo.
+"""
+import hmac
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+METRICS_PATH = '/api/_metrics'
+SAMPLE_WINDOW = 1024
+QUANTILES = (0.5, 0.9, 0.99)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Contador de la petición en curso; las variables de contexto pasan a los
+# hilos de sync_to_async, así se cuentan también las consultas del ORM asíncrono
+_current_timer = ContextVar('api_metrics_timer', default=None)
+
+SUMMARIES = (
+    ('duration', 'api_request_duration_seconds', 'Latencia total de la petición'),
+    ('sql_time', 'api_sql_duration_seconds', 'Tiempo en consultas SQL por petición'),
+    ('sql_count', 'api_sql_queries', 'Consultas SQL por petición'),
+    (
+        'serialization',
+        'api_serialization_duration_seconds',
+        'Tiempo de serialización JSON por petición',
+    ),
+)
+
+
+class _QueryTimer:
+    """execute_wrapper que cuenta las consultas y acumula su duración
+
+    Lo comparten los hilos que abre una misma petición (el dashboard pide
+    sus bloques en paralelo), por eso los totales se suman con un lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.time += elapsed
+                self.count += 1
+
+
+class _Series:
+    def __init__(self):
+        self.samples = deque(maxlen=SAMPLE_WINDOW)
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.total += value
+        self.count += 1
+
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return []
+        return [
+            (q, ordered[min(len(ordered) - 1, int(q * len(ordered)))])
+            for q in QUANTILES
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self._requests = {}
+
+    def record(self, method, route, status, values):
+        with self._lock:
+            key = (method, route)
+            series = self._series.setdefault(
+                key, {name: _Series() for name, _, _ in SUMMARIES}
+            )
+            for name, value in values.items():
+                series[name].add(value)
+            status_key = (method, route, str(status))
+            self._requests[status_key] = self._requests.get(status_key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._requests.clear()
+
+    def render(self):
+        """Texto en formato de exposición de Prometheus"""
+        with self._lock:
+            series = {
+                key: {
+                    name: (s.quantiles(), s.total, s.count)
+                    for name, s in values.items()
+                }
+                for key, values in self._series.items()
+            }
+            requests = dict(self._requests)
+
+        lines = [
+            '# HELP api_requests_total Peticiones atendidas por método, ruta y estado',
+            '# TYPE api_requests_total counter',
+        ]
+        for (method, route, status), count in sorted(requests.items()):
+            labels = f'{_labels(method, route)},status="{status}"'
+            lines.append(f'api_requests_total{{{labels}}} {count}')
+        for name, metric, description in SUMMARIES:
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} summary')
+            for (method, route), values in sorted(series.items()):
+                quantiles, total, count = values[name]
+                labels = _labels(method, route)
+                for quantile, value in quantiles:
+                    lines.append(
+                        f'{metric}{{{labels},quantile="{quantile}"}} {value:.6g}'
+                    )
+                lines.append(f'{metric}_sum{{{labels}}} {total:.6g}')
+                lines.append(f'{metric}_count{{{labels}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(method, route):
+    return f'method="{_escape(method)}",route="{_escape(route)}"'
+
+
+registry = MetricsRegistry()
+
+
+def _has_token(request):
+    token = getattr(settings, 'API_METRICS_TOKEN', '')
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    return (
+        bool(token)
+        and scheme.lower() == 'bearer'
+        and hmac.compare_digest(credentials.strip().encode(), token.encode())
+    )
+
+
+def is_allowed(request):
+    """Las métricas solo se muestran a usuarios staff o con el token configurado"""
+    if not getattr(settings, 'API_METRICS_ENABLED', False):
+        return False
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_active and user.is_staff) or _has_token(
+        request
+    )
+
+
+def _route(request):
+    match = request.resolver_match
+    return f'/{match.route}' if match is not None else 'unmatched'
+
+
+def _server_timing(sql_count, sql_time, serialization, duration):
+    return (
+        f'db;dur={sql_time * 1000:.1f};desc="{sql_count} queries", '
+        f'serialize;dur={serialization * 1000:.1f}, '
+        f'total;dur={duration * 1000:.1f}'
+    )
+
+
+def _record_query(execute, sql, params, many, context):
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def _install_wrapper(sender, connection, **kwargs):  # noqa: ARG001 (firma de connection_created)
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'API_METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'API_METRICS_SERVER_TIMING', False)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        connection_created.connect(
+            _install_wrapper, dispatch_uid='api_metrics_query_timer'
+        )
+        for connection in connections.all(initialized_only=True):
+            _install_wrapper(None, connection)
+
+    def _measured(self, request):
+        return request.path.startswith('/api/') and not request.path.startswith(
+            METRICS_PATH
+        )
+
+    def _record(self, request, response, timer, started):
+        duration = time.perf_counter() - started
+        serialization = getattr(response, 'serialization_time', 0.0)
+        registry.record(request.method, _route(request), response.status_code, {
+            'duration': duration,
+            'sql_time': timer.time,
+            'sql_count': timer.count,
+            'serialization': serialization,
+        })
+        if self.server_timing:
+            response['Server-Timing'] = _server_timing(
+                timer.count, timer.time, serialization, duration
+            )
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self._measured(request):
+            return self.get_response(request)
+
+        timer = _QueryTimer()
+        token = _current_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        return self._record(request, response, timer, started)
+
+    async def __acall__(self, request):
+        if not self._measured(request):
+            return await self.get_response(request)
+
+        timer = _QueryTimer()
+        token = _current_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        return self._record(request, response, timer, started)
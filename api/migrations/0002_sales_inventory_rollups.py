@@ -0,0 +1,93 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:38
+
+from django.db import migrations, models
+
+
+def populate_rollups(apps, schema_editor):
+    from api.rollups import rebuild
+    rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStockRollup',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'category',
+                    models.CharField(
+                        choices=[
+                            ('armazones', 'Armazones'),
+                            ('lentes', 'Lentes'),
+                            ('lentes_contacto', 'Lentes de contacto'),
+                            ('accesorios', 'Accesorios'),
+                        ],
+                        max_length=20,
+                        unique=True,
+                    ),
+                ),
+                ('product_count', models.IntegerField(default=0)),
+                ('consignment_count', models.IntegerField(default=0)),
+                ('total_stock', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['category'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('date', models.DateField()),
+                (
+                    'category',
+                    models.CharField(
+                        choices=[
+                            ('armazones', 'Armazones'),
+                            ('lentes', 'Lentes'),
+                            ('lentes_contacto', 'Lentes de contacto'),
+                            ('accesorios', 'Accesorios'),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ('quantity', models.IntegerField(default=0)),
+                (
+                    'amount',
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+            ],
+            options={
+                'ordering': ['-date', 'category'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalesrollup',
+            constraint=models.UniqueConstraint(
+                fields=('date', 'category'), name='unique_daily_sales_rollup'
+            ),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
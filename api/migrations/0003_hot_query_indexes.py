@@ -0,0 +1,79 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_sales_inventory_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(
+                fields=['date', 'time'], name='appointment_date_time_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['status'], name='appointment_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['name'], name='patient_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(
+                fields=['status', 'name'], name='patient_status_name_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='patientpurchasehistory',
+            index=models.Index(
+                fields=['patient', '-date'], name='purchase_hist_patient_date_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-created_at'], name='product_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                fields=['category', '-created_at'], name='product_category_created_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                fields=['type', '-created_at'], name='product_type_created_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                fields=['status', 'stock'], name='product_status_stock_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['supplier'], name='product_supplier_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['-created_at'], name='purchase_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(
+                fields=['created_at', 'status'], name='sale_created_status_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['status'], name='sale_status_idx'),
+        ),
+    ]
@@ -0,0 +1,112 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+import api.search
+
+# Copia fija de las columnas de api.search: el backfill no depende del código actual
+
+CATEGORY_LABELS = [
+    ('armazones', 'Armazones'),
+    ('lentes', 'Lentes'),
+    ('lentes_contacto', 'Lentes de contacto'),
+    ('accesorios', 'Accesorios'),
+]
+
+CATEGORY_DOCUMENT = "category || ' ' || CASE category {} ELSE '' END".format(
+    ' '.join(f"WHEN '{value}' THEN '{label}'" for value, label in CATEGORY_LABELS)
+)
+
+INDEXES = [
+    # (tabla del índice, tabla del modelo, columnas, expresión de cada columna)
+    ('api_product_search', 'api_product', ['name', 'category', 'supplier', 'code'],
+     ['name', CATEGORY_DOCUMENT, 'supplier', 'code']),
+    ('api_patient_search', 'api_patient', ['name', 'email', 'phone'],
+     ['name', 'email', 'phone']),
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        # pg_trgm es de confianza desde PostgreSQL 13: basta con ser dueño de la base
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table, model_table, columns, expressions in INDEXES:
+        values = [f"COALESCE({expression}, '')" for expression in expressions]
+        if vendor == 'sqlite':
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+                f"{', '.join(columns)}, tokenize='unicode61 remove_diacritics 2')"
+            )
+            schema_editor.execute(
+                f"INSERT INTO {table} (rowid, {', '.join(columns)}) "
+                f"SELECT id, {', '.join(values)} FROM {model_table}"
+            )
+        elif vendor == 'postgresql':
+            # rowid como en FTS5: los modelos *SearchEntry sirven para los dos motores
+            schema_editor.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                f"rowid bigint PRIMARY KEY REFERENCES {model_table} (id) "
+                f"ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+                f"document tsvector NOT NULL, body text NOT NULL)"
+            )
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_document_idx "
+                f"ON {table} USING gin (document)"
+            )
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_body_trgm_idx "
+                f"ON {table} USING gin (body gin_trgm_ops)"
+            )
+            body = f"concat_ws(' ', {', '.join(values)})"
+            schema_editor.execute(
+                f"INSERT INTO {table} (rowid, document, body) "
+                f"SELECT id, to_tsvector('simple', {body}), {body} FROM {model_table}"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor not in ('sqlite', 'postgresql'):
+        return
+    for table, *_ in INDEXES:
+        schema_editor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.CreateModel(
+            name='ProductSearchEntry',
+            fields=[
+                ('product', models.OneToOneField(
+                    db_column='rowid', db_constraint=False,
+                    on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True,
+                    related_name='search_entry', serialize=False, to='api.product',
+                )),
+                ('document', api.search.SearchDocumentField()),
+            ],
+            options={
+                'db_table': 'api_product_search',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PatientSearchEntry',
+            fields=[
+                ('patient', models.OneToOneField(
+                    db_column='rowid', db_constraint=False,
+                    on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True,
+                    related_name='search_entry', serialize=False, to='api.patient',
+                )),
+                ('document', api.search.SearchDocumentField()),
+            ],
+            options={
+                'db_table': 'api_patient_search',
+                'managed': False,
+            },
+        ),
+    ]
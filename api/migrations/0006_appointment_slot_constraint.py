@@ -0,0 +1,21 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('status', 'cancelada'), _negated=True),
+                fields=('doctor', 'date', 'time'),
+                name='unique_active_appointment_slot',
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_appointment_slot_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchase',
+            name='received_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_purchase_received_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsignmentSnapshot',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('as_of', models.DateField()),
+                ('supplier', models.CharField(max_length=100)),
+                ('received', models.IntegerField(default=0)),
+                ('returned', models.IntegerField(default=0)),
+                ('sold', models.IntegerField(default=0)),
+                (
+                    'sold_amount',
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    'product',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='+',
+                        to='api.product',
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ['-as_of', 'supplier'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ConsignmentMovement',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('supplier', models.CharField(max_length=100)),
+                (
+                    'kind',
+                    models.CharField(
+                        choices=[
+                            ('recepcion', 'Recepción'),
+                            ('devolucion', 'Devolución'),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ('quantity', models.PositiveIntegerField()),
+                ('date', models.DateField(default=django.utils.timezone.localdate)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                (
+                    'product',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='consignment_movements',
+                        to='api.product',
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ['-date', '-id'],
+                'indexes': [
+                    models.Index(
+                        fields=['date', 'supplier'], name='consignment_move_date_idx'
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='consignmentsnapshot',
+            constraint=models.UniqueConstraint(
+                fields=('as_of', 'supplier', 'product'),
+                name='unique_consignment_snapshot',
+            ),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:15
+
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_consignment_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'token',
+                    models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+                ),
+                ('export', models.CharField(max_length=30)),
+                ('format', models.CharField(max_length=10)),
+                ('dedup_key', models.CharField(max_length=64)),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[
+                            ('pendiente', 'Pendiente'),
+                            ('en_proceso', 'En proceso'),
+                            ('completado', 'Completado'),
+                            ('fallido', 'Fallido'),
+                            ('cancelado', 'Cancelado'),
+                        ],
+                        default='pendiente',
+                        max_length=15,
+                    ),
+                ),
+                ('progress', models.IntegerField(default=0)),
+                ('total', models.IntegerField(blank=True, null=True)),
+                ('file_path', models.CharField(blank=True, max_length=255)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [
+                    models.Index(
+                        fields=['status', 'created_at'], name='export_job_status_idx'
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='exportjob',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('status__in', ['pendiente', 'en_proceso'])),
+                fields=('dedup_key',),
+                name='unique_active_export_job',
+            ),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:33
+
+from django.db import migrations, models
+
+
+def populate_patient_stats(apps, schema_editor):
+    from api.patient_stats import rebuild
+    rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_export_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientActivityRollup',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('sale_count', models.IntegerField()),
+                ('last_purchase_date', models.DateField()),
+                ('patients', models.IntegerField(default=0)),
+                (
+                    'lifetime_spend',
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+            ],
+            options={
+                'ordering': ['sale_count', 'last_purchase_date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='first_purchase_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='last_purchase_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='lifetime_spend',
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=12
+            ),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='sale_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(
+                fields=['-lifetime_spend'], name='patient_lifetime_spend_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['sale_count'], name='patient_sale_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(
+                fields=['last_purchase_at'], name='patient_last_purchase_idx'
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='patientactivityrollup',
+            constraint=models.UniqueConstraint(
+                fields=('sale_count', 'last_purchase_date'),
+                name='unique_patient_activity_rollup',
+            ),
+        ),
+        migrations.RunPython(populate_patient_stats, migrations.RunPython.noop),
+    ]
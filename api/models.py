@@ -1,9 +1,122 @@
 
-from django.db import models
-from django.utils import timezone
 import uuid
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.lookups import Exact, LessThanOrEqual
+from django.utils import timezone
+
+from .search import SearchDocumentField
 
-class Product(models.Model):
+
+class LoadedValuesMixin:
+    """Recuerda los valores leídos de la base para calcular deltas al guardar"""
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values, strict=True))
+        return instance
+    
+    def get_loaded_values(self):
+        """Valores persistidos antes del guardado actual, o None si la fila es nueva"""
+        return getattr(self, '_loaded_values', None)
+    
+    def refresh_loaded_values(self):
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+        }
+
+class OrderManager(models.Manager):
+    """Manager de órdenes (ventas y compras) con alta masiva de líneas"""
+    
+    def create_with_items(self, items, **fields):
+        """Crea la orden y sus líneas en una transacción con un único bulk_create"""
+        relation = self.model._meta.get_field('items')
+        item_model, order_field = relation.related_model, relation.field.name
+        items = list(items)
+        with transaction.atomic(using=self.db):
+            total = sum((item.calculate_total() for item in items), Decimal('0'))
+            order = self.create(total_amount=total, **fields)
+            for item in items:
+                setattr(item, order_field, order)
+            item_model.objects.bulk_create(items, batch_size=500)
+            from . import response_cache
+            response_cache.invalidate(self.model, item_model)
+        for item in items:
+            item.refresh_loaded_values()
+        return order
+
+class SaleManager(OrderManager):
+    def create_with_items(self, items, **fields):
+        """Como OrderManager, y suma las líneas a los resúmenes en la transacción"""
+        from . import rollups
+        items = list(items)
+        with transaction.atomic(using=self.db):
+            order = super().create_with_items(items, **fields)
+            rollups.record_sale_items_created(order, items)
+        return order
+
+class OrderItemMixin(LoadedValuesMixin):
+    """Mantiene el total de la orden con UPDATE ... SET total = total + delta
+    
+    Las subclases indican la relación con la orden (ORDER_FIELD), el campo
+    de precio unitario (UNIT_FIELD) y el del total de la línea (TOTAL_FIELD).
+    """
+    ORDER_FIELD = None
+    UNIT_FIELD = None
+    TOTAL_FIELD = None
+    
+    def calculate_total(self):
+        total = self.quantity * getattr(self, self.UNIT_FIELD)
+        setattr(self, self.TOTAL_FIELD, total)
+        return total
+    
+    @classmethod
+    def _adjust_order_total(cls, order_id, delta):
+        if not delta:
+            return
+        order_model = cls._meta.get_field(cls.ORDER_FIELD).related_model
+        order_model.objects.filter(pk=order_id).update(
+            total_amount=F('total_amount') + delta,
+            updated_at=timezone.now(),
+        )
+        from . import response_cache
+        response_cache.invalidate(order_model)
+    
+    def update_order_total(self):
+        """Suma al total de la orden la diferencia de esta línea con lo guardado"""
+        attname = f'{self.ORDER_FIELD}_id'
+        loaded = self.get_loaded_values() or {}
+        order_id = getattr(self, attname)
+        previous_total = loaded.get(self.TOTAL_FIELD) or 0
+        previous_order_id = loaded.get(attname)
+        if previous_order_id is not None and previous_order_id != order_id:
+            self._adjust_order_total(previous_order_id, -previous_total)
+            previous_total = 0
+        delta = getattr(self, self.TOTAL_FIELD) - previous_total
+        self._adjust_order_total(order_id, delta)
+        descriptor = getattr(type(self), self.ORDER_FIELD)
+        if delta and descriptor.is_cached(self):
+            order = getattr(self, self.ORDER_FIELD)
+            order.total_amount += delta
+    
+    def order_total_deleted(self, origin=None):
+        """Descuenta la línea borrada, salvo que se esté borrando la orden completa"""
+        order_model = self._meta.get_field(self.ORDER_FIELD).related_model
+        if (
+            isinstance(origin, order_model)
+            or getattr(origin, 'model', None) is order_model
+        ):
+            return
+        self._adjust_order_total(
+            getattr(self, f'{self.ORDER_FIELD}_id'), -getattr(self, self.TOTAL_FIELD)
+        )
+
+
+class Product(LoadedValuesMixin, models.Model):
     CATEGORY_CHOICES = [
         ('armazones', 'Armazones'),
         ('lentes', 'Lentes'),
@@ -22,37 +135,127 @@ class Product(models.Model):
         ('consignacion', 'Consignación'),
     ]
     
+    LOW_STOCK_THRESHOLD = 5
+    
     code = models.CharField(max_length=20, unique=True, editable=False)
     name = models.CharField(max_length=200)
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
     supplier = models.CharField(max_length=100)
     stock = models.IntegerField(default=0)
+    # Unidades apartadas por reservas activas (solo lo modifica api.stock)
+    reserved = models.IntegerField(default=0, editable=False)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='normal')
     type = models.CharField(max_length=15, choices=TYPE_CHOICES, default='propio')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Columnas que api.stock actualiza con UPDATE atómicos
+    STOCK_MANAGED_FIELDS = ('stock', 'status', 'reserved')
+    
     def save(self, *args, **kwargs):
         if not self.code:
             # Generate unique product code
             self.code = f"PROD-{str(uuid.uuid4())[:8].upper()}"
         
-        # Auto-update status based on stock
-        if self.stock == 0:
-            self.status = 'critico'
-        elif self.stock <= 5:
-            self.status = 'bajo'
-        else:
-            self.status = 'normal'
-            
-        super().save(*args, **kwargs)
+        from . import rollups
+        if self._state.adding:
+            # Auto-update status based on stock
+            self.status = self.status_for_stock(self.stock)
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                rollups.record_product_saved(self, None, self.current_row())
+            self.refresh_loaded_values()
+            return
+        
+        # El stock no se escribe como valor absoluto: pisaría los movimientos
+        # atómicos de api.stock hechos desde que se leyó la instancia. Lo que
+        # cambió respecto a lo leído se aplica como delta con apply_stock_deltas
+        # (que lanza InsufficientStock si dejaría menos unidades que las reservadas).
+        update_fields = kwargs.get('update_fields')
+        writes_stock = update_fields is None or 'stock' in update_fields
+        kwargs['update_fields'] = [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.name not in self.STOCK_MANAGED_FIELDS
+            and (update_fields is None or field.name in update_fields)
+        ]
+        loaded = self.get_loaded_values() or {}
+        from .stock import apply_stock_deltas
+        with transaction.atomic():
+            previous = self.locked_row()
+            delta = (
+                self.stock - loaded.get('stock', previous[1])
+                if writes_stock and previous
+                else 0
+            )
+            super().save(*args, **kwargs)
+            rollups.record_product_saved(self, previous, self.current_row())
+            if delta:
+                apply_stock_deltas({self.pk: delta})
+            self.stock, self.status = Product.objects.values_list(
+                'stock', 'status'
+            ).get(pk=self.pk)
+        self.refresh_loaded_values()
+    
+    ROW_FIELDS = ('category', 'stock', 'type')
+    
+    def current_row(self):
+        """``(categoría, stock, tipo)`` de la fila en la base, o None si no existe"""
+        return Product.objects.filter(pk=self.pk).values_list(*self.ROW_FIELDS).first()
+    
+    def locked_row(self):
+        """Como ``current_row``, con la fila bloqueada hasta el final de la transacción
+
+        El UPDATE sin efecto toma el bloqueo de escritura antes de leer
+        (en SQLite evita promover un bloqueo de lectura, ver api.stock).
+        """
+        Product.objects.filter(pk=self.pk).update(stock=F('stock'))
+        return (
+            Product.objects
+            .select_for_update()
+            .filter(pk=self.pk)
+            .values_list(*self.ROW_FIELDS)
+            .first()
+        )
+    
+    @property
+    def available(self):
+        return self.stock - self.reserved
+    
+    @classmethod
+    def status_for_stock(cls, stock):
+        if stock == 0:
+            return 'critico'
+        elif stock <= cls.LOW_STOCK_THRESHOLD:
+            return 'bajo'
+        return 'normal'
+    
+    @classmethod
+    def status_expression(cls, stock):
+        """Equivalente SQL de status_for_stock para usar en UPDATE masivos"""
+        return Case(
+            When(Exact(stock, 0), then=Value('critico')),
+            When(LessThanOrEqual(stock, cls.LOW_STOCK_THRESHOLD), then=Value('bajo')),
+            default=Value('normal'),
+            output_field=models.CharField(),
+        )
     
     def __str__(self):
         return f"{self.code} - {self.name}"
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='product_created_at_idx'),
+            models.Index(
+                fields=['category', '-created_at'], name='product_category_created_idx'
+            ),
+            models.Index(
+                fields=['type', '-created_at'], name='product_type_created_idx'
+            ),
+            models.Index(fields=['status', 'stock'], name='product_status_stock_idx'),
+            models.Index(fields=['supplier'], name='product_supplier_idx'),
+        ]
 
 class Patient(models.Model):
     STATUS_CHOICES = [
@@ -66,14 +269,45 @@ class Patient(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='activo')
     address = models.TextField(blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
+    # Contadores de compras (solo los modifica api.patient_stats)
+    sale_count = models.IntegerField(default=0, editable=False)
+    lifetime_spend = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False
+    )
+    first_purchase_at = models.DateTimeField(blank=True, null=True, editable=False)
+    last_purchase_at = models.DateTimeField(blank=True, null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Columnas que api.patient_stats actualiza con UPDATE atómicos
+    STATS_FIELDS = (
+        'sale_count',
+        'lifetime_spend',
+        'first_purchase_at',
+        'last_purchase_at',
+    )
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # No pisar con valores leídos antes las ventas registradas mientras tanto
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.STATS_FIELDS
+            ]
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return self.name
     
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name'], name='patient_name_idx'),
+            models.Index(fields=['status', 'name'], name='patient_status_name_idx'),
+            models.Index(fields=['-lifetime_spend'], name='patient_lifetime_spend_idx'),
+            models.Index(fields=['sale_count'], name='patient_sale_count_idx'),
+            models.Index(fields=['last_purchase_at'], name='patient_last_purchase_idx'),
+        ]
 
 class PatientPurchaseHistory(models.Model):
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='purchase_history')
@@ -88,6 +322,11 @@ class PatientPurchaseHistory(models.Model):
     
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(
+                fields=['patient', '-date'], name='purchase_hist_patient_date_idx'
+            ),
+        ]
 
 class Appointment(models.Model):
     STATUS_CHOICES = [
@@ -118,8 +357,20 @@ class Appointment(models.Model):
     
     class Meta:
         ordering = ['date', 'time']
+        indexes = [
+            models.Index(fields=['date', 'time'], name='appointment_date_time_idx'),
+            models.Index(fields=['status'], name='appointment_status_idx'),
+        ]
+        constraints = [
+            # Un doctor no puede tener dos citas activas a la misma hora
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'time'],
+                condition=~models.Q(status='cancelada'),
+                name='unique_active_appointment_slot',
+            ),
+        ]
 
-class Sale(models.Model):
+class Sale(LoadedValuesMixin, models.Model):
     STATUS_CHOICES = [
         ('nuevo', 'Nuevo'),
         ('en_proceso', 'En Proceso'),
@@ -135,33 +386,78 @@ class Sale(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = SaleManager()
+    
+    @staticmethod
+    def generate_order_number():
+        return f"ORD-{str(uuid.uuid4())[:8].upper()}"
+    
     def save(self, *args, **kwargs):
         if not self.order_number:
-            import uuid
-            self.order_number = f"ORD-{str(uuid.uuid4())[:8].upper()}"
-        super().save(*args, **kwargs)
+            self.order_number = self.generate_order_number()
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # El total lo mantienen las líneas con UPDATE atómicos (ver OrderItemMixin)
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'total_amount'
+            ]
+        
+        from . import patient_stats
+        with transaction.atomic():
+            previous = None if self._state.adding else self.locked_row()
+            super().save(*args, **kwargs)
+            patient_stats.record_sale_saved(self, previous)
+        self.refresh_loaded_values()
+    
+    def locked_row(self):
+        """``(paciente, estado, total)`` de la fila bloqueada (ver locked_row)"""
+        Sale.objects.filter(pk=self.pk).update(status=F('status'))
+        return Sale.objects.select_for_update().filter(pk=self.pk).values_list(
+            'patient_id', 'status', 'total_amount',
+        ).first()
     
     def __str__(self):
         return f"{self.order_number} - {self.patient.name}"
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['created_at', 'status'], name='sale_created_status_idx'
+            ),
+            models.Index(fields=['status'], name='sale_status_idx'),
+        ]
 
-class SaleItem(models.Model):
+class SaleItem(OrderItemMixin, models.Model):
+    ORDER_FIELD = 'sale'
+    UNIT_FIELD = 'unit_price'
+    TOTAL_FIELD = 'total_price'
+    
     sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     
+    @classmethod
+    def _adjust_order_total(cls, order_id, delta):
+        super()._adjust_order_total(order_id, delta)
+        if delta:
+            from . import patient_stats
+            patient_stats.record_sale_total_changed(order_id, delta)
+    
     def save(self, *args, **kwargs):
-        self.total_price = self.quantity * self.unit_price
-        super().save(*args, **kwargs)
+        self.calculate_total()
         
-        # Update sale total
-        sale_total = sum(item.total_price for item in self.sale.items.all())
-        self.sale.total_amount = sale_total
-        self.sale.save()
+        from . import rollups
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            
+            # Update sale total
+            self.update_order_total()
+            
+            rollups.record_sale_item_saved(self)
+        self.refresh_loaded_values()
     
     def __str__(self):
         return f"{self.sale.order_number} - {self.product.name}"
@@ -179,9 +475,12 @@ class Purchase(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='pendiente')
     notes = models.TextField(blank=True, null=True)
+    received_at = models.DateTimeField(blank=True, null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = OrderManager()
+    
     def save(self, *args, **kwargs):
         if not self.purchase_number:
             import uuid
@@ -193,8 +492,15 @@ class Purchase(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='purchase_created_at_idx'),
+        ]
 
-class PurchaseItem(models.Model):
+class PurchaseItem(OrderItemMixin, models.Model):
+    ORDER_FIELD = 'purchase'
+    UNIT_FIELD = 'unit_cost'
+    TOTAL_FIELD = 'total_cost'
+    
     purchase = models.ForeignKey(Purchase, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
@@ -202,13 +508,203 @@ class PurchaseItem(models.Model):
     total_cost = models.DecimalField(max_digits=10, decimal_places=2)
     
     def save(self, *args, **kwargs):
-        self.total_cost = self.quantity * self.unit_cost
-        super().save(*args, **kwargs)
-        
-        # Update purchase total
-        purchase_total = sum(item.total_cost for item in self.purchase.items.all())
-        self.purchase.total_amount = purchase_total
-        self.purchase.save()
+        self.calculate_total()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            
+            # Update purchase total
+            self.update_order_total()
+        self.refresh_loaded_values()
     
     def __str__(self):
         return f"{self.purchase.purchase_number} - {self.product.name}"
+
+class DailySalesRollup(models.Model):
+    """Ventas acumuladas por día y categoría, mantenidas desde SaleItem"""
+    date = models.DateField()
+    category = models.CharField(max_length=20, choices=Product.CATEGORY_CHOICES)
+    quantity = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    def __str__(self):
+        return f"{self.date} - {self.category}"
+    
+    class Meta:
+        ordering = ['-date', 'category']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'category'], name='unique_daily_sales_rollup'
+            ),
+        ]
+
+class CategoryStockRollup(models.Model):
+    """Inventario acumulado por categoría, mantenido desde Product"""
+
+    category = models.CharField(
+        max_length=20, choices=Product.CATEGORY_CHOICES, unique=True
+    )
+    product_count = models.IntegerField(default=0)
+    consignment_count = models.IntegerField(default=0)
+    total_stock = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return self.category
+    
+    class Meta:
+        ordering = ['category']
+
+class PatientActivityRollup(models.Model):
+    """Pacientes con compras por cantidad de ventas y día de la última compra
+
+    Mantenido desde api.patient_stats.
+    """
+
+    sale_count = models.IntegerField()
+    last_purchase_date = models.DateField()
+    patients = models.IntegerField(default=0)
+    lifetime_spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    def __str__(self):
+        return f"{self.sale_count} ventas - {self.last_purchase_date}"
+    
+    class Meta:
+        ordering = ['sale_count', 'last_purchase_date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['sale_count', 'last_purchase_date'],
+                name='unique_patient_activity_rollup',
+            ),
+        ]
+
+class StockReservation(models.Model):
+    """Unidades apartadas para una orden hasta que se confirma, se libera o expira"""
+
+    token = models.UUIDField(default=uuid.uuid4, db_index=True)
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='reservations'
+    )
+    quantity = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"{self.token} - {self.product_id} x{self.quantity}"
+
+
+class ConsignmentMovement(models.Model):
+    """Entrada o devolución de mercadería en consignación de un proveedor"""
+    KIND_CHOICES = [
+        ('recepcion', 'Recepción'),
+        ('devolucion', 'Devolución'),
+    ]
+    
+    supplier = models.CharField(max_length=100)
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='consignment_movements'
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    quantity = models.PositiveIntegerField()
+    date = models.DateField(default=timezone.localdate)
+    notes = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.supplier} - {self.product_id} {self.kind} x{self.quantity}"
+    
+    class Meta:
+        ordering = ['-date', '-id']
+        indexes = [
+            models.Index(fields=['date', 'supplier'], name='consignment_move_date_idx'),
+        ]
+
+class ConsignmentSnapshot(models.Model):
+    """Totales de consignación por proveedor y producto al cierre de ``as_of``"""
+
+    as_of = models.DateField()
+    supplier = models.CharField(max_length=100)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    received = models.IntegerField(default=0)
+    returned = models.IntegerField(default=0)
+    sold = models.IntegerField(default=0)
+    sold_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    def __str__(self):
+        return f"{self.as_of} - {self.supplier} - {self.product_id}"
+    
+    class Meta:
+        ordering = ['-as_of', 'supplier']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['as_of', 'supplier', 'product'],
+                name='unique_consignment_snapshot',
+            ),
+        ]
+
+class ExportJob(models.Model):
+    """Exportación en segundo plano: la ejecuta run_jobs y el archivo queda en disco"""
+
+    STATUS_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completado', 'Completado'),
+        ('fallido', 'Fallido'),
+        ('cancelado', 'Cancelado'),
+    ]
+    ACTIVE_STATUSES = ['pendiente', 'en_proceso']
+    
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    export = models.CharField(max_length=30)
+    format = models.CharField(max_length=10)
+    # Identifica pedidos iguales para no generar dos veces el mismo archivo a la vez
+    dedup_key = models.CharField(max_length=64)
+    status = models.CharField(
+        max_length=15, choices=STATUS_CHOICES, default='pendiente'
+    )
+    progress = models.IntegerField(default=0)
+    total = models.IntegerField(blank=True, null=True)
+    file_path = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.export}.{self.format} - {self.status}"
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='export_job_status_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=models.Q(status__in=['pendiente', 'en_proceso']),
+                name='unique_active_export_job',
+            ),
+        ]
+
+class ProductSearchEntry(models.Model):
+    """Fila del índice de búsqueda de productos; la tabla es de la migración 0004"""
+    product = models.OneToOneField(
+        Product, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+        db_constraint=False, related_name='search_entry',
+    )
+    document = SearchDocumentField()
+    
+    class Meta:
+        managed = False
+        db_table = 'api_product_search'
+
+class PatientSearchEntry(models.Model):
+    """Fila del índice de búsqueda de pacientes; la tabla es de la migración 0004"""
+    patient = models.OneToOneField(
+        Patient, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+        db_constraint=False, related_name='search_entry',
+    )
+    document = SearchDocumentField()
+    
+    class Meta:
+        managed = False
+        db_table = 'api_patient_search'
@@ -0,0 +1,235 @@
+"""Paginación de los listados: por número de página o por cursor (keyset).
+
+En lugar de ``OFFSET`` se filtra por los valores de ordenación de la
+última fila vista, así cualquier página cuesta lo mismo que la primera
+y no hace falta ``COUNT(*)``. El cursor es opaco para el cliente:
+base64 de los valores de ordenación y la dirección.
+
+``paginate`` y ``apaginate`` (ORM asíncrono) eligen el modo según la
+petición y devuelven las filas de la página con sus datos de paginación.
+Un ``page``, ``page_size`` o cursor no válido lanza InvalidPagination,
+que las vistas contestan con un 400.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 10
+
+
+class InvalidPagination(ValueError):
+    pass
+
+
+class InvalidCursor(InvalidPagination):
+    pass
+
+
+def wants_total(request):
+    return request.GET.get('include_total', '').lower() in ('1', 'true', 'yes')
+
+
+class CursorPage:
+    def __init__(self, items, next_cursor, previous_cursor, page_size):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.page_size = page_size
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator:
+    """Pagina un queryset según ``ordering`` (p. ej. ``['-created_at', '-id']``)
+
+    El último campo debe ser único para que el orden sea total.
+    """
+
+    def __init__(self, queryset, ordering, page_size):
+        self.queryset = queryset
+        self.ordering = [
+            (field.lstrip('-'), field.startswith('-')) for field in ordering
+        ]
+        self.page_size = page_size
+
+    def _encode(self, instance, direction):
+        # Las filas pueden ser instancias o diccionarios de values()
+        if isinstance(instance, dict):
+            values = [instance[field] for field, _ in self.ordering]
+        else:
+            values = [getattr(instance, field) for field, _ in self.ordering]
+        payload = json.dumps({
+            'v': [self._dump(value) for value in values],
+            'd': direction,
+        })
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def _dump(value):
+        return value.isoformat() if hasattr(value, 'isoformat') else value
+
+    def _decode(self, cursor):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            raw_values, direction = payload['v'], payload['d']
+        except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError) as e:
+            raise InvalidCursor('Cursor inválido') from e
+        if direction not in ('next', 'prev') or len(raw_values) != len(self.ordering):
+            raise InvalidCursor('Cursor inválido')
+        values = []
+        for (field, _), raw in zip(self.ordering, raw_values, strict=True):
+            try:
+                values.append(self.queryset.model._meta.get_field(field).to_python(raw))
+            except ValidationError as e:
+                raise InvalidCursor('Cursor inválido') from e
+        return values, direction
+
+    def _after(self, values, reverse):
+        """Condición de filas estrictamente posteriores a ``values`` en el orden dado"""
+        condition = Q()
+        for position, (field, descending) in enumerate(self.ordering):
+            lookup = 'lt' if descending != reverse else 'gt'
+            step = Q(**{f'{field}__{lookup}': values[position]})
+            for index, (previous_field, _) in enumerate(self.ordering[:position]):
+                step &= Q(**{previous_field: values[index]})
+            condition |= step
+        return condition
+
+    def _order_by(self, reverse):
+        return [
+            f'-{field}' if descending != reverse else field
+            for field, descending in self.ordering
+        ]
+
+    def _page_query(self, cursor):
+        direction = 'next'
+        queryset = self.queryset
+        if cursor:
+            values, direction = self._decode(cursor)
+            queryset = queryset.filter(self._after(values, reverse=direction == 'prev'))
+        reverse = direction == 'prev'
+        return queryset.order_by(*self._order_by(reverse))[:self.page_size + 1], reverse
+
+    def _build_page(self, items, cursor, reverse):
+        has_more = len(items) > self.page_size
+        items = items[:self.page_size]
+        if reverse:
+            items.reverse()
+
+        has_next = has_more if not reverse else True
+        has_previous = has_more if reverse else bool(cursor)
+        return CursorPage(
+            items,
+            self._encode(items[-1], 'next') if items and has_next else None,
+            self._encode(items[0], 'prev') if items and has_previous else None,
+            self.page_size,
+        )
+
+    def page(self, cursor):
+        queryset, reverse = self._page_query(cursor)
+        return self._build_page(list(queryset), cursor, reverse)
+
+    async def apage(self, cursor):
+        queryset, reverse = self._page_query(cursor)
+        return self._build_page([item async for item in queryset], cursor, reverse)
+
+    def _pagination_data(self, page):
+        return {
+            'page_size': self.page_size,
+            'next_cursor': page.next_cursor,
+            'previous_cursor': page.previous_cursor,
+            'has_next': page.has_next(),
+            'has_previous': page.has_previous(),
+        }
+
+    def pagination_data(self, page, include_total=False):
+        data = self._pagination_data(page)
+        if include_total:
+            data['total_items'] = self.queryset.count()
+        return data
+
+    async def apagination_data(self, page, include_total=False):
+        data = self._pagination_data(page)
+        if include_total:
+            data['total_items'] = await self.queryset.acount()
+        return data
+
+
+def _positive_param(request, name, default):
+    value = request.GET.get(name, '')
+    if value == '':
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise InvalidPagination(f'{name} debe ser un entero positivo')
+    return number
+
+
+def _page_params(request):
+    return _positive_param(request, 'page', 1), _positive_param(
+        request, 'page_size', DEFAULT_PAGE_SIZE
+    )
+
+
+def _numbered_pagination(paginator, page_obj, page):
+    return {
+        'current_page': page,
+        'total_pages': paginator.num_pages,
+        'total_items': paginator.count,
+        'has_next': page_obj.has_next(),
+        'has_previous': page_obj.has_previous(),
+    }
+
+
+def paginate(request, queryset, cursor_ordering=None, count=None):
+    """Filas de la página pedida y sus datos de paginación
+
+    Con ``?cursor=`` (si la vista define ``cursor_ordering``) se usa keyset;
+    si no, páginas numeradas con ``?page=``. Ambos usan ``?page_size=``.
+    Con ``count`` (el total ya conocido, por ejemplo de un resumen) las
+    páginas numeradas no consultan ``COUNT(*)``.
+    """
+    page, page_size = _page_params(request)
+    if cursor_ordering and 'cursor' in request.GET:
+        paginator = CursorPaginator(queryset, cursor_ordering, page_size)
+        page_obj = paginator.page(request.GET['cursor'])
+        return page_obj.items, paginator.pagination_data(
+            page_obj, include_total=wants_total(request)
+        )
+    paginator = Paginator(queryset, page_size)
+    if count is not None:
+        paginator.count = count
+    page_obj = paginator.get_page(page)
+    return list(page_obj), _numbered_pagination(paginator, page_obj, page)
+
+
+async def apaginate(request, queryset, cursor_ordering=None):
+    """Igual que ``paginate`` con el ORM asíncrono"""
+    page, page_size = _page_params(request)
+    if cursor_ordering and 'cursor' in request.GET:
+        paginator = CursorPaginator(queryset, cursor_ordering, page_size)
+        page_obj = await paginator.apage(request.GET['cursor'])
+        return page_obj.items, await paginator.apagination_data(
+            page_obj, include_total=wants_total(request)
+        )
+    paginator = Paginator(queryset, page_size)
+    # Con el total ya calculado, get_page solo arma el slice sin consultar
+    paginator.count = await queryset.acount()
+    page_obj = paginator.get_page(page)
+    return [row async for row in page_obj.object_list], _numbered_pagination(
+        paginator, page_obj, page
+    )
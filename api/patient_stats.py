@@ -0,0 +1,278 @@
+"""Contadores de compras por paciente, mantenidos desde Sale.
+
+Cada venta suma su total a los contadores del paciente (``sale_count``,
+``lifetime_spend``, primera y última compra) en la misma transacción,
+y los cambios de total por las líneas (ver OrderItemMixin) aplican su
+delta. Las ventas canceladas no cuentan, igual que en lo vendido de
+consignación: cancelar una venta la descuenta y reactivarla la vuelve
+a sumar. Los contadores se leen con ``select_for_update`` después de la
+primera escritura de la transacción, así en SQLite no hay que promover
+un bloqueo de lectura y en PostgreSQL dos ventas del mismo paciente no
+se pisan.
+
+Cada cambio mueve además al paciente entre las celdas de
+PatientActivityRollup (cantidad de ventas, día de la última compra), de
+las que api.analytics saca quintiles y segmentos sin recorrer pacientes
+ni ventas. ``rebuild`` recalcula todo desde cero (ver el comando
+rebuild_patient_stats).
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.apps import apps as django_apps
+from django.db import models, transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+FIELDS = ('sale_count', 'lifetime_spend', 'first_purchase_at', 'last_purchase_at')
+EXCLUDED_STATUSES = ('cancelado',)
+
+Counters = namedtuple('Counters', FIELDS)
+
+
+def _get_model(name, registry=None):
+    return (registry or django_apps).get_model('api', name)
+
+
+def _counted(status):
+    return status not in EXCLUDED_STATUSES
+
+
+def _cell(counters):
+    if not counters.sale_count or counters.last_purchase_at is None:
+        return None
+    return {
+        'sale_count': counters.sale_count,
+        'last_purchase_date': timezone.localtime(counters.last_purchase_at).date(),
+    }
+
+
+def _apply_cell(lookup, patients, amount):
+    if not patients and not amount:
+        return
+    PatientActivityRollup = _get_model('PatientActivityRollup')
+    PatientActivityRollup.objects.get_or_create(**lookup)
+    PatientActivityRollup.objects.filter(**lookup).update(
+        patients=F('patients') + patients,
+        lifetime_spend=F('lifetime_spend') + amount,
+    )
+
+
+def _locked(patient_ids):
+    Patient = _get_model('Patient')
+    rows = (
+        Patient.objects
+        .select_for_update()
+        .filter(pk__in=patient_ids)
+        .values_list('pk', *FIELDS)
+    )
+    return {row[0]: Counters(*row[1:]) for row in rows}
+
+
+def _save(patient_id, before, after):
+    """Escribe los contadores nuevos y mueve el aporte del paciente en el resumen"""
+    Patient = _get_model('Patient')
+    Patient.objects.filter(pk=patient_id).update(**after._asdict())
+    old, new = _cell(before), _cell(after)
+    if old is not None and old == new:
+        _apply_cell(old, 0, after.lifetime_spend - before.lifetime_spend)
+        return
+    if old is not None:
+        _apply_cell(old, -1, -before.lifetime_spend)
+    if new is not None:
+        _apply_cell(new, 1, after.lifetime_spend)
+
+
+def _added(counters, count, amount, first, last):
+    return Counters(
+        counters.sale_count + count,
+        counters.lifetime_spend + amount,
+        min(first, counters.first_purchase_at) if counters.first_purchase_at else first,
+        max(last, counters.last_purchase_at) if counters.last_purchase_at else last,
+    )
+
+
+def _add_sales(totals):
+    """``totals`` tiene ``(ventas, monto, primera, última)`` por id de paciente"""
+    with transaction.atomic(savepoint=False):
+        for patient_id, before in _locked(list(totals)).items():
+            _save(patient_id, before, _added(before, *totals[patient_id]))
+
+
+def _subtract_sale(patient_id, amount):
+    """Descuenta una venta borrada o movida; ``_refresh_dates`` corrige las fechas"""
+    with transaction.atomic(savepoint=False):
+        before = _locked([patient_id]).get(patient_id)
+        if before is None:
+            return
+        count = max(before.sale_count - 1, 0)
+        _save(patient_id, before, before._replace(
+            sale_count=count,
+            lifetime_spend=before.lifetime_spend - amount if count else Decimal('0'),
+        ))
+
+
+def _refresh_dates(patient_id):
+    """Recalcula la primera y la última compra a partir de las ventas que quedan"""
+    Sale = _get_model('Sale')
+    with transaction.atomic(savepoint=False):
+        before = _locked([patient_id]).get(patient_id)
+        if before is None:
+            return
+        dates = (
+            Sale.objects
+            .filter(patient_id=patient_id)
+            .exclude(status__in=EXCLUDED_STATUSES)
+            .aggregate(first=Min('created_at'), last=Max('created_at'))
+        )
+        _save(
+            patient_id,
+            before,
+            before._replace(
+                first_purchase_at=dates['first'], last_purchase_at=dates['last']
+            ),
+        )
+
+
+def record_sales_created(sales):
+    """Versión en bloque para ventas de bulk_create: una actualización por paciente"""
+    totals = {}
+    for sale in sales:
+        if not _counted(sale.status):
+            continue
+        count, amount, first, last = totals.get(
+            sale.patient_id, (0, Decimal('0'), sale.created_at, sale.created_at)
+        )
+        totals[sale.patient_id] = (
+            count + 1,
+            amount + sale.total_amount,
+            min(first, sale.created_at),
+            max(last, sale.created_at),
+        )
+    if totals:
+        _add_sales(totals)
+
+
+def record_sale_saved(sale, previous):
+    """``previous``: ``(paciente, estado, total)`` antes de guardar, o None"""
+    if previous is None:
+        if _counted(sale.status):
+            _add_sales({
+                sale.patient_id: (
+                    1,
+                    sale.total_amount,
+                    sale.created_at,
+                    sale.created_at,
+                )
+            })
+        return
+    # El total lo mantienen las líneas: el de la fila está al día y el de la
+    # instancia puede no estarlo
+    previous_patient_id, previous_status, total = previous
+    was_counted, counted = _counted(previous_status), _counted(sale.status)
+    if previous_patient_id == sale.patient_id and was_counted == counted:
+        return
+    if was_counted:
+        _subtract_sale(previous_patient_id, total)
+        _refresh_dates(previous_patient_id)
+    if counted:
+        _add_sales({sale.patient_id: (1, total, sale.created_at, sale.created_at)})
+
+
+def record_sale_total_changed(sale_id, delta):
+    Sale = _get_model('Sale')
+    patient_id, status = Sale.objects.values_list('patient_id', 'status').get(
+        pk=sale_id
+    )
+    if not _counted(status):
+        return
+    with transaction.atomic(savepoint=False):
+        before = _locked([patient_id])[patient_id]
+        _save(
+            patient_id,
+            before,
+            before._replace(lifetime_spend=before.lifetime_spend + delta),
+        )
+
+
+def _deleted_with_patient(origin):
+    Patient = _get_model('Patient')
+    return isinstance(origin, Patient) or getattr(origin, 'model', None) is Patient
+
+
+def record_sale_deleting(sale, origin=None):
+    """Descuenta la venta que se borra, salvo cancelada o si se borra el paciente
+
+    El total se lee de la base porque el de la instancia puede no reflejar
+    las líneas borradas antes.
+    """
+    Sale = _get_model('Sale')
+    if _deleted_with_patient(origin):
+        return
+    row = Sale.objects.filter(pk=sale.pk).values_list('total_amount', 'status').first()
+    if row is not None and _counted(row[1]):
+        _subtract_sale(sale.patient_id, row[0])
+
+
+def record_sale_deleted(sale, origin=None):
+    """Corrige las fechas de compra cuando ya se borraron todas las ventas del lote"""
+    if not _deleted_with_patient(origin):
+        _refresh_dates(sale.patient_id)
+
+
+def record_patient_deleted(patient):
+    """Saca del resumen al paciente que se está borrando
+
+    Los contadores quedan en cero antes del borrado en cascada, así los
+    ajustes de total de las líneas que se borran con él no lo vuelven a
+    poner en el resumen.
+    """
+    with transaction.atomic(savepoint=False):
+        before = _locked([patient.pk]).get(patient.pk)
+        if before is not None:
+            _save(patient.pk, before, Counters(0, Decimal('0'), None, None))
+
+
+def rebuild(registry=None):
+    """Recalcula los contadores de los pacientes y el resumen a partir de las ventas"""
+    Patient = _get_model('Patient', registry)
+    Sale = _get_model('Sale', registry)
+    PatientActivityRollup = _get_model('PatientActivityRollup', registry)
+    sales = Sale.objects.filter(patient=OuterRef('pk')).exclude(
+        status__in=EXCLUDED_STATUSES,
+    ).order_by().values('patient')
+
+    with transaction.atomic():
+        Patient.objects.update(
+            sale_count=Coalesce(
+                Subquery(sales.annotate(total=Count('id')).values('total')), 0
+            ),
+            lifetime_spend=Coalesce(
+                Subquery(sales.annotate(total=Sum('total_amount')).values('total')),
+                Value(Decimal('0')),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+            first_purchase_at=Subquery(
+                sales.annotate(first=Min('created_at')).values('first')
+            ),
+            last_purchase_at=Subquery(
+                sales.annotate(last=Max('created_at')).values('last')
+            ),
+        )
+        cells = Patient.objects.filter(sale_count__gt=0).annotate(
+            last_purchase_date=TruncDate('last_purchase_at'),
+        ).values('sale_count', 'last_purchase_date').annotate(
+            total_patients=Count('id'),
+            total_spend=Sum('lifetime_spend'),
+        ).order_by()
+        PatientActivityRollup.objects.all().delete()
+        PatientActivityRollup.objects.bulk_create([
+            PatientActivityRollup(
+                sale_count=cell['sale_count'],
+                last_purchase_date=cell['last_purchase_date'],
+                patients=cell['total_patients'],
+                lifetime_spend=cell['total_spend'] or 0,
+            )
+            for cell in cells
+        ], batch_size=1000)
@@ -0,0 +1,134 @@
+"""Compras a proveedores: alta y recepción de mercadería.
+
+Recibir una compra suma al stock todas sus líneas con los UPDATE por
+lote de api.stock (una sentencia por cada 200 productos, con el estado
+recalculado en la misma sentencia), sin guardar producto por producto.
+El paso a ``recibido`` se hace con un UPDATE condicional sobre la
+compra: solo la primera petición lo consigue, así repetir la recepción
+(reintentos, dobles clics, peticiones simultáneas) no vuelve a sumar
+stock.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import response_cache, stock
+from .models import Product, Purchase, PurchaseItem
+
+RECEIVABLE_STATUSES = ('pendiente', 'procesando')
+
+
+class PurchaseValidationError(ValueError):
+    pass
+
+
+class PurchaseNotReceivable(Exception):
+    def __init__(self, purchase):
+        super().__init__(
+            f'La compra {purchase.purchase_number} está '
+            f'{purchase.get_status_display().lower()} '
+            f'y no se puede recibir'
+        )
+
+
+def _positive_int(value, label):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = 0
+    if number <= 0:
+        raise PurchaseValidationError(f'{label} debe ser un entero positivo')
+    return number
+
+
+def _parse_items(items):
+    if not isinstance(items, list) or not items:
+        raise PurchaseValidationError('La compra debe tener al menos un producto')
+    lines = []
+    for position, item in enumerate(items, 1):
+        if not isinstance(item, dict):
+            raise PurchaseValidationError(f'Línea {position}: formato inválido')
+        try:
+            unit_cost = Decimal(str(item['unit_cost']))
+        except (KeyError, InvalidOperation) as e:
+            raise PurchaseValidationError(
+                f'Línea {position}: unit_cost inválido'
+            ) from e
+        if not unit_cost.is_finite():
+            raise PurchaseValidationError(f'Línea {position}: unit_cost inválido')
+        if unit_cost < 0:
+            raise PurchaseValidationError(
+                f'Línea {position}: el costo no puede ser negativo'
+            )
+        lines.append({
+            'product': _positive_int(item.get('product'), f'Línea {position}: product'),
+            'quantity': _positive_int(
+                item.get('quantity', 1), f'Línea {position}: quantity'
+            ),
+            'unit_cost': unit_cost,
+        })
+    return lines
+
+
+def create_purchase(data):
+    """Crea la compra y sus líneas; si llega ``recibido`` también la recibe"""
+    supplier = (data.get('supplier') or '').strip()
+    if not supplier:
+        raise PurchaseValidationError('El proveedor es obligatorio')
+    status = data.get('status', 'pendiente')
+    if status not in RECEIVABLE_STATUSES + ('recibido',):
+        raise PurchaseValidationError(f'Estado inválido "{status}"')
+    lines = _parse_items(data.get('items'))
+
+    product_ids = {line['product'] for line in lines}
+    missing = product_ids - set(
+        Product.objects.filter(pk__in=product_ids).values_list('id', flat=True)
+    )
+    if missing:
+        raise PurchaseValidationError(f'Productos inexistentes: {sorted(missing)}')
+
+    items = [
+        PurchaseItem(
+            product_id=line['product'],
+            quantity=line['quantity'],
+            unit_cost=line['unit_cost'],
+        )
+        for line in lines
+    ]
+    with transaction.atomic():
+        purchase = Purchase.objects.create_with_items(
+            items,
+            supplier=supplier,
+            notes=data.get('notes', ''),
+            status='pendiente' if status == 'recibido' else status,
+        )
+        if status == 'recibido':
+            purchase, _ = receive_purchase(purchase.pk)
+    return purchase
+
+
+def receive_purchase(purchase_id):
+    """Marca la compra como recibida y suma sus cantidades al stock
+
+    Devuelve ``(compra, recibida_ahora)``. Si la compra ya estaba
+    recibida no se toca el stock y ``recibida_ahora`` es False.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = Purchase.objects.filter(
+            pk=purchase_id, status__in=RECEIVABLE_STATUSES
+        ).update(status='recibido', received_at=now, updated_at=now)
+        if claimed:
+            quantities = PurchaseItem.objects.filter(purchase_id=purchase_id).values(
+                'product_id'
+            ).annotate(total=Sum('quantity')).order_by()
+            stock.apply_stock_deltas({
+                row['product_id']: row['total'] for row in quantities
+            })
+            response_cache.invalidate(Purchase)
+        purchase = Purchase.objects.get(pk=purchase_id)
+    if not claimed and purchase.status != 'recibido':
+        raise PurchaseNotReceivable(purchase)
+    return purchase, bool(claimed)
@@ -0,0 +1,203 @@
+"""Caché de respuestas GET de la API con invalidación por versión.
+
+Cada vista cacheada declara de qué modelos depende. Cada modelo tiene
+una versión en la caché que cambia en cada escritura (señales
+post_save/post_delete en api.signals, y ``invalidate`` explícito en las
+escrituras masivas que no emiten señales: bulk_create y UPDATE por
+queryset). La clave de una respuesta combina la ruta, los parámetros
+normalizados, la fecha del día y las versiones de sus modelos, así
+una escritura deja inalcanzables las respuestas viejas sin tener que
+buscarlas ni borrarlas.
+
+Las versiones las cambian también otros procesos (comandos, trabajos en
+segundo plano), así que se guardan en una caché compartida
+(``API_CACHE_VERSION_ALIAS``, por defecto la misma que las respuestas).
+Una caché por proceso (locmem) no vería esas escrituras y serviría
+respuestas viejas: ``check_version_cache`` la rechaza al arrancar.
+
+Las respuestas llevan ETag (hash del contenido); si el cliente manda
+``If-None-Match`` con el mismo valor se contesta 304 sin cuerpo.
+"""
+import hashlib
+import uuid
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+
+VERSION_KEY = 'api:version:{}'
+RESPONSE_KEY = 'api:response:{}'
+
+
+def _cache():
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+def _version_cache():
+    return caches[
+        getattr(
+            settings,
+            'API_CACHE_VERSION_ALIAS',
+            getattr(settings, 'API_CACHE_ALIAS', 'default'),
+        )
+    ]
+
+
+def check_version_cache(**kwargs):
+    if not getattr(settings, 'API_CACHE_ENABLED', True) or not isinstance(
+        _version_cache(), LocMemCache
+    ):
+        return []
+    return [checks.Error(
+        'Las versiones de la caché de respuestas están en una caché locmem, propia de '
+        'cada proceso',
+        hint='Use una caché compartida (archivos, base de datos o redis) en '
+             'API_CACHE_VERSION_ALIAS, '
+             'o desactive la caché con API_CACHE_ENABLED=0.',
+        id='api.E001',
+    )]
+
+
+def _timeout():
+    return getattr(settings, 'API_CACHE_TIMEOUT', 300)
+
+
+def _label(model):
+    return model._meta.label_lower
+
+
+def _versions(labels):
+    """Versión actual de cada modelo; las que no existen se crean con un valor nuevo"""
+    cache = _version_cache()
+    keys = [VERSION_KEY.format(label) for label in labels]
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        for key, value in missing.items():
+            cache.add(key, value, None)
+        versions.update(cache.get_many(list(missing)))
+    return [str(versions.get(key, '')) for key in keys]
+
+
+def model_version(model):
+    """Versión del modelo, compartida entre procesos; cambia con cada ``invalidate``"""
+    return _versions([_label(model)])[0]
+
+
+def invalidate(*models):
+    """Cambia la versión de los modelos al confirmar la transacción en curso"""
+    keys = [VERSION_KEY.format(_label(model)) for model in models]
+    transaction.on_commit(
+        lambda: _version_cache().set_many({key: uuid.uuid4().hex for key in keys}, None)
+    )
+
+
+def _normalized_query(request):
+    params = sorted(
+        (key, value)
+        for key, values in request.GET.lists()
+        for value in values
+        if value != ''
+    )
+    return '&'.join(f'{key}={value}' for key, value in params)
+
+
+def _response_key(request, labels):
+    parts = [
+        request.path,
+        _normalized_query(request),
+        timezone.localdate().isoformat(),
+        *_versions(labels),
+    ]
+    return RESPONSE_KEY.format(
+        hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+    )
+
+
+def _etag(content):
+    return f'"{hashlib.md5(content, usedforsecurity=False).hexdigest()}"'
+
+
+def _not_modified(request, etag):
+    if_none_match = request.headers.get('If-None-Match')
+    return bool(if_none_match) and (
+        etag in parse_etags(if_none_match) or if_none_match.strip() == '*'
+    )
+
+
+def _finish(response, etag, status):
+    response['ETag'] = etag
+    response['X-Cache'] = status
+    # El cliente puede guardar la respuesta pero debe revalidarla con el ETag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _enabled(request):
+    return request.method == 'GET' and getattr(settings, 'API_CACHE_ENABLED', True)
+
+
+def _lookup(request, labels):
+    """Clave de la respuesta y, si está en caché, la respuesta guardada"""
+    key = _response_key(request, labels)
+    cached = _cache().get(key)
+    if cached is None:
+        return key, None
+    content, content_type, etag = cached
+    if _not_modified(request, etag):
+        return key, _finish(HttpResponseNotModified(), etag, 'HIT')
+    return key, _finish(HttpResponse(content, content_type=content_type), etag, 'HIT')
+
+
+def _store(request, key, response):
+    if response.status_code != 200 or response.streaming:
+        return response
+    etag = _etag(response.content)
+    _cache().set(key, (response.content, response['Content-Type'], etag), _timeout())
+    if _not_modified(request, etag):
+        return _finish(HttpResponseNotModified(), etag, 'MISS')
+    return _finish(response, etag, 'MISS')
+
+
+def cached_response(*models):
+    """Cachea las respuestas GET 200 de la vista; se invalidan al escribir en ``models``
+
+    Sirve para vistas síncronas y asíncronas; en estas la caché se consulta
+    fuera del bucle de eventos.
+    """
+    labels = sorted(_label(model) for model in models)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if not _enabled(request):
+                    return await view(request, *args, **kwargs)
+                key, cached = await sync_to_async(_lookup)(request, labels)
+                if cached is not None:
+                    return cached
+                response = await view(request, *args, **kwargs)
+                return await sync_to_async(_store)(request, key, response)
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _enabled(request):
+                return view(request, *args, **kwargs)
+            key, cached = _lookup(request, labels)
+            if cached is not None:
+                return cached
+            return _store(request, key, view(request, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
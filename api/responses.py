@@ -0,0 +1,41 @@
+"""Respuestas JSON de la API.
+
+Igual que django.http.JsonResponse, pero codifica con api.serializers
+(orjson si está disponible) cuando se usa el codificador por defecto, y
+guarda cuánto tardó la serialización para que api.metrics la reporte
+aparte del resto de la vista.
+"""
+import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.http import JsonResponse as DjangoJsonResponse
+
+from . import serializers
+
+
+class JsonResponse(DjangoJsonResponse):
+    def __init__(
+        self,
+        data,
+        encoder=DjangoJSONEncoder,
+        safe=True,
+        json_dumps_params=None,
+        **kwargs,
+    ):
+        started = time.perf_counter()
+        if (
+            encoder is DjangoJSONEncoder
+            and not json_dumps_params
+            and serializers.fast_json_enabled()
+        ):
+            if safe and not isinstance(data, dict):
+                raise TypeError(
+                    'In order to allow non-dict objects to be serialized set the '
+                    'safe parameter to False.'
+                )
+            kwargs.setdefault('content_type', 'application/json')
+            HttpResponse.__init__(self, content=serializers.dumps(data), **kwargs)
+        else:
+            super().__init__(data, encoder, safe, json_dumps_params, **kwargs)
+        self.serialization_time = time.perf_counter() - started
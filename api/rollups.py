@@ -0,0 +1,329 @@
+"""Mantenimiento incremental de las tablas de resumen del dashboard.
+
+Las escrituras de Product y SaleItem aplican su delta a
+CategoryStockRollup y DailySalesRollup dentro de la misma transacción,
+así las lecturas del dashboard no dependen del tamaño del histórico.
+``rebuild`` recalcula todo desde cero (ver el comando rebuild_rollups).
+"""
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def _get_model(name, registry=None):
+    return (registry or django_apps).get_model('api', name)
+
+
+def _apply(model_name, lookup, deltas):
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas:
+        return
+    model = _get_model(model_name)
+    model.objects.get_or_create(**lookup)
+    model.objects.filter(**lookup).update(
+        **{field: F(field) + value for field, value in deltas.items()}
+    )
+
+
+def _product_contribution(category, stock, product_type):
+    return category, {
+        'product_count': 1,
+        'consignment_count': 1 if product_type == 'consignacion' else 0,
+        'total_stock': stock or 0,
+    }
+
+
+def _apply_contribution(model_name, key_fields, old, new):
+    """Aplica la diferencia entre la contribución anterior y la nueva de una fila"""
+    if old and new and old[0] == new[0]:
+        deltas = {field: new[1][field] - old[1][field] for field in new[1]}
+        _apply(model_name, dict(zip(key_fields, old[0], strict=True)), deltas)
+        return
+    if old:
+        _apply(
+            model_name,
+            dict(zip(key_fields, old[0], strict=True)),
+            {f: -v for f, v in old[1].items()},
+        )
+    if new:
+        _apply(model_name, dict(zip(key_fields, new[0], strict=True)), new[1])
+
+
+def _row_contribution(row):
+    if row is None:
+        return None
+    category, values = _product_contribution(*row)
+    return (category,), values
+
+
+def record_product_saved(product, previous, current):
+    """Aplica al resumen la diferencia entre la fila antes y después de guardar
+
+    ``previous`` y ``current`` son ``(categoría, stock, tipo)`` leídos de
+    la base dentro de la transacción (ver Product.locked_row), no los
+    valores de la instancia, que pueden estar atrasados respecto a
+    cambios de stock concurrentes.
+    """
+    _apply_contribution(
+        'CategoryStockRollup',
+        ['category'],
+        _row_contribution(previous),
+        _row_contribution(current),
+    )
+    if previous and current and previous[0] != current[0]:
+        _move_product_sales(product, previous[0], current[0])
+
+
+def record_products_upserted(products, previous):
+    """Aplica al resumen un lote de productos creados o reemplazados con bulk_create
+
+    ``previous`` tiene ``(categoría, stock, tipo)`` por id de los que ya existían.
+    """
+    totals = {}
+    moved = {}
+    for product in products:
+        contributions = [
+            (1, _product_contribution(product.category, product.stock, product.type))
+        ]
+        if product.pk in previous:
+            old_category = previous[product.pk][0]
+            contributions.append((-1, _product_contribution(*previous[product.pk])))
+            if old_category != product.category:
+                moved[product.pk] = (old_category, product.category)
+        for sign, (category, values) in contributions:
+            entry = totals.setdefault(category, dict.fromkeys(values, 0))
+            for field, value in values.items():
+                entry[field] += sign * value
+    for category, deltas in totals.items():
+        _apply('CategoryStockRollup', {'category': category}, deltas)
+    if moved:
+        _move_products_sales(moved)
+
+
+def _daily_sales_rows(queryset):
+    return queryset.annotate(
+        date=TruncDate('sale__created_at'),
+    ).values('date', 'product__category').annotate(
+        total_quantity=Sum('quantity'),
+        total_amount=Sum('total_price'),
+    ).order_by()
+
+
+def _move_product_sales(product, old_category, new_category):
+    _move_products_sales({product.pk: (old_category, new_category)})
+
+
+def _move_products_sales(moves):
+    """Las ventas se agrupan por la categoría actual del producto, como en los datos
+
+    ``moves`` tiene ``(categoría anterior, categoría nueva)`` por id de producto.
+    """
+    SaleItem = _get_model('SaleItem')
+    totals = {}
+    rows = SaleItem.objects.filter(product_id__in=list(moves)).annotate(
+        date=TruncDate('sale__created_at'),
+    ).values('date', 'product_id').annotate(
+        total_quantity=Sum('quantity'),
+        total_amount=Sum('total_price'),
+    ).order_by()
+    for row in rows:
+        old_category, new_category = moves[row['product_id']]
+        for sign, category in ((-1, old_category), (1, new_category)):
+            entry = totals.setdefault(
+                (row['date'], category), {'quantity': 0, 'amount': 0}
+            )
+            entry['quantity'] += sign * (row['total_quantity'] or 0)
+            entry['amount'] += sign * (row['total_amount'] or 0)
+    for (date, category), deltas in totals.items():
+        _apply('DailySalesRollup', {'date': date, 'category': category}, deltas)
+
+
+def record_stock_deltas(deltas):
+    """Aplica al resumen por categoría los cambios de stock hechos con UPDATE masivos"""
+    Product = _get_model('Product')
+    totals = {}
+    for pk, category in Product.objects.filter(pk__in=list(deltas)).values_list(
+        'id', 'category'
+    ):
+        totals[category] = totals.get(category, 0) + deltas[pk]
+    for category, delta in totals.items():
+        _apply('CategoryStockRollup', {'category': category}, {'total_stock': delta})
+
+
+def record_product_deleted(product):
+    """Se llama antes del borrado, con la fila bloqueada para descontar sus valores"""
+    _apply_contribution(
+        'CategoryStockRollup',
+        ['category'],
+        _row_contribution(product.locked_row()),
+        None,
+    )
+
+
+def _sale_date(sale_id):
+    Sale = _get_model('Sale')
+    created_at = Sale.objects.values_list('created_at', flat=True).get(pk=sale_id)
+    return timezone.localtime(created_at).date()
+
+
+def _product_category(product_id):
+    Product = _get_model('Product')
+    return Product.objects.values_list('category', flat=True).get(pk=product_id)
+
+
+def _sale_item_key(item, sale_id, product_id):
+    if sale_id == item.sale_id:
+        date = timezone.localtime(item.sale.created_at).date()
+    else:
+        date = _sale_date(sale_id)
+    if product_id == item.product_id:
+        category = item.product.category
+    else:
+        category = _product_category(product_id)
+    return date, category
+
+
+def record_sale_item_saved(item):
+    loaded = item.get_loaded_values()
+    new = (
+        _sale_item_key(item, item.sale_id, item.product_id),
+        {'quantity': item.quantity, 'amount': item.total_price},
+    )
+    old = None
+    if loaded is not None and 'sale_id' in loaded and 'product_id' in loaded:
+        same_key = (
+            loaded['sale_id'] == item.sale_id
+            and loaded['product_id'] == item.product_id
+        )
+        old = (
+            (
+                new[0]
+                if same_key
+                else _sale_item_key(item, loaded['sale_id'], loaded['product_id'])
+            ),
+            {
+                'quantity': loaded.get('quantity') or 0,
+                'amount': loaded.get('total_price') or 0,
+            },
+        )
+    _apply_contribution('DailySalesRollup', ['date', 'category'], old, new)
+
+
+def record_sales_created(sales):
+    """Versión en bloque para ventas de bulk_create: un UPDATE por día y categoría
+
+    ``sales`` es una lista de pares ``(venta, líneas)``.
+    """
+    Product = _get_model('Product')
+    pending = {
+        item.product_id
+        for _, items in sales
+        for item in items
+        if not type(item).product.is_cached(item)
+    }
+    categories = (
+        dict(Product.objects.filter(pk__in=pending).values_list('id', 'category'))
+        if pending
+        else {}
+    )
+    totals = {}
+    for sale, items in sales:
+        date = timezone.localtime(sale.created_at).date()
+        for item in items:
+            category = categories.get(item.product_id) or item.product.category
+            quantity, amount = totals.get((date, category), (0, 0))
+            totals[(date, category)] = (
+                quantity + item.quantity,
+                amount + item.total_price,
+            )
+    for (date, category), (quantity, amount) in totals.items():
+        _apply(
+            'DailySalesRollup',
+            {'date': date, 'category': category},
+            {'quantity': quantity, 'amount': amount},
+        )
+
+
+def record_sale_items_created(sale, items):
+    record_sales_created([(sale, items)])
+
+
+def _deleting_sales(origin):
+    Sale = _get_model('Sale')
+    return isinstance(origin, Sale) or getattr(origin, 'model', None) is Sale
+
+
+def record_sale_deleted(sale, origin=None):
+    """Descuenta todas las líneas de una venta borrada con una sola consulta agrupada
+
+    Solo cuando el borrado parte de la venta; en cascadas desde otros
+    modelos cada línea se descuenta en record_sale_item_deleted.
+    """
+    if not _deleting_sales(origin):
+        return
+    SaleItem = _get_model('SaleItem')
+    date = timezone.localtime(sale.created_at).date()
+    rows = SaleItem.objects.filter(sale=sale).values('product__category').annotate(
+        total_quantity=Sum('quantity'),
+        total_amount=Sum('total_price'),
+    ).order_by()
+    for row in rows:
+        _apply(
+            'DailySalesRollup',
+            {'date': date, 'category': row['product__category']},
+            {
+                'quantity': -(row['total_quantity'] or 0),
+                'amount': -(row['total_amount'] or 0),
+            },
+        )
+
+
+def record_sale_item_deleted(item, origin=None):
+    if _deleting_sales(origin):
+        # Ya descontado en bloque por record_sale_deleted
+        return
+    old = (
+        _sale_item_key(item, item.sale_id, item.product_id),
+        {'quantity': item.quantity, 'amount': item.total_price},
+    )
+    _apply_contribution('DailySalesRollup', ['date', 'category'], old, None)
+
+
+def rebuild(registry=None):
+    """Recalcula todas las tablas de resumen a partir de los datos crudos"""
+    Product = _get_model('Product', registry)
+    SaleItem = _get_model('SaleItem', registry)
+    DailySalesRollup = _get_model('DailySalesRollup', registry)
+    CategoryStockRollup = _get_model('CategoryStockRollup', registry)
+
+    stock_rows = Product.objects.values('category').annotate(
+        product_count=Count('id'),
+        consignment_count=Count('id', filter=Q(type='consignacion')),
+        total_stock=Sum('stock'),
+    ).order_by()
+
+    sales_rows = _daily_sales_rows(SaleItem.objects.all())
+
+    with transaction.atomic():
+        CategoryStockRollup.objects.all().delete()
+        DailySalesRollup.objects.all().delete()
+        CategoryStockRollup.objects.bulk_create([
+            CategoryStockRollup(
+                category=row['category'],
+                product_count=row['product_count'],
+                consignment_count=row['consignment_count'],
+                total_stock=row['total_stock'] or 0,
+            )
+            for row in stock_rows
+        ])
+        DailySalesRollup.objects.bulk_create([
+            DailySalesRollup(
+                date=row['date'],
+                category=row['product__category'],
+                quantity=row['total_quantity'] or 0,
+                amount=row['total_amount'] or 0,
+            )
+            for row in sales_rows
+        ], batch_size=1000)
@@ -0,0 +1,77 @@
+"""Lecturas desde la réplica.
+
+Con una base ``replica`` configurada (ver settings), las peticiones GET
+de las vistas marcadas con ``replica_reads`` (dashboard, listados,
+exportaciones) leen de ella. Todo lo demás va a la primaria
+(``default``), incluidas las lecturas de las vistas que escriben: una
+escritura seguida de una lectura en la misma petición nunca ve la
+réplica atrasada. La marca es una variable de contexto, que pasa a los
+hilos de sync_to_async de las vistas asíncronas. Los objetos
+relacionados de una instancia se leen de la misma base que la instancia,
+como hace Django sin router.
+
+Con la caché de respuestas activa, una respuesta leída de una réplica
+atrasada queda cacheada hasta la siguiente escritura en sus modelos.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_ALIAS = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+
+_use_replica = ContextVar('api_use_replica', default=False)
+
+
+@contextmanager
+def reading_from_replica():
+    """Las lecturas dentro del bloque van a la réplica, si hay"""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def replica_reads(view):
+    """Los GET de la vista leen de la réplica; vale para vistas sync y async"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if request.method not in READ_METHODS:
+                return await view(request, *args, **kwargs)
+            with reading_from_replica():
+                return await view(request, *args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in READ_METHODS:
+            return view(request, *args, **kwargs)
+        with reading_from_replica():
+            return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Las relaciones de una instancia se leen de la base de la que salió
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if _use_replica.get() and REPLICA_ALIAS in settings.DATABASES:
+            return REPLICA_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplica tiene los mismos datos que la primaria
+        return True
@@ -0,0 +1,199 @@
+"""Alta de ventas en lote.
+
+Todo el lote se valida antes de abrir la transacción, con una consulta
+para pacientes y otra para productos. Después solo se escribe en bloque:
+ventas, líneas, historial de compras y descuento de stock (ver
+api.stock). Si una venta trae ``reservation`` se confirma esa reserva
+en vez de descontar stock. Sin lecturas previas dentro de la
+transacción, SQLite no tiene que promover un bloqueo de lectura a
+escritura, que es lo que provoca "database is locked" con varias cajas
+a la vez. En PostgreSQL el stock se descuenta con UPDATE atómicos en
+orden de id, sin carreras entre filas.
+"""
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import patient_stats, response_cache, rollups, stock
+from .models import Patient, PatientPurchaseHistory, Product, Sale, SaleItem
+
+SALE_STATUSES = {code for code, _ in Sale.STATUS_CHOICES}
+
+
+class SaleValidationError(ValueError):
+    pass
+
+
+def _sale_entries(payload):
+    """Acepta ``{"sales": [...]}``, una lista de ventas o una sola venta"""
+    entries = payload.get('sales', [payload]) if isinstance(payload, dict) else payload
+    if not isinstance(entries, list) or not entries:
+        raise SaleValidationError('Se esperaba al menos una venta')
+    return entries
+
+
+def _positive_int(value, label):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = 0
+    if number <= 0:
+        raise SaleValidationError(f'{label} debe ser un entero positivo')
+    return number
+
+
+def _reservation_token(value, position):
+    if not value:
+        return None
+    try:
+        return uuid.UUID(str(value))
+    except ValueError as e:
+        raise SaleValidationError(f'Venta {position}: reserva inválida') from e
+
+
+def _parse(entries):
+    sales = []
+    for position, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict):
+            raise SaleValidationError(f'Venta {position}: formato inválido')
+        items = entry.get('items') or []
+        if not items:
+            raise SaleValidationError(
+                f'Venta {position}: debe tener al menos un producto'
+            )
+        status = entry.get('status', 'nuevo')
+        if status not in SALE_STATUSES:
+            raise SaleValidationError(f'Venta {position}: estado inválido "{status}"')
+        lines = []
+        for item in items:
+            unit_price = item.get('unit_price')
+            if unit_price is not None:
+                try:
+                    unit_price = Decimal(str(unit_price))
+                except InvalidOperation as e:
+                    raise SaleValidationError(
+                        f'Venta {position}: precio inválido'
+                    ) from e
+                if not unit_price.is_finite() or unit_price < 0:
+                    raise SaleValidationError(f'Venta {position}: precio inválido')
+            lines.append({
+                'product': _positive_int(
+                    item.get('product'), f'Venta {position}: product'
+                ),
+                'quantity': _positive_int(
+                    item.get('quantity', 1), f'Venta {position}: quantity'
+                ),
+                'unit_price': unit_price,
+            })
+        sales.append({
+            'patient': _positive_int(
+                entry.get('patient'), f'Venta {position}: patient'
+            ),
+            'status': status,
+            'notes': entry.get('notes', ''),
+            'items': lines,
+            'reservation': _reservation_token(entry.get('reservation'), position),
+        })
+    return sales
+
+
+def _quantities(sale_data):
+    quantities = {}
+    for line in sale_data['items']:
+        quantities[line['product']] = (
+            quantities.get(line['product'], 0) + line['quantity']
+        )
+    return quantities
+
+
+def create_sales(payload):
+    """Crea las ventas del payload en una sola transacción y las devuelve"""
+    sales_data = _parse(_sale_entries(payload))
+
+    patient_ids = {sale['patient'] for sale in sales_data}
+    product_ids = {line['product'] for sale in sales_data for line in sale['items']}
+    existing_patients = set(
+        Patient.objects.filter(pk__in=patient_ids).values_list('id', flat=True)
+    )
+    missing = patient_ids - existing_patients
+    if missing:
+        raise SaleValidationError(f'Pacientes inexistentes: {sorted(missing)}')
+    prices = dict(Product.objects.filter(pk__in=product_ids).values_list('id', 'price'))
+    missing = product_ids - set(prices)
+    if missing:
+        raise SaleValidationError(f'Productos inexistentes: {sorted(missing)}')
+
+    for position, sale_data in enumerate(sales_data, 1):
+        if sale_data['reservation'] and stock.reserved_quantities(
+            sale_data['reservation']
+        ) != _quantities(sale_data):
+            raise SaleValidationError(
+                f'Venta {position}: la reserva no coincide con los productos '
+                'de la venta'
+            )
+
+    now = timezone.now()
+    sales = []
+    items_by_sale = []
+    stock_deltas = {}
+    for sale_data in sales_data:
+        items = []
+        reserved = bool(sale_data['reservation'])
+        for line in sale_data['items']:
+            item = SaleItem(
+                product_id=line['product'],
+                quantity=line['quantity'],
+                unit_price=(
+                    line['unit_price']
+                    if line['unit_price'] is not None
+                    else prices[line['product']]
+                ),
+            )
+            item.calculate_total()
+            items.append(item)
+            if not reserved:
+                stock_deltas[line['product']] = (
+                    stock_deltas.get(line['product'], 0) - line['quantity']
+                )
+        sales.append(Sale(
+            order_number=Sale.generate_order_number(),
+            patient_id=sale_data['patient'],
+            status=sale_data['status'],
+            notes=sale_data['notes'],
+            total_amount=sum((item.total_price for item in items), Decimal('0')),
+        ))
+        items_by_sale.append(items)
+
+    with transaction.atomic():
+        Sale.objects.bulk_create(sales)
+        history = []
+        for sale, items in zip(sales, items_by_sale, strict=True):
+            for item in items:
+                item.sale = sale
+                history.append(PatientPurchaseHistory(
+                    patient_id=sale.patient_id,
+                    product_id=item.product_id,
+                    quantity=item.quantity,
+                    price=item.unit_price,
+                    date=now,
+                    notes=f'Venta {sale.order_number}',
+                ))
+        SaleItem.objects.bulk_create(
+            [item for items in items_by_sale for item in items], batch_size=500
+        )
+        PatientPurchaseHistory.objects.bulk_create(history, batch_size=500)
+        for sale_data in sales_data:
+            if sale_data['reservation'] and stock.commit_reservation(
+                sale_data['reservation']
+            ) != _quantities(sale_data):
+                raise SaleValidationError(
+                    'La reserva cambió mientras se registraba la venta'
+                )
+        stock.apply_stock_deltas(stock_deltas)
+        rollups.record_sales_created(list(zip(sales, items_by_sale, strict=True)))
+        patient_stats.record_sales_created(sales)
+        response_cache.invalidate(Sale, SaleItem, PatientPurchaseHistory)
+
+    return sales
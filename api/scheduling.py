@@ -0,0 +1,155 @@
+"""Agenda de citas: rejilla de horarios y disponibilidad por doctor.
+
+La disponibilidad de una semana se calcula con una sola consulta por
+rango sobre el índice único (doctor, date, time) de las citas activas,
+y se recorre una vez restando las horas ocupadas de la rejilla. El mismo
+índice impide en la base de datos reservar dos veces el mismo horario.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+
+from .models import Appointment, Patient
+
+SLOT_MINUTES = 30
+DAY_START = time(9, 0)
+DAY_END = time(18, 0)
+# Lunes a sábado
+WORKING_WEEKDAYS = {0, 1, 2, 3, 4, 5}
+MAX_RANGE_DAYS = 31
+
+DEFAULT_DOCTOR = Appointment._meta.get_field('doctor').default
+
+
+class ScheduleError(ValueError):
+    pass
+
+
+class SlotTaken(Exception):
+    def __init__(self, doctor, day, value):
+        super().__init__(
+            f'{doctor} ya tiene una cita el {day:%Y-%m-%d} a las {value:%H:%M}'
+        )
+
+
+def slot_times():
+    slots = []
+    current = datetime.combine(date.min, DAY_START)
+    end = datetime.combine(date.min, DAY_END)
+    while current < end:
+        slots.append(current.time())
+        current += timedelta(minutes=SLOT_MINUTES)
+    return slots
+
+
+SLOTS = slot_times()
+
+
+def slot_for(value):
+    """Inicio del horario que contiene ``value``"""
+    minutes = value.hour * 60 + value.minute
+    minutes -= minutes % SLOT_MINUTES
+    return time(minutes // 60, minutes % 60)
+
+
+def validate_slot(day, value):
+    if day.weekday() not in WORKING_WEEKDAYS:
+        raise ScheduleError('El día seleccionado no es laborable')
+    if value not in SLOTS:
+        raise ScheduleError(
+            f'La hora debe estar entre {DAY_START:%H:%M} y {DAY_END:%H:%M} '
+            f'en intervalos de {SLOT_MINUTES} minutos'
+        )
+
+
+def parse_range(params, default_days=7):
+    """Lee ``start``/``end`` (YYYY-MM-DD); por defecto la semana desde hoy"""
+    try:
+        start = (
+            date.fromisoformat(params['start']) if params.get('start') else date.today()
+        )
+        end = (
+            date.fromisoformat(params['end'])
+            if params.get('end')
+            else start + timedelta(days=default_days - 1)
+        )
+    except ValueError as e:
+        raise ScheduleError('Fecha inválida, use el formato YYYY-MM-DD') from e
+    if end < start:
+        raise ScheduleError('La fecha final es anterior a la inicial')
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise ScheduleError(f'El rango no puede superar {MAX_RANGE_DAYS} días')
+    return start, end
+
+
+def availability(start, end, doctors=None):
+    """Horarios libres por doctor y día entre ``start`` y ``end`` (incluidos)"""
+    booked = Appointment.objects.exclude(status='cancelada').filter(
+        date__range=(start, end)
+    )
+    if doctors:
+        booked = booked.filter(doctor__in=doctors)
+    taken = {}
+    for doctor, day, value in booked.order_by('doctor', 'date', 'time').values_list(
+        'doctor', 'date', 'time'
+    ):
+        taken.setdefault(doctor, {}).setdefault(day, set()).add(slot_for(value))
+
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    working_days = [day for day in days if day.weekday() in WORKING_WEEKDAYS]
+    result = {}
+    for doctor in sorted(
+        set(doctors or []) | set(taken) | ({DEFAULT_DOCTOR} if not doctors else set())
+    ):
+        doctor_taken = taken.get(doctor, {})
+        result[doctor] = {
+            day.isoformat(): [
+                slot.strftime('%H:%M')
+                for slot in SLOTS
+                if slot not in doctor_taken.get(day, ())
+            ]
+            for day in working_days
+        }
+    return result
+
+
+def book(data):
+    """Crea una cita validando el horario; lanza SlotTaken si ya está ocupado
+
+    La comprobación definitiva la hace la restricción única de la base de
+    datos, así dos reservas simultáneas del mismo horario no pueden
+    entrar las dos.
+    """
+    try:
+        day = date.fromisoformat(data['date'])
+        value = time.fromisoformat(data['time'])
+    except (TypeError, ValueError) as e:
+        raise ScheduleError('Fecha u hora inválida') from e
+    validate_slot(day, value)
+    appointment_type = data.get('type', 'consulta')
+    if appointment_type not in dict(Appointment.TYPE_CHOICES):
+        raise ScheduleError(f'Tipo de cita inválido: {appointment_type}')
+    status = data.get('status', 'pendiente')
+    if status == 'cancelada' or status not in dict(Appointment.STATUS_CHOICES):
+        raise ScheduleError(f'Estado inválido: {status}')
+    doctor = data.get('doctor') or DEFAULT_DOCTOR
+    try:
+        patient_id = int(data['patient'])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ScheduleError('Paciente inválido') from e
+    if not Patient.objects.filter(pk=patient_id).exists():
+        raise ScheduleError(f'Paciente inexistente: {patient_id}')
+
+    try:
+        with transaction.atomic():
+            return Appointment.objects.create(
+                patient_id=patient_id,
+                date=day,
+                time=value,
+                type=appointment_type,
+                doctor=doctor,
+                status=status,
+                notes=data.get('notes') or '',
+            )
+    except IntegrityError as e:
+        raise SlotTaken(doctor, day, value) from e
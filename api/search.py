@@ -0,0 +1,233 @@
+"""Búsqueda de texto completo para productos y pacientes.
+
+Cada modelo buscable tiene una tabla de índice aparte, creada por la
+migración 0004 y mantenida por señales (ver api.signals). La tabla se
+modela sin gestionar (``ProductSearchEntry``, ``PatientSearchEntry``)
+para que la búsqueda sea un JOIN por ``search_entry``:
+
+- SQLite: tabla virtual FTS5 con ``rowid`` igual al id del modelo; la
+  relevancia es la columna oculta ``rank``.
+- PostgreSQL: tabla con una columna ``tsvector`` (índice GIN) y el texto
+  plano con índice trigram de ``pg_trgm``, que también encuentra
+  palabras con errores de tipeo.
+
+Las consultas usan coincidencia por prefijo en cada término. En otros
+motores se vuelve a ``icontains``.
+"""
+import re
+
+from django.apps import apps as django_apps
+from django.db import connections, models, transaction
+from django.db.models import F, FloatField, Func, Lookup, Q
+
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+INDEX_BATCH_SIZE = 500
+
+
+class SearchIndex:
+    """Describe qué columnas de un modelo se indexan y cómo buscar sin índice"""
+
+    def __init__(self, model_name, table, fields, fallback_fields):
+        self.model_name = model_name
+        self.table = table
+        self.fields = fields
+        self.fallback_fields = fallback_fields
+
+    def document(self, instance):
+        return [
+            str(value or '')
+            for value in (getter(instance) for getter in self.fields.values())
+        ]
+
+
+def _product_category(product):
+    return f"{product.category} {product.get_category_display()}"
+
+
+PRODUCT_INDEX = SearchIndex(
+    'product',
+    'api_product_search',
+    {
+        'name': lambda product: product.name,
+        'category': _product_category,
+        'supplier': lambda product: product.supplier,
+        'code': lambda product: product.code,
+    },
+    ['name', 'category', 'supplier', 'code'],
+)
+
+PATIENT_INDEX = SearchIndex(
+    'patient',
+    'api_patient_search',
+    {
+        'name': lambda patient: patient.name,
+        'email': lambda patient: patient.email,
+        'phone': lambda patient: patient.phone,
+    },
+    ['name', 'email', 'phone'],
+)
+
+INDEXES = {index.model_name: index for index in (PRODUCT_INDEX, PATIENT_INDEX)}
+
+
+def _terms(text):
+    return _TERM.findall(text)
+
+
+def _fts_match(terms):
+    return ' AND '.join(f'"{term}"*' for term in terms)
+
+
+def _tsquery(terms):
+    return ' & '.join(f"{term}:*" for term in terms)
+
+
+class SearchDocumentField(models.TextField):
+    """Documento de una fila del índice; se consulta con ``__match`` y ``SearchRank``"""
+
+
+@SearchDocumentField.register_lookup
+class Match(Lookup):
+    """``search_entry__document__match=texto``: todos los términos, por prefijo"""
+    lookup_name = 'match'
+    prepare_rhs = False
+
+    def as_sqlite(self, compiler, connection):
+        # En FTS5 el MATCH va contra la columna oculta con el nombre de la tabla
+        alias = compiler.quote_name_unless_alias(self.lhs.alias)
+        table = connection.ops.quote_name(self.lhs.target.model._meta.db_table)
+        return f'{alias}.{table} MATCH %s', [_fts_match(_terms(self.rhs))]
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        alias = compiler.quote_name_unless_alias(self.lhs.alias)
+        body = f"{alias}.{connection.ops.quote_name('body')}"
+        return (
+            f"({lhs} @@ to_tsquery('simple', %s) OR %s <%% {body})",
+            [*lhs_params, _tsquery(_terms(self.rhs)), self.rhs],
+        )
+
+
+class SearchRank(Func):
+    """Relevancia de la fila del índice unida; mayor es mejor"""
+    output_field = FloatField()
+
+    def __init__(self, document, text):
+        super().__init__(document)
+        self.text = text
+
+    def _column(self, compiler, connection, name):
+        """Otra columna de la misma fila del índice"""
+        alias = compiler.quote_name_unless_alias(self.get_source_expressions()[0].alias)
+        return f'{alias}.{connection.ops.quote_name(name)}'
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # rank de FTS5 es bm25 negativo: menor es mejor
+        return f'-{self._column(compiler, connection, "rank")}', []
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.get_source_expressions()[0])
+        body = self._column(compiler, connection, 'body')
+        return (
+            f"GREATEST(ts_rank({sql}, to_tsquery('simple', %s)), "
+            f"word_similarity(%s, {body}))",
+            [*params, _tsquery(_terms(self.text)), self.text],
+        )
+
+
+def _write(cursor, index, documents):
+    """Reemplaza los documentos ``[(pk, valores)]`` con una sentencia por bloque"""
+    vendor = cursor.db.vendor
+    for start in range(0, len(documents), INDEX_BATCH_SIZE):
+        batch = documents[start:start + INDEX_BATCH_SIZE]
+        if vendor == 'sqlite':
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f"DELETE FROM {index.table} WHERE rowid IN ({placeholders})",
+                [pk for pk, _ in batch],
+            )
+            columns = ', '.join(index.fields)
+            placeholders = ', '.join(['%s'] * len(index.fields))
+            cursor.executemany(
+                f"INSERT INTO {index.table} (rowid, {columns}) "
+                f"VALUES (%s, {placeholders})",
+                [[pk, *values] for pk, values in batch],
+            )
+        elif vendor == 'postgresql':
+            cursor.executemany(
+                f"INSERT INTO {index.table} (rowid, document, body) "
+                f"VALUES (%s, to_tsvector('simple', %s), %s) "
+                f"ON CONFLICT (rowid) DO UPDATE "
+                f"SET document = EXCLUDED.document, body = EXCLUDED.body",
+                [[pk, ' '.join(values), ' '.join(values)] for pk, values in batch],
+            )
+
+
+def index_instances(instances, using=None):
+    """Añade o actualiza en el índice las instancias dadas (todas del mismo modelo)"""
+    instances = list(instances)
+    if not instances:
+        return
+    conn = connections[using or instances[0]._state.db or 'default']
+    if conn.vendor not in ('sqlite', 'postgresql'):
+        return
+    index = INDEXES[instances[0]._meta.model_name]
+    with conn.cursor() as cursor:
+        _write(
+            cursor,
+            index,
+            [(instance.pk, index.document(instance)) for instance in instances],
+        )
+
+
+def remove_instance(instance, using=None):
+    conn = connections[using or instance._state.db or 'default']
+    if conn.vendor not in ('sqlite', 'postgresql'):
+        return
+    index = INDEXES[instance._meta.model_name]
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {index.table} WHERE rowid = %s", [instance.pk])
+
+
+def rebuild(registry=None, using='default', batch_size=1000):
+    """Reindexa desde cero todos los modelos buscables"""
+    if connections[using].vendor not in ('sqlite', 'postgresql'):
+        return
+    for index in INDEXES.values():
+        model = (registry or django_apps).get_model('api', index.model_name)
+        # En una sola transacción: en autocommit cada fila del executemany confirma
+        # por separado
+        with transaction.atomic(using=using):
+            with connections[using].cursor() as cursor:
+                cursor.execute(f"DELETE FROM {index.table}")
+            batch = []
+            for instance in (
+                model.objects.using(using).order_by().iterator(chunk_size=batch_size)
+            ):
+                batch.append(instance)
+                if len(batch) >= batch_size:
+                    index_instances(batch, using)
+                    batch = []
+            index_instances(batch, using)
+
+
+def search(queryset, text):
+    """Filtra el queryset por ``text`` y lo ordena por relevancia"""
+    terms = _terms(text)
+    if not terms:
+        return queryset
+    if connections[queryset.db].vendor in ('sqlite', 'postgresql'):
+        # Un solo JOIN con el índice: filtra y da la relevancia de cada fila
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        return (
+            queryset.filter(search_entry__document__match=text)
+            .annotate(search_rank=SearchRank(F('search_entry__document'), text))
+            .order_by('-search_rank', *ordering)
+        )
+
+    index = INDEXES[queryset.model._meta.model_name]
+    condition = Q()
+    for field in index.fallback_fields:
+        condition |= Q(**{f'{field}__icontains': text})
+    return queryset.filter(condition)
@@ -0,0 +1,407 @@
+"""Datos sintéticos de una óptica para pruebas de carga y benchmarks.
+
+Todo se inserta con bulk_create por lotes y con un generador aleatorio
+con semilla, así el mismo comando produce el mismo volumen y la misma
+distribución. Las ventas y el historial se reparten día a día en el
+último año: cada día se inserta en bloque y luego un único UPDATE le
+pone la fecha (auto_now_add pisa la fecha en bulk_create). Las citas se
+asignan a celdas (día, doctor, horario) distintas para respetar la
+restricción de horario único (si ya hay datos, las celdas ocupadas se
+saltan). Al final se reconstruyen los resúmenes y
+el índice de búsqueda, y se invalidan las cachés.
+"""
+import random
+import uuid
+from array import array
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import patient_stats, response_cache, rollups, scheduling, search
+from .models import (
+    Appointment,
+    ConsignmentMovement,
+    Patient,
+    PatientPurchaseHistory,
+    Product,
+    Purchase,
+    PurchaseItem,
+    Sale,
+    SaleItem,
+)
+from .signals import CACHED_MODELS
+
+SEED_BATCH_SIZE = 5000
+HISTORY_DAYS = 365
+UPCOMING_DAYS = 30
+
+SCALES = {
+    'small': 10_000,
+    'medium': 100_000,
+    'large': 1_000_000,
+}
+
+BRANDS = {
+    'lentes': ['Essilor', 'Zeiss', 'Hoya', 'Rodenstock', 'Shamir'],
+    'armazones': ['Ray-Ban', 'Oakley', 'Vogue', 'Prada', 'Carrera', 'Tommy Hilfiger'],
+    'lentes_contacto': ['Acuvue', 'Biofinity', 'Air Optix', 'Dailies', 'Biotrue'],
+    'accesorios': ['Estuche', 'Paño', 'Cordón', 'Spray limpiador', 'Kit de tornillos'],
+}
+MODELS = [
+    'Classic',
+    'Sport',
+    'Slim',
+    'Kids',
+    'Premium',
+    'Blue Cut',
+    'Progresivo',
+    'Monofocal',
+    'Fotocromático',
+]
+SUPPLIERS = [
+    'Telko',
+    'Luxottica',
+    'Safilo',
+    'Marcolin',
+    'Essilor Andina',
+    'Zeiss Vision',
+    'Visionlab',
+    'Ópticas Unidas',
+]
+PRICE_RANGES = {
+    'lentes': (60, 450),
+    'armazones': (40, 380),
+    'lentes_contacto': (15, 120),
+    'accesorios': (3, 35),
+}
+FIRST_NAMES = [
+    'Ana',
+    'Luis',
+    'María',
+    'José',
+    'Carmen',
+    'Jorge',
+    'Lucía',
+    'Pedro',
+    'Sofía',
+    'Diego',
+    'Valentina',
+    'Andrés',
+    'Camila',
+    'Miguel',
+    'Isabel',
+    'Fernando',
+    'Paula',
+    'Ricardo',
+]
+LAST_NAMES = [
+    'Martín',
+    'Pérez',
+    'García',
+    'Rodríguez',
+    'López',
+    'Sánchez',
+    'Ramírez',
+    'Torres',
+    'Flores',
+    'Rivera',
+    'Gómez',
+    'Díaz',
+    'Vargas',
+    'Castro',
+    'Rojas',
+    'Morales',
+]
+DOCTORS = ['Dr. Principal', 'Dra. Gómez', 'Dr. Ruiz', 'Dra. Fernández']
+
+
+class SeedCounts:
+    def __init__(self, products, patients, sales, appointments):
+        self.products = products
+        self.patients = patients
+        self.sales = sales
+        self.appointments = appointments
+
+    @classmethod
+    def for_scale(cls, scale):
+        size = SCALES[scale]
+        return cls(size, size, size, size)
+
+
+def flush():
+    """Vacía las tablas de la app (más rápido que borrar con el ORM y sus señales)"""
+    from django.apps import apps
+
+    tables = [model._meta.db_table for model in apps.get_app_config('api').get_models()]
+    statements = connection.ops.sql_flush(
+        no_style(), tables, reset_sequences=True, allow_cascade=True
+    )
+    connection.ops.execute_sql_flush(statements)
+    search.rebuild()
+    _invalidate_caches()
+
+
+def _invalidate_caches():
+    response_cache.invalidate(*CACHED_MODELS)
+
+
+class _Seeder:
+    def __init__(self, counts, seed, batch_size, log):
+        self.counts = counts
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log
+        # Prefijo por corrida para no chocar con códigos de datos ya cargados
+        self.tag = uuid.uuid4().hex[:4].upper()
+        self.today = timezone.localdate()
+
+    def _batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield start, min(self.batch_size, total - start)
+
+    def _price(self, category):
+        low, high = PRICE_RANGES[category]
+        return Decimal(self.rng.randint(low * 100, high * 100)) / 100
+
+    def products(self):
+        categories = [code for code, _ in Product.CATEGORY_CHOICES]
+        now = timezone.now()
+        for start, size in self._batches(self.counts.products):
+            batch = []
+            for number in range(start, start + size):
+                category = self.rng.choice(categories)
+                stock = (
+                    self.rng.choice([0, 1, 3, 5])
+                    if self.rng.random() < 0.15
+                    else self.rng.randint(6, 80)
+                )
+                batch.append(Product(
+                    code=f'PROD-{self.tag}{number:07X}',
+                    name=(
+                        f'{self.rng.choice(BRANDS[category])} '
+                        f'{self.rng.choice(MODELS)} {number % 997}'
+                    ),
+                    category=category,
+                    supplier=self.rng.choice(SUPPLIERS),
+                    stock=stock,
+                    price=self._price(category),
+                    status=Product.status_for_stock(stock),
+                    type='consignacion' if self.rng.random() < 0.1 else 'propio',
+                    created_at=now,
+                    updated_at=now,
+                ))
+            Product.objects.bulk_create(batch)
+            self.log(f'Productos: {start + size}/{self.counts.products}')
+
+    def patients(self):
+        for start, size in self._batches(self.counts.patients):
+            batch = []
+            for number in range(start, start + size):
+                first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+                batch.append(Patient(
+                    name=f'{first} {last} {self.rng.choice(LAST_NAMES)}',
+                    email=f'{first.lower()}.{number}.{self.tag.lower()}@example.com',
+                    phone=f'+34 6{self.rng.randint(10000000, 99999999)}',
+                    status='inactivo' if self.rng.random() < 0.1 else 'activo',
+                ))
+            Patient.objects.bulk_create(batch)
+            self.log(f'Pacientes: {start + size}/{self.counts.patients}')
+
+    def _id_array(self, queryset):
+        return array(
+            'q',
+            queryset
+            .order_by('pk')
+            .values_list('pk', flat=True)
+            .iterator(chunk_size=self.batch_size),
+        )
+
+    def sales(self, patient_ids, product_ids, prices):
+        per_day, extra = divmod(self.counts.sales, HISTORY_DAYS)
+        created = 0
+        for offset in range(HISTORY_DAYS, 0, -1):
+            day = self.today - timedelta(days=offset - 1)
+            moment = timezone.make_aware(datetime.combine(day, time(12, 0)))
+            for _, size in self._batches(per_day + (1 if offset <= extra else 0)):
+                self._sales_batch(size, moment, patient_ids, product_ids, prices)
+                created += size
+            if offset % 30 == 1:
+                self.log(f'Ventas: {created}/{self.counts.sales}')
+
+    def _sales_batch(self, size, moment, patient_ids, product_ids, prices):
+        statuses = ['entregado'] * 6 + ['nuevo', 'en_proceso', 'cancelado']
+        sales, lines = [], []
+        for _ in range(size):
+            items = []
+            for _ in range(self.rng.choice([1, 1, 1, 2, 2, 3])):
+                index = self.rng.randrange(len(product_ids))
+                quantity = self.rng.choice([1, 1, 1, 2])
+                unit_price = Decimal(prices[index]) / 100
+                items.append(SaleItem(
+                    product_id=product_ids[index], quantity=quantity,
+                    unit_price=unit_price, total_price=unit_price * quantity,
+                ))
+            sales.append(Sale(
+                order_number=f'ORD-{self.tag}{uuid.uuid4().hex[:10].upper()}',
+                patient_id=patient_ids[self.rng.randrange(len(patient_ids))],
+                status=self.rng.choice(statuses),
+                total_amount=sum(item.total_price for item in items),
+            ))
+            lines.append(items)
+
+        with transaction.atomic():
+            Sale.objects.bulk_create(sales)
+            items, history = [], []
+            for sale, sale_items in zip(sales, lines, strict=True):
+                for item in sale_items:
+                    item.sale_id = sale.pk
+                    items.append(item)
+                    history.append(
+                        PatientPurchaseHistory(
+                            patient_id=sale.patient_id,
+                            product_id=item.product_id,
+                            quantity=item.quantity,
+                            price=item.unit_price,
+                            date=moment,
+                            notes=f'Venta {sale.order_number}',
+                        )
+                    )
+            SaleItem.objects.bulk_create(items)
+            PatientPurchaseHistory.objects.bulk_create(history)
+            Sale.objects.filter(pk__in=[sale.pk for sale in sales]).update(
+                created_at=moment, updated_at=moment
+            )
+
+    def appointments(self, patient_ids):
+        total = self.counts.appointments
+        days = [
+            self.today + timedelta(days=offset)
+            for offset in range(-HISTORY_DAYS, UPCOMING_DAYS)
+            if (self.today + timedelta(days=offset)).weekday()
+            in scheduling.WORKING_WEEKDAYS
+        ]
+        cells_per_doctor = len(days) * len(scheduling.SLOTS)
+        doctor_count = max(len(DOCTORS), -(-total * 10 // (cells_per_doctor * 7)))
+        doctors = DOCTORS + [
+            f'Dr. Auxiliar {number}'
+            for number in range(1, doctor_count - len(DOCTORS) + 1)
+        ]
+        probability = min(1.0, total / (cells_per_doctor * len(doctors)))
+        types = [code for code, _ in Appointment.TYPE_CHOICES]
+
+        batch, created = [], 0
+        for day in days:
+            for doctor in doctors:
+                for slot in scheduling.SLOTS:
+                    if created >= total or self.rng.random() >= probability:
+                        continue
+                    if day < self.today:
+                        status = (
+                            'cancelada' if self.rng.random() < 0.08 else 'confirmada'
+                        )
+                    else:
+                        status = self.rng.choice([
+                            'pendiente',
+                            'pendiente',
+                            'confirmada',
+                        ])
+                    batch.append(
+                        Appointment(
+                            patient_id=patient_ids[
+                                self.rng.randrange(len(patient_ids))
+                            ],
+                            date=day,
+                            time=slot,
+                            type=self.rng.choice(types),
+                            doctor=doctor,
+                            status=status,
+                        )
+                    )
+                    created += 1
+                    if len(batch) >= self.batch_size:
+                        Appointment.objects.bulk_create(batch, ignore_conflicts=True)
+                        batch = []
+                        self.log(f'Citas: {created}/{total}')
+        Appointment.objects.bulk_create(batch, ignore_conflicts=True)
+
+    def purchases(self, product_ids, prices):
+        """Una compra recibida de 20 líneas por cada 100 productos"""
+        count = max(1, self.counts.products // 100)
+        for start, size in self._batches(count):
+            purchases, lines = [], []
+            for number in range(start, start + size):
+                items = []
+                for _ in range(20):
+                    index = self.rng.randrange(len(product_ids))
+                    unit_cost = (
+                        Decimal(prices[index]) / 100 * Decimal('0.55')
+                    ).quantize(Decimal('0.01'))
+                    quantity = self.rng.randint(1, 12)
+                    items.append(PurchaseItem(
+                        product_id=product_ids[index], quantity=quantity,
+                        unit_cost=unit_cost, total_cost=unit_cost * quantity,
+                    ))
+                purchases.append(Purchase(
+                    purchase_number=f'PUR-{self.tag}{number:07X}',
+                    supplier=self.rng.choice(SUPPLIERS),
+                    total_amount=sum(item.total_cost for item in items),
+                    status='recibido',
+                    received_at=timezone.now(),
+                ))
+                lines.append(items)
+            with transaction.atomic():
+                Purchase.objects.bulk_create(purchases)
+                for purchase, items in zip(purchases, lines, strict=True):
+                    for item in items:
+                        item.purchase_id = purchase.pk
+                PurchaseItem.objects.bulk_create([
+                    item for items in lines for item in items
+                ])
+
+    def consignments(self):
+        movements = [
+            ConsignmentMovement(
+                supplier=supplier,
+                product_id=pk,
+                kind='recepcion',
+                quantity=stock + 10,
+                date=self.today - timedelta(days=HISTORY_DAYS),
+            )
+            for pk, supplier, stock in Product.objects.filter(
+                type='consignacion'
+            ).values_list('pk', 'supplier', 'stock')
+        ]
+        ConsignmentMovement.objects.bulk_create(movements, batch_size=self.batch_size)
+
+    def run(self):
+        self.products()
+        self.patients()
+        product_rows = (
+            Product.objects
+            .order_by('pk')
+            .values_list('pk', 'price')
+            .iterator(chunk_size=self.batch_size)
+        )
+        product_ids, prices = array('q'), array('q')
+        for pk, price in product_rows:
+            product_ids.append(pk)
+            prices.append(int(price * 100))
+        patient_ids = self._id_array(Patient.objects.all())
+        self.sales(patient_ids, product_ids, prices)
+        self.appointments(patient_ids)
+        self.purchases(product_ids, prices)
+        self.consignments()
+
+        self.log('Reconstruyendo resúmenes e índice de búsqueda')
+        rollups.rebuild()
+        patient_stats.rebuild()
+        search.rebuild()
+        _invalidate_caches()
+
+
+def generate(counts, seed=42, batch_size=SEED_BATCH_SIZE, log=lambda *args: None):
+    """Genera el conjunto de datos; la misma semilla da la misma distribución"""
+    _Seeder(counts, seed, batch_size, log).run()
@@ -0,0 +1,214 @@
+"""Serialización de listados de la API y de las exportaciones.
+
+Los listados leen solo las columnas que devuelven con ``values()`` en
+lugar de instanciar modelos, y cada campo se formatea con funciones
+preparadas una sola vez por serializador: las etiquetas de las opciones
+salen de un diccionario ya armado (sin ``get_*_display()`` por fila).
+Los mismos formateadores usan las exportaciones (api.exports).
+
+``dumps`` codifica con orjson si está instalado (y ``API_JSON_BACKEND``
+no es ``json``); si no, con el codificador estándar de Django. La
+salida es JSON equivalente, aunque orjson no escapa los caracteres no
+ASCII.
+"""
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Appointment, Patient, Product, Purchase, Sale
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Formateadores
+
+class _Labels(dict):
+    def __missing__(self, value):
+        return value
+
+
+def choice_label(choices):
+    """Etiqueta de cada opción; los valores desconocidos se devuelven tal cual"""
+    return _Labels(choices).__getitem__
+
+
+def as_float(value):
+    return float(value) if value is not None else 0.0
+
+
+def as_datetime(value):
+    return value.strftime('%Y-%m-%d %H:%M') if value else ''
+
+
+def as_optional_datetime(value):
+    return value.strftime('%Y-%m-%d %H:%M') if value else None
+
+
+def as_date(value):
+    return value.strftime('%Y-%m-%d') if value else None
+
+
+def as_time(value):
+    return value.strftime('%H:%M') if value else None
+
+
+def as_iso(value):
+    return value.isoformat() if value else None
+
+
+def or_empty(value):
+    return value or ''
+
+
+# Serializadores de filas
+
+class Field:
+    """Clave de salida, columna de ``values()`` (por defecto la misma) y formateador"""
+
+    def __init__(self, key, source=None, formatter=None):
+        self.key = key
+        self.source = source or key
+        self.formatter = formatter
+
+
+class Serializer:
+    def __init__(self, *fields):
+        self.fields = fields
+        self.sources = list(dict.fromkeys(field.source for field in fields))
+        self._plan = [(field.key, field.source, field.formatter) for field in fields]
+
+    def values(self, queryset, *extra):
+        """El queryset con solo las columnas necesarias (más ``extra``) como dicts"""
+        return queryset.values(*self.sources, *extra)
+
+    def serialize(self, rows):
+        plan = self._plan
+        return [
+            {
+                key: formatter(row[source]) if formatter else row[source]
+                for key, source, formatter in plan
+            }
+            for row in rows
+        ]
+
+
+def group_by(rows, key):
+    """Agrupa filas hijas (``values()``) por la columna ``key`` conservando el orden"""
+    groups = {}
+    for row in rows:
+        groups.setdefault(row[key], []).append(row)
+    return groups
+
+
+PRODUCT_LIST = Serializer(
+    Field('id'),
+    Field('code'),
+    Field('name'),
+    Field('category', formatter=choice_label(Product.CATEGORY_CHOICES)),
+    Field('supplier'),
+    Field('stock'),
+    Field('price', formatter=as_float),
+    Field('status', formatter=choice_label(Product.STATUS_CHOICES)),
+    Field('type', formatter=choice_label(Product.TYPE_CHOICES)),
+    Field('created_at', formatter=as_iso),
+)
+
+PATIENT_LIST = Serializer(
+    Field('id'),
+    Field('name'),
+    Field('email'),
+    Field('phone'),
+    Field('status', formatter=choice_label(Patient.STATUS_CHOICES)),
+    Field('address'),
+    Field('notes'),
+    Field('created_at', formatter=as_iso),
+)
+
+PATIENT_ANALYTICS = Serializer(
+    Field('id'),
+    Field('name'),
+    Field('email'),
+    Field('status', formatter=choice_label(Patient.STATUS_CHOICES)),
+    Field('sales', 'sale_count'),
+    Field('lifetime_spend', formatter=as_float),
+    Field('first_purchase', 'first_purchase_at', as_iso),
+    Field('last_purchase', 'last_purchase_at', as_iso),
+)
+
+RECENT_PURCHASE = Serializer(
+    Field('product', 'product__name'),
+    Field('quantity'),
+    Field('price', formatter=as_float),
+    Field('date', formatter=as_iso),
+)
+
+APPOINTMENT_LIST = Serializer(
+    Field('id'),
+    Field('patient', 'patient__name'),
+    Field('patient_id'),
+    Field('date', formatter=as_date),
+    Field('time', formatter=as_time),
+    Field('type', formatter=choice_label(Appointment.TYPE_CHOICES)),
+    Field('doctor'),
+    Field('status', formatter=choice_label(Appointment.STATUS_CHOICES)),
+)
+
+SALE_LIST = Serializer(
+    Field('id'),
+    Field('order_number'),
+    Field('customer', 'patient__name'),
+    Field('patient_id'),
+    Field('amount', 'total_amount', as_float),
+    Field('date', 'created_at', as_date),
+    Field('status', formatter=choice_label(Sale.STATUS_CHOICES)),
+)
+
+SALE_ITEM = Serializer(
+    Field('product', 'product__name'),
+    Field('product_id'),
+    Field('quantity'),
+    Field('unit_price', formatter=as_float),
+    Field('total_price', formatter=as_float),
+)
+
+PURCHASE_LIST = Serializer(
+    Field('id'),
+    Field('purchase_number'),
+    Field('supplier'),
+    Field('amount', 'total_amount', as_float),
+    Field('date', 'created_at', as_date),
+    Field('received_at', formatter=as_optional_datetime),
+    Field('items', 'item_count'),
+    Field('status', formatter=choice_label(Purchase.STATUS_CHOICES)),
+)
+
+
+# Codificación JSON
+
+_django_encoder = DjangoJSONEncoder()
+
+
+def _orjson_default(value):
+    # Fechas, Decimal y demás con el mismo formato que DjangoJSONEncoder
+    return _django_encoder.default(value)
+
+
+def fast_json_enabled():
+    return (
+        orjson is not None and getattr(settings, 'API_JSON_BACKEND', 'auto') != 'json'
+    )
+
+
+def dumps(data):
+    """``data`` como JSON en bytes"""
+    if fast_json_enabled():
+        return orjson.dumps(
+            data,
+            default=_orjson_default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+        )
+    return json.dumps(data, cls=DjangoJSONEncoder).encode('utf-8')
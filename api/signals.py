@@ -0,0 +1,119 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import consignments, patient_stats, response_cache, rollups, search
+from .models import (
+    Appointment,
+    ConsignmentMovement,
+    Patient,
+    PatientPurchaseHistory,
+    Product,
+    Purchase,
+    PurchaseItem,
+    Sale,
+    SaleItem,
+)
+
+# Modelos que leen las vistas cacheadas. Los resúmenes, reservas y fotos
+# no se listan a propósito: no tener receptores de borrado les permite
+# a Django borrarlos sin leer las filas antes.
+CACHED_MODELS = (
+    Appointment,
+    ConsignmentMovement,
+    Patient,
+    PatientPurchaseHistory,
+    Product,
+    Purchase,
+    PurchaseItem,
+    Sale,
+    SaleItem,
+)
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleting(sender, instance, **kwargs):
+    rollups.record_product_deleted(instance)
+    consignments.record_product_sales_changed(instance.pk)
+
+
+@receiver(pre_delete, sender=Sale)
+def sale_deleting(sender, instance, origin=None, **kwargs):
+    rollups.record_sale_deleted(instance, origin)
+    patient_stats.record_sale_deleting(instance, origin)
+    consignments.record_sales_changed([instance.pk])
+
+
+@receiver(pre_delete, sender=SaleItem)
+def sale_item_deleting(sender, instance, origin=None, **kwargs):
+    consignments.record_sale_item_deleting(instance, origin)
+
+
+# Las fotos de consignación se comparan con la fila guardada antes de escribirla
+
+@receiver(pre_save, sender=Product)
+def product_saving(sender, instance, raw=False, **kwargs):
+    if not raw and not instance._state.adding:
+        consignments.record_product_saving(instance)
+
+
+@receiver(pre_save, sender=Sale)
+def sale_saving(sender, instance, raw=False, **kwargs):
+    if not raw and not instance._state.adding:
+        consignments.record_sale_saving(instance)
+
+
+@receiver(pre_save, sender=SaleItem)
+def sale_item_saving(sender, instance, raw=False, **kwargs):
+    if not raw:
+        consignments.record_sale_item_saving(instance)
+
+
+@receiver(post_delete, sender=Sale)
+def sale_deleted(sender, instance, origin=None, **kwargs):
+    patient_stats.record_sale_deleted(instance, origin)
+
+
+@receiver(pre_delete, sender=Patient)
+def patient_deleting(sender, instance, **kwargs):
+    patient_stats.record_patient_deleted(instance)
+
+
+@receiver(post_delete, sender=SaleItem)
+def sale_item_deleted(sender, instance, origin=None, **kwargs):
+    rollups.record_sale_item_deleted(instance, origin)
+
+
+@receiver(post_delete, sender=SaleItem)
+@receiver(post_delete, sender=PurchaseItem)
+def order_item_deleted(sender, instance, origin=None, **kwargs):
+    instance.order_total_deleted(origin)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Patient)
+def searchable_saved(sender, instance, raw=False, using=None, **kwargs):
+    if not raw:
+        search.index_instances([instance], using)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Patient)
+def searchable_deleted(sender, instance, using=None, **kwargs):
+    search.remove_instance(instance, using)
+
+
+def cached_model_changed(sender, **kwargs):
+    response_cache.invalidate(sender)
+
+
+for model in CACHED_MODELS:
+    post_save.connect(
+        cached_model_changed,
+        sender=model,
+        dispatch_uid=f'response_cache_save_{model.__name__}',
+    )
+    post_delete.connect(
+        cached_model_changed,
+        sender=model,
+        dispatch_uid=f'response_cache_delete_{model.__name__}',
+    )
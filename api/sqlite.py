@@ -0,0 +1,50 @@
+"""Perfiles de configuración de SQLite.
+
+Los PRAGMA de rendimiento no se guardan en el archivo (salvo el modo de
+journal), así que se aplican al abrir cada conexión con la señal
+``connection_created``. ``SQLITE_PROFILE`` elige el perfil:
+
+- ``production``: WAL (los lectores no bloquean al escritor ni al
+  revés), ``synchronous=NORMAL`` (con WAL no se pierde consistencia,
+  solo las últimas transacciones ante un corte de energía), mmap y
+  caché de páginas más grandes y ``busy_timeout`` para esperar el
+  bloqueo de escritura en vez de fallar enseguida.
+- ``default``: journal de rollback, el comportamiento de SQLite sin
+  configurar (deshace el WAL si el archivo lo tenía).
+
+``SQLITE_PRAGMAS`` en settings agrega o reemplaza valores del perfil.
+"""
+from django.conf import settings
+
+PROFILES = {
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 10000,
+        'cache_size': -64000,  # en KiB: 64 MB por conexión
+        'mmap_size': 268435456,  # 256 MB
+        'temp_store': 'MEMORY',
+    },
+    'default': {
+        'journal_mode': 'DELETE',
+    },
+}
+DEFAULT_PROFILE = 'production'
+
+
+def pragmas():
+    profile = getattr(settings, 'SQLITE_PROFILE', DEFAULT_PROFILE)
+    if profile not in PROFILES:
+        raise ValueError(
+            f'Perfil de SQLite desconocido "{profile}", use {", ".join(PROFILES)}'
+        )
+    return {**PROFILES[profile], **getattr(settings, 'SQLITE_PRAGMAS', {})}
+
+
+def configure_connection(sender, connection, **kwargs):  # noqa: ARG001 (firma de connection_created)
+    """Aplica los PRAGMA del perfil a cada conexión nueva de SQLite"""
+    if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas().items():
+            cursor.execute(f'PRAGMA {name} = {value}')
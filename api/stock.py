@@ -0,0 +1,232 @@
+"""Motor de stock: movimientos atómicos y reservas.
+
+Los cambios se aplican con un único UPDATE por lote de productos
+(``stock = stock + CASE id ...``) y el estado se recalcula en la misma
+sentencia, así no hay lecturas previas que se puedan pisar entre
+ventas concurrentes. Las salidas llevan la condición
+``stock - reserved + delta >= 0`` en el WHERE: si alguna fila no la
+cumple se liberan las reservas vencidas de esos productos y se
+reintenta; si sigue sin cumplirse se revierte el lote completo y se
+lanza InsufficientStock. Los ids se procesan ordenados para que dos
+transacciones bloqueen las filas en el mismo orden.
+
+Las reservas apartan unidades (``Product.reserved``) para una orden en
+curso durante un tiempo limitado; al confirmarlas se descuentan del
+stock sin volver a comprobar disponibilidad.
+"""
+import uuid
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+
+from . import response_cache, rollups
+from .models import Product, StockReservation
+
+STOCK_BATCH_SIZE = 200
+RESERVATION_TTL = timedelta(minutes=10)
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids):
+        self.product_ids = sorted(product_ids)
+        super().__init__(f'Stock insuficiente para los productos: {self.product_ids}')
+
+
+class ReservationNotFound(Exception):
+    def __init__(self, token):
+        super().__init__(f'Reserva inexistente o expirada: {token}')
+
+
+def _delta_expression(deltas):
+    return Case(
+        *[When(pk=pk, then=Value(delta)) for pk, delta in deltas],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _batches(deltas):
+    deltas = sorted((pk, delta) for pk, delta in deltas.items() if delta)
+    for start in range(0, len(deltas), STOCK_BATCH_SIZE):
+        yield deltas[start:start + STOCK_BATCH_SIZE]
+
+
+def _short_products(batch):
+    """Productos del lote que no tienen unidades disponibles suficientes"""
+    needed = dict(batch)
+    rows = Product.objects.filter(pk__in=list(needed)).values_list(
+        'id', 'stock', 'reserved'
+    )
+    found = {pk: stock - reserved for pk, stock, reserved in rows}
+    return [
+        pk for pk, delta in needed.items() if pk not in found or found[pk] + delta < 0
+    ]
+
+
+def _after_stock_change(deltas):
+    rollups.record_stock_deltas(deltas)
+    response_cache.invalidate(Product)
+
+
+class _ShortBatch(Exception):
+    pass
+
+
+def _update_batch(batch):
+    """Aplica el lote en un savepoint; devuelve False, sin cambios, si falta stock"""
+    delta = _delta_expression(batch)
+    new_stock = F('stock') + delta
+    products = Product.objects.filter(pk__in=[pk for pk, _ in batch])
+    if any(value < 0 for _, value in batch):
+        products = products.filter(
+            GreaterThanOrEqual(F('stock') - F('reserved') + delta, 0)
+        )
+    try:
+        with transaction.atomic():
+            count = products.update(
+                stock=new_stock,
+                status=Product.status_expression(new_stock),
+                updated_at=timezone.now(),
+            )
+            if count != len(batch):
+                raise _ShortBatch
+    except _ShortBatch:
+        return False
+    return True
+
+
+def apply_stock_deltas(deltas):
+    """Suma a cada producto su delta (``{product_id: delta}``) y recalcula su estado
+
+    Las salidas (deltas negativos) solo se aplican si hay unidades
+    disponibles; si falta stock en algún producto no se aplica ninguna y
+    se lanza InsufficientStock. Antes de rendirse se liberan las reservas
+    vencidas de los productos del lote y se reintenta, así una reserva
+    expirada no bloquea ventas. Devuelve el número de productos
+    actualizados.
+    """
+    applied = {pk: delta for pk, delta in deltas.items() if delta}
+    updated = 0
+    with transaction.atomic():
+        for batch in _batches(applied):
+            applied_now = _update_batch(batch) or (
+                release_expired([pk for pk, _ in batch]) and _update_batch(batch)
+            )
+            if not applied_now:
+                raise InsufficientStock(_short_products(batch))
+            updated += len(batch)
+        if updated:
+            _after_stock_change(applied)
+    return updated
+
+
+def _adjust_reserved(quantities, check_available):
+    for batch in _batches(quantities):
+        delta = _delta_expression(batch)
+        products = Product.objects.filter(pk__in=[pk for pk, _ in batch])
+        if check_available:
+            products = products.filter(
+                GreaterThanOrEqual(F('stock') - F('reserved') - delta, 0)
+            )
+        count = products.update(reserved=F('reserved') + delta)
+        if count != len(batch):
+            raise InsufficientStock(
+                _short_products([(pk, -value) for pk, value in batch])
+            )
+
+
+def reserve(quantities, ttl=RESERVATION_TTL):
+    """Aparta ``{product_id: cantidad}`` y devuelve el token de la reserva"""
+    token = uuid.uuid4()
+    expires_at = timezone.now() + ttl
+    with transaction.atomic():
+        release_expired()
+        _adjust_reserved(quantities, check_available=True)
+        StockReservation.objects.bulk_create([
+            StockReservation(
+                token=token, product_id=pk, quantity=quantity, expires_at=expires_at
+            )
+            for pk, quantity in sorted(quantities.items())
+            if quantity
+        ])
+    return token
+
+
+def _claim(reservations):
+    """Toma las filas de reserva antes de leerlas
+
+    El UPDATE sin efecto adquiere el bloqueo de escritura en SQLite (evita
+    promover un bloqueo de lectura dentro de la transacción) y bloquea
+    las filas en PostgreSQL, como un SELECT ... FOR UPDATE.
+    """
+    reservations.update(quantity=F('quantity'))
+    rows = list(reservations.values_list('id', 'product_id', 'quantity'))
+    StockReservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+    quantities = {}
+    for _, product_id, quantity in rows:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+
+def reserved_quantities(token):
+    """Cantidades por producto de una reserva activa (solo lectura)"""
+    rows = (
+        StockReservation.objects
+        .filter(token=token, expires_at__gt=timezone.now())
+        .values('product_id')
+        .annotate(total=Sum('quantity'))
+        .order_by()
+    )
+    return {row['product_id']: row['total'] for row in rows}
+
+
+def commit_reservation(token):
+    """Convierte la reserva en salida de stock; devuelve las cantidades descontadas"""
+    with transaction.atomic():
+        quantities = _claim(
+            StockReservation.objects.filter(token=token, expires_at__gt=timezone.now())
+        )
+        if not quantities:
+            raise ReservationNotFound(token)
+        for batch in _batches(quantities):
+            delta = _delta_expression(batch)
+            new_stock = F('stock') - delta
+            Product.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+                stock=new_stock,
+                reserved=F('reserved') - delta,
+                status=Product.status_expression(new_stock),
+                updated_at=timezone.now(),
+            )
+        _after_stock_change({pk: -quantity for pk, quantity in quantities.items()})
+    return quantities
+
+
+def release(token):
+    """Libera una reserva sin descontar stock; devuelve si existía"""
+    with transaction.atomic():
+        quantities = _claim(StockReservation.objects.filter(token=token))
+        _adjust_reserved(
+            {pk: -quantity for pk, quantity in quantities.items()},
+            check_available=False,
+        )
+    return bool(quantities)
+
+
+def release_expired(product_ids=None):
+    """Libera las reservas vencidas (de ``product_ids``, o todas)
+
+    Devuelve cuántos productos se liberaron.
+    """
+    expired = StockReservation.objects.filter(expires_at__lte=timezone.now())
+    if product_ids is not None:
+        expired = expired.filter(product_id__in=product_ids)
+    with transaction.atomic():
+        quantities = _claim(expired)
+        _adjust_reserved(
+            {pk: -quantity for pk, quantity in quantities.items()},
+            check_available=False,
+        )
+    return len(quantities)
@@ -0,0 +1,55 @@
+"""Datos mínimos para las pruebas"""
+import itertools
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from api import sales
+from api.models import Appointment, Patient, Product
+
+_numbers = itertools.count(1)
+
+
+def product(**fields):
+    number = next(_numbers)
+    return Product.objects.create(**{
+        'name': f'Producto {number}',
+        'category': 'armazones',
+        'supplier': 'Proveedor',
+        'stock': 10,
+        'price': Decimal('100.00'),
+        **fields,
+    })
+
+
+def patient(**fields):
+    number = next(_numbers)
+    return Patient.objects.create(**{
+        'name': f'Paciente {number}',
+        'email': f'paciente{number}@example.com',
+        'phone': '555-0000',
+        **fields,
+    })
+
+
+def appointment(patient, days=0, **fields):
+    number = next(_numbers)
+    return Appointment.objects.create(**{
+        'patient': patient,
+        'date': timezone.localdate() + timedelta(days=days),
+        'time': time(8 + number // 60 % 10, number % 60),
+        'type': 'control',
+        **fields,
+    })
+
+
+def sale(patient, *lines, **fields):
+    """Venta por la API de ventas; ``lines`` son pares ``(producto, cantidad)``"""
+    return sales.create_sales({
+        'patient': patient.pk,
+        'items': [
+            {'product': item.pk, 'quantity': quantity} for item, quantity in lines
+        ],
+        **fields,
+    })[0]
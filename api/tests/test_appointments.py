@@ -0,0 +1,129 @@
+import json
+from datetime import date
+
+from django.test import TestCase, override_settings
+
+from api import scheduling
+from api.models import Appointment
+
+from . import factories
+
+# Lunes
+MONDAY = date(2030, 1, 7)
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class BookingTests(TestCase):
+    def setUp(self):
+        self.patient = factories.patient()
+
+    def _book(self, **fields):
+        payload = {
+            'patient': self.patient.pk,
+            'date': MONDAY.isoformat(),
+            'time': '10:00',
+            **fields,
+        }
+        return self.client.post(
+            '/api/appointments/', json.dumps(payload), content_type='application/json'
+        )
+
+    def test_books_a_free_slot(self):
+        response = self._book(doctor='Dra. Ruiz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['appointment']['time'], '10:00')
+        self.assertTrue(
+            Appointment.objects.filter(doctor='Dra. Ruiz', date=MONDAY).exists()
+        )
+
+    def test_taken_slot_is_a_409(self):
+        self.assertEqual(self._book().status_code, 200)
+        response = self._book()
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(response.json()['success'])
+        self.assertEqual(self._book(doctor='Dra. Ruiz').status_code, 200)
+
+    def test_cancelled_appointment_frees_the_slot(self):
+        self._book()
+        Appointment.objects.update(status='cancelada')
+        self.assertEqual(self._book().status_code, 200)
+
+    def test_invalid_requests_are_a_400(self):
+        cases = [
+            {'date': '2030-01-06'},
+            {'time': '10:15'},
+            {'time': '18:00'},
+            {'date': '07/01/2030'},
+            {'type': 'cirugia'},
+            {'status': 'cancelada'},
+            {'patient': 0},
+        ]
+        for fields in cases:
+            with self.subTest(fields=fields):
+                self.assertEqual(self._book(**fields).status_code, 400)
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_missing_or_malformed_patient_is_a_schedule_error(self):
+        base = {'date': MONDAY.isoformat(), 'time': '10:00'}
+        for patient in (None, 'abc', [1]):
+            payload = base if patient is None else {**base, 'patient': patient}
+            with (
+                self.subTest(patient=patient),
+                self.assertRaisesMessage(scheduling.ScheduleError, 'Paciente inválido'),
+            ):
+                scheduling.book(payload)
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        patient = factories.patient()
+        factories.appointment(patient, date=MONDAY, time=scheduling.DAY_START)
+        factories.appointment(
+            patient, date=MONDAY, time=scheduling.slot_times()[1], doctor='Dra. Ruiz'
+        )
+        factories.appointment(
+            patient, date=MONDAY, time=scheduling.slot_times()[2], status='cancelada'
+        )
+
+    def test_booked_slots_and_closed_days_are_left_out(self):
+        with self.assertNumQueries(1):
+            result = scheduling.availability(MONDAY, date(2030, 1, 13))
+        self.assertEqual(set(result), {scheduling.DEFAULT_DOCTOR, 'Dra. Ruiz'})
+        days = result[scheduling.DEFAULT_DOCTOR]
+        self.assertEqual(len(days), 6)
+        self.assertNotIn('2030-01-13', days)
+        self.assertEqual(days['2030-01-07'][:2], ['09:30', '10:00'])
+        self.assertEqual(len(days['2030-01-08']), len(scheduling.SLOTS))
+        self.assertEqual(result['Dra. Ruiz']['2030-01-07'][:2], ['09:00', '10:00'])
+
+    def test_view_filters_by_doctor(self):
+        response = self.client.get('/api/appointments/availability/', {
+            'start': '2030-01-07', 'end': '2030-01-07', 'doctor': 'Dra. Ruiz',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()['availability']), ['Dra. Ruiz'])
+
+    def test_invalid_ranges_are_a_400(self):
+        for params in (
+            {'start': 'mañana'},
+            {'start': '2030-01-07', 'end': '2030-01-01'},
+            {'start': '2030-01-01', 'end': '2030-03-01'},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(
+                    self.client.get(
+                        '/api/appointments/availability/', params
+                    ).status_code,
+                    400,
+                )
+                self.assertEqual(
+                    self.client.get('/api/appointments/', params).status_code, 400
+                )
+
+    def test_calendar_lists_the_range(self):
+        response = self.client.get(
+            '/api/appointments/',
+            {'start': '2030-01-07', 'end': '2030-01-07', 'status': 'pendiente'},
+        )
+        self.assertEqual(len(response.json()['appointments']), 2)
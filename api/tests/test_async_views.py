@@ -0,0 +1,81 @@
+import json
+
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+
+from api import async_views, views
+from api.models import Product
+
+from . import factories
+
+
+def content(response):
+    return json.loads(response.content)
+
+
+def create_data():
+    products = [
+        factories.product(category=category)
+        for category in ('armazones', 'lentes', 'lentes', 'accesorios')
+    ]
+    for number, product in enumerate(products):
+        patient = factories.patient()
+        factories.sale(patient, (product, 1), (products[0], 2))
+        factories.appointment(patient, days=number)
+
+
+class ParityMixin:
+    def _assert_same(self, name, params=None):
+        request = RequestFactory().get('/api/', params or {})
+        expected = getattr(views, name)(request)
+        response = async_to_sync(getattr(async_views, name))(request)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(content(response), content(expected))
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class AsyncViewParityTests(ParityMixin, TestCase):
+    """Las vistas asíncronas responden lo mismo que las síncronas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_data()
+
+    def test_get_responses_match(self):
+        cases = [
+            ('products_view', {'page_size': 3}),
+            ('products_view', {'category': 'lentes', 'page': 2, 'page_size': 1}),
+            ('products_view', {'cursor': '', 'page_size': 2, 'include_total': '1'}),
+            ('patients_view', {'page_size': 2}),
+            ('patients_view', {'cursor': '', 'page_size': 3}),
+            ('appointments_view', None),
+            ('appointments_view', {'start': 'ayer'}),
+            ('sales_view', {'page_size': 2}),
+        ]
+        for name, params in cases:
+            with self.subTest(view=name, params=params):
+                self._assert_same(name, params)
+
+    def test_post_goes_through_the_sync_view(self):
+        body = {
+            'name': 'Estuche',
+            'category': 'accesorios',
+            'supplier': 'Genérico',
+            'stock': 3,
+            'price': 5,
+        }
+        request = RequestFactory().post(
+            '/api/products/', json.dumps(body), content_type='application/json'
+        )
+        response = async_to_sync(async_views.products_view)(request)
+        self.assertTrue(content(response)['success'])
+        self.assertTrue(Product.objects.filter(name='Estuche').exists())
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class AsyncDashboardParityTests(ParityMixin, TransactionTestCase):
+    """El dashboard asíncrono usa otras conexiones: los datos deben estar confirmados"""
+
+    def test_dashboard_matches(self):
+        create_data()
+        self._assert_same('dashboard_view')
@@ -0,0 +1,130 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from api import benchmarks, rollups, seed
+from api.models import Appointment, CategoryStockRollup, Patient, Product, Sale
+
+
+def small_counts():
+    return seed.SeedCounts(products=60, patients=20, sales=40, appointments=30)
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class SeedTests(TestCase):
+    def test_generates_the_requested_counts(self):
+        seed.generate(small_counts(), batch_size=7)
+        self.assertEqual(benchmarks.dataset()['products'], 60)
+        self.assertEqual(
+            (
+                Patient.objects.count(),
+                Sale.objects.count(),
+                Appointment.objects.count(),
+            ),
+            (20, 40, 30),
+        )
+        stored = list(
+            CategoryStockRollup.objects.order_by('category').values_list(
+                'category', 'total_stock'
+            )
+        )
+        rollups.rebuild()
+        self.assertEqual(
+            list(
+                CategoryStockRollup.objects.order_by('category').values_list(
+                    'category', 'total_stock'
+                )
+            ),
+            stored,
+        )
+
+    def test_same_seed_same_data(self):
+        def snapshot():
+            return list(
+                Product.objects.order_by('pk').values_list(
+                    'name', 'category', 'stock', 'price'
+                )
+            )
+
+        seed.generate(small_counts(), seed=7)
+        first = snapshot()
+        seed.flush()
+        seed.generate(small_counts(), seed=7)
+        self.assertEqual(snapshot(), first)
+
+    def test_command_validates_counts(self):
+        for options in (
+            {'products': -1},
+            {'patients': 0},
+            {'products': 0, 'patients': 5},
+        ):
+            with self.subTest(options=options), self.assertRaises(CommandError):
+                call_command('seed_data', stdout=StringIO(), **options)
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed.generate(small_counts())
+
+    def test_every_scenario_runs_and_writes_are_rolled_back(self):
+        before = benchmarks.dataset()
+        report = benchmarks.run(repeat=1)
+        self.assertEqual(
+            set(report['results']), {scenario.name for scenario in benchmarks.SCENARIOS}
+        )
+        self.assertEqual(report['dataset'], before)
+        self.assertEqual(benchmarks.dataset(), before)
+
+    def test_filtered_scenario_filters(self):
+        scenario = next(
+            scenario
+            for scenario in benchmarks.SCENARIOS
+            if scenario.name == 'products_filtered'
+        )
+        products = self.client.get(scenario.path, scenario.params).json()['products']
+        expected = Product.objects.filter(category='armazones', type='propio').count()
+        self.assertEqual(len(products), min(expected, scenario.params['page_size']))
+        self.assertLess(expected, Product.objects.count())
+        self.assertEqual(
+            {(product['category'], product['type']) for product in products},
+            {('Armazones', 'Propio')},
+        )
+
+    def test_patient_export_comparison(self):
+        report = benchmarks.patient_export_comparison(repeat=1)
+        patients = Patient.objects.count()
+        self.assertEqual(report['patients'], patients)
+        self.assertEqual(report['results']['annotated']['queries'], 1)
+        self.assertEqual(
+            report['results']['per_patient_count']['queries'], patients + 1
+        )
+        out = StringIO()
+        call_command('benchmark', patient_export=True, repeat=1, stdout=out)
+        self.assertIn(f'{patients} pacientes', out.getvalue())
+
+    def test_unknown_scenario(self):
+        with self.assertRaises(benchmarks.BenchmarkError):
+            benchmarks.run(['no_existe'], repeat=1)
+        with self.assertRaises(CommandError):
+            call_command('benchmark', 'no_existe', stdout=StringIO())
+
+    def test_compare_flags_slower_medians_and_extra_queries(self):
+        baseline = {'results': {
+            'lento': {'median_ms': 20.0, 'queries': 3},
+            'ruido': {'median_ms': 2.0, 'queries': 3},
+            'consultas': {'median_ms': 20.0, 'queries': 3},
+        }}
+        report = {'results': {
+            'lento': {'median_ms': 40.0, 'queries': 3},
+            'ruido': {'median_ms': 4.0, 'queries': 3},
+            'consultas': {'median_ms': 20.0, 'queries': 4},
+            'nuevo': {'median_ms': 99.0, 'queries': 9},
+        }}
+        regressions = benchmarks.compare(report, baseline)
+        self.assertEqual(
+            [regression.split(':')[0] for regression in regressions],
+            ['lento', 'consultas'],
+        )
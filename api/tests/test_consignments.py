@@ -0,0 +1,224 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from api import consignments
+from api.models import ConsignmentMovement, ConsignmentSnapshot, Product, Sale, SaleItem
+
+from . import factories
+from .threads import run_concurrently
+
+
+def consigned(**fields):
+    return factories.product(
+        type='consignacion', supplier='Marcas SA', stock=0, **fields
+    )
+
+
+def backdate(sale, days):
+    Sale.objects.filter(pk=sale.pk).update(
+        created_at=timezone.now() - timedelta(days=days)
+    )
+    sale.refresh_from_db()
+    return sale
+
+
+class SnapshotInvalidationTests(TestCase):
+    """Las fotos se borran cuando cambia algo que ya contaban"""
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.product = consigned()
+        consignments.record_movement({
+            'product': self.product.pk,
+            'quantity': 10,
+            'date': str(self.today - timedelta(days=10)),
+        })
+        self.patient = factories.patient()
+        self.sale = backdate(factories.sale(self.patient, (self.product, 3)), days=5)
+        self.snapshot_date = self.today - timedelta(days=2)
+        consignments.take_snapshot(self.snapshot_date)
+
+    def assertMatchesScan(self):
+        """Los acumulados (con o sin foto) coinciden con un recorrido completo"""
+        for until in (self.snapshot_date, self.today):
+            expected = {}
+            consignments._scan(expected, None, until)
+            expected = {
+                key: values for key, values in expected.items() if any(values.values())
+            }
+            actual = {
+                key: values
+                for key, values in consignments.totals_as_of(until).items()
+                if any(values.values())
+            }
+            self.assertEqual(actual, expected)
+
+    def assertInvalidated(self):
+        self.assertFalse(ConsignmentSnapshot.objects.filter(as_of__gte=self.snapshot_date).exists())
+        self.assertMatchesScan()
+
+    def test_unrelated_changes_keep_snapshot(self):
+        self.sale.notes = 'Entregar el lunes'
+        self.sale.save()
+        self.sale.status = 'entregado'
+        self.sale.save()
+        self.product.name = 'Otro nombre'
+        self.product.save()
+        self.assertTrue(ConsignmentSnapshot.objects.filter(as_of=self.snapshot_date).exists())
+        self.assertMatchesScan()
+
+    def test_cancelled_sale(self):
+        self.sale.status = 'cancelado'
+        self.sale.save()
+        self.assertInvalidated()
+
+    def test_reactivated_sale(self):
+        Sale.objects.filter(pk=self.sale.pk).update(status='cancelado')
+        consignments.take_snapshot(self.snapshot_date)
+        self.sale.refresh_from_db()
+        self.sale.status = 'nuevo'
+        self.sale.save()
+        self.assertInvalidated()
+
+    def test_deleted_sale(self):
+        self.sale.delete()
+        self.assertInvalidated()
+
+    def test_edited_item(self):
+        item = self.sale.items.get()
+        item.quantity = 1
+        item.save()
+        self.assertInvalidated()
+
+    def test_deleted_item(self):
+        self.sale.items.get().delete()
+        self.assertInvalidated()
+
+    def test_item_added_to_past_sale(self):
+        SaleItem(
+            sale=self.sale,
+            product=self.product,
+            quantity=1,
+            unit_price=self.product.price,
+        ).save()
+        self.assertInvalidated()
+
+    def test_supplier_change(self):
+        self.product.supplier = 'Ópticas Unidas'
+        self.product.save()
+        self.assertInvalidated()
+
+    def test_type_change(self):
+        self.product.type = 'propio'
+        self.product.save()
+        self.assertInvalidated()
+
+    def test_deleted_product(self):
+        Product.objects.get(pk=self.product.pk).delete()
+        self.assertFalse(ConsignmentSnapshot.objects.exists())
+
+
+class MovementTests(TestCase):
+    def setUp(self):
+        self.product = consigned()
+
+    def test_rejects_other_supplier(self):
+        with self.assertRaises(consignments.ConsignmentError):
+            consignments.record_movement({
+                'product': self.product.pk,
+                'quantity': 5,
+                'supplier': 'Otro proveedor',
+            })
+        self.assertFalse(ConsignmentMovement.objects.exists())
+        movement = consignments.record_movement({
+            'product': self.product.pk,
+            'quantity': 5,
+            'supplier': 'Marcas SA',
+        })
+        self.assertEqual(movement.supplier, 'Marcas SA')
+
+    def test_rejects_own_products(self):
+        own = factories.product()
+        response = self.client.post(
+            '/api/consignments/',
+            {'product': own.pk, 'quantity': 1},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_return_limited_to_balance(self):
+        consignments.record_movement({'product': self.product.pk, 'quantity': 5})
+        factories.sale(factories.patient(), (self.product, 2))
+        with self.assertRaises(consignments.ConsignmentError):
+            consignments.record_movement({
+                'product': self.product.pk,
+                'quantity': 4,
+                'kind': 'devolucion',
+            })
+        consignments.record_movement({
+            'product': self.product.pk,
+            'quantity': 3,
+            'kind': 'devolucion',
+        })
+        self.assertEqual(
+            Product.objects.values_list('stock', flat=True).get(pk=self.product.pk), 0
+        )
+
+
+class ConcurrentReturnTests(TransactionTestCase):
+    def test_only_one_return_of_the_whole_balance(self):
+        product = consigned()
+        consignments.record_movement({'product': product.pk, 'quantity': 5})
+
+        results = run_concurrently(
+            lambda: consignments.record_movement({
+                'product': product.pk,
+                'quantity': 5,
+                'kind': 'devolucion',
+            }),
+            8,
+        )
+
+        self.assertEqual(
+            sum(isinstance(result, ConsignmentMovement) for result in results), 1
+        )
+        self.assertTrue(
+            all(
+                isinstance(result, (ConsignmentMovement, consignments.ConsignmentError))
+                for result in results
+            ),
+            results,
+        )
+        self.assertEqual(
+            ConsignmentMovement.objects.filter(kind='devolucion').count(), 1
+        )
+
+
+class SnapshotCommandTests(TestCase):
+    def test_only_closed_days(self):
+        today = timezone.localdate()
+        for as_of in (today, today + timedelta(days=1)):
+            with self.assertRaises(CommandError):
+                call_command(
+                    'snapshot_consignments', date=str(as_of), stdout=StringIO()
+                )
+        self.assertFalse(ConsignmentSnapshot.objects.exists())
+
+        product = consigned()
+        consignments.record_movement({
+            'product': product.pk,
+            'quantity': 1,
+            'date': str(today - timedelta(days=3)),
+        })
+        call_command(
+            'snapshot_consignments',
+            date=str(today - timedelta(days=1)),
+            stdout=StringIO(),
+        )
+        self.assertTrue(
+            ConsignmentSnapshot.objects.filter(as_of=today - timedelta(days=1)).exists()
+        )
@@ -0,0 +1,53 @@
+from django.test import TestCase, override_settings
+
+from api import dashboard
+
+from . import factories
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class DashboardQueryCountTests(TestCase):
+    def _populate(self, categories):
+        for category in categories:
+            item = factories.product(category=category, stock=3)
+            customer = factories.patient()
+            factories.sale(customer, (item, 1))
+            factories.appointment(customer)
+
+    def test_build_uses_four_queries(self):
+        self._populate(['armazones'])
+        with self.assertNumQueries(4):
+            dashboard.build(dashboard.today())
+
+    def test_query_count_does_not_grow_with_data(self):
+        self._populate(['armazones', 'lentes', 'lentes_contacto', 'accesorios'] * 3)
+        with self.assertNumQueries(4):
+            self.client.get('/api/dashboard/')
+
+    def test_totals(self):
+        self._populate(['armazones', 'armazones', 'lentes'])
+        data = dashboard.build(dashboard.today())
+        self.assertEqual(data['stats']['totalProducts'], 3)
+        self.assertEqual(data['stats']['totalPatients'], 3)
+        self.assertEqual(data['stats']['activeSales'], 3)
+        self.assertEqual(data['stats']['pendingAppointments'], 3)
+        self.assertEqual(data['appointments'], 3)
+        self.assertEqual(data['inventory'], 6)
+        self.assertEqual(data['dailySales'], 300.0)
+        self.assertEqual(
+            [(row['category'], row['quantity']) for row in data['salesByCategory']],
+            [('Armazones', 2), ('Lentes', 1)],
+        )
+
+    def test_empty_database(self):
+        data = dashboard.build(dashboard.today())
+        self.assertEqual(
+            data['stats'],
+            {
+                'totalProducts': 0,
+                'totalPatients': 0,
+                'pendingAppointments': 0,
+                'activeSales': 0,
+            },
+        )
+        self.assertEqual(data['salesByCategory'], [])
@@ -0,0 +1,106 @@
+import csv
+import io
+from unittest import mock
+
+import openpyxl
+import xlrd
+from django.http import StreamingHttpResponse
+from django.test import TestCase, override_settings
+
+from api import exports
+from api.models import PatientPurchaseHistory
+
+from . import factories
+
+
+def content(response):
+    if isinstance(response, StreamingHttpResponse):
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class ProductExportTests(TestCase):
+    def setUp(self):
+        self.products = [
+            factories.product(name=f'Armazón {n}', stock=n) for n in range(1, 4)
+        ]
+
+    def test_csv_is_streamed(self):
+        response = self.client.get('/api/products/export/?format=csv')
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(
+            response['Content-Disposition'], 'attachment; filename="productos.csv"'
+        )
+        rows = list(csv.reader(io.StringIO(content(response).decode('utf-8-sig'))))
+        self.assertEqual(rows[0][:3], ['Código', 'Nombre', 'Categoría'])
+        self.assertEqual(
+            sorted(row[1] for row in rows[1:]), ['Armazón 1', 'Armazón 2', 'Armazón 3']
+        )
+        self.assertEqual({row[2] for row in rows[1:]}, {'Armazones'})
+
+    def test_xlsx_is_streamed_and_readable(self):
+        response = self.client.get('/api/products/export/?format=xlsx')
+        self.assertIsInstance(response, StreamingHttpResponse)
+        sheet = openpyxl.load_workbook(io.BytesIO(content(response))).active
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(sheet.title, 'Productos')
+        self.assertEqual(rows[0][:2], ('Código', 'Nombre'))
+        self.assertEqual(sorted(row[4] for row in rows[1:]), [1, 2, 3])
+
+    def test_xls_is_the_default_for_small_exports(self):
+        response = self.client.get('/api/products/export/')
+        self.assertEqual(
+            response['Content-Disposition'], 'attachment; filename="productos.xls"'
+        )
+        sheet = xlrd.open_workbook(file_contents=content(response)).sheet_by_index(0)
+        self.assertEqual(sheet.nrows, 4)
+
+    def test_rows_overflow_into_new_sheets(self):
+        with mock.patch.object(exports, 'XLSX_MAX_ROWS', 3):
+            response = self.client.get('/api/products/export/?format=xlsx')
+            workbook = openpyxl.load_workbook(io.BytesIO(content(response)))
+        self.assertEqual(workbook.sheetnames, ['Productos', 'Productos 2'])
+        self.assertEqual(
+            [workbook[name].max_row for name in workbook.sheetnames], [3, 2]
+        )
+
+    def test_empty_export_keeps_the_header(self):
+        for product in self.products:
+            product.delete()
+        response = self.client.get('/api/products/export/?format=xlsx')
+        rows = list(
+            openpyxl.load_workbook(io.BytesIO(content(response))).active.iter_rows(
+                values_only=True
+            )
+        )
+        self.assertEqual(len(rows), 1)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        for n in range(20):
+            factories.product(name=f'Extra {n}')
+        with self.assertNumQueries(1):
+            content(self.client.get('/api/products/export/?format=csv'))
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class PatientExportTests(TestCase):
+    def test_purchase_totals_are_annotated(self):
+        product = factories.product()
+        buyer = factories.patient(name='Ana')
+        factories.patient(name='Beto')
+        for quantity, price in ((2, '10.50'), (1, '4.00')):
+            PatientPurchaseHistory.objects.create(
+                patient=buyer, product=product, quantity=quantity, price=price
+            )
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/patients/export/?format=csv')
+            rows = list(
+                csv.DictReader(io.StringIO(content(response).decode('utf-8-sig')))
+            )
+
+        totals = {
+            row['Nombre']: (row['Total Compras'], row['Total Gastado']) for row in rows
+        }
+        self.assertEqual(totals, {'Ana': ('2', '25.0'), 'Beto': ('0', '0.0')})
@@ -0,0 +1,56 @@
+from django.test import TestCase, override_settings
+
+from api import facets, response_cache
+from api.models import Product
+
+from . import factories
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class ProductFacetsTests(TestCase):
+    def setUp(self):
+        # Versión nueva: las facetas de otras pruebas quedan fuera de alcance
+        with self.captureOnCommitCallbacks(execute=True):
+            response_cache.invalidate(Product)
+        factories.product(supplier='Essilor', category='lentes')
+        factories.product(supplier='Zeiss', category='lentes')
+
+    def test_counts_and_suppliers(self):
+        data = facets.product_facets()
+        self.assertEqual(data['suppliers'], ['Essilor', 'Zeiss'])
+        self.assertEqual(data['counts']['categories']['lentes'], 2)
+        self.assertEqual(data['counts']['categories']['armazones'], 0)
+
+    def test_second_read_is_served_from_cache(self):
+        facets.product_facets()
+        with self.assertNumQueries(0):
+            facets.product_facets()
+
+    def test_saving_or_deleting_a_product_invalidates_after_commit(self):
+        facets.product_facets()
+        with self.captureOnCommitCallbacks(execute=True):
+            product = factories.product(supplier='Hoya', category='armazones')
+        self.assertEqual(
+            facets.product_facets()['suppliers'], ['Essilor', 'Hoya', 'Zeiss']
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(
+            facets.product_facets()['counts']['categories']['armazones'], 0
+        )
+
+    def test_endpoint(self):
+        response = self.client.get('/api/products/facets/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['filters']['suppliers'], ['Essilor', 'Zeiss'])
+
+    def test_writes_from_another_process_are_seen(self):
+        facets.product_facets()
+        # Otro proceso (un import, un trabajo) escribe sin pasar por este y cambia
+        # la versión compartida
+        Product.objects.update(supplier='Hoya')
+        response_cache._version_cache().set(
+            response_cache.VERSION_KEY.format('api.product'), 'otra', None
+        )
+        self.assertEqual(facets.product_facets()['suppliers'], ['Hoya'])
@@ -0,0 +1,187 @@
+import io
+import re
+import zipfile
+
+import openpyxl
+from django.test import TestCase, override_settings
+
+from api import imports, rollups, stock
+from api.models import CategoryStockRollup, Product
+
+from . import factories
+
+HEADER = 'Código;Nombre;Categoría;Proveedor;Stock;Precio\n'
+
+
+def run(text, encoding='utf-8'):
+    return imports.import_products(
+        imports.read_rows(io.BytesIO(text.encode(encoding)), 'csv')
+    )
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class CsvImportTests(TestCase):
+    def test_creates_and_updates(self):
+        existing = factories.product(stock=4)
+        result = run(
+            HEADER
+            + f'{existing.code};Armazón renovado;Armazones;Óptica Sur;7;120,50\n'
+            + ';Lente nuevo;lentes;Essilor;3;80\n'
+        )
+        self.assertEqual(
+            (result.created, result.updated, result.error_count), (1, 1, 0)
+        )
+        existing.refresh_from_db()
+        self.assertEqual(
+            (existing.name, existing.stock, str(existing.price)),
+            ('Armazón renovado', 7, '120.50'),
+        )
+        self.assertTrue(
+            Product.objects.filter(name='Lente nuevo', category='lentes').exists()
+        )
+
+    def test_windows_1252_file(self):
+        result = run(
+            HEADER + ';Armazón niño;Accesorios;Óptica Peña;2;15\n', encoding='cp1252'
+        )
+        self.assertEqual((result.created, result.error_count), (1, 0))
+        product = Product.objects.get(category='accesorios')
+        self.assertEqual(
+            (product.name, product.supplier), ('Armazón niño', 'Óptica Peña')
+        )
+
+    def test_utf8_with_bom(self):
+        result = run('﻿' + HEADER + ';Estuche;accesorios;Genérico;1;5\n')
+        self.assertEqual((result.created, result.error_count), (1, 0))
+
+    def test_view_reports_errors_as_json(self):
+        body = (HEADER + ';Gotas lubricantes;Farmacia;Genérico;1;5\n').encode('cp1252')
+        response = self.client.post(
+            '/api/products/import/', body, content_type='text/csv'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['errors'][0]['row'], 2)
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class ReservedStockImportTests(TestCase):
+    def setUp(self):
+        self.product = factories.product(stock=10)
+        stock.reserve({self.product.pk: 6})
+
+    def test_rejects_stock_below_reserved(self):
+        other = factories.product(stock=1)
+        result = run(
+            HEADER
+            + f'{self.product.code};Renombrado;armazones;X;5;10\n'
+            + f'{other.code};Otro;armazones;X;9;10\n'
+        )
+        self.assertEqual((result.updated, result.error_count), (1, 1))
+        self.assertEqual(result.errors[0]['row'], 2)
+        self.assertIn('stock', result.errors[0]['errors'])
+        self.assertEqual(
+            Product.objects.values_list('name', 'stock', 'reserved').get(
+                pk=self.product.pk
+            ),
+            (self.product.name, 10, 6),
+        )
+        self.assertEqual(Product.objects.get(pk=other.pk).stock, 9)
+
+    def test_accepts_stock_covering_reserved(self):
+        result = run(HEADER + f'{self.product.code};Renombrado;armazones;X;6;10\n')
+        self.assertEqual((result.updated, result.error_count), (1, 0))
+        self.assertEqual(
+            Product.objects.values_list('stock', 'reserved').get(pk=self.product.pk),
+            (6, 6),
+        )
+
+    def test_rollup_matches_rebuild(self):
+        run(
+            HEADER
+            + f'{self.product.code};Renombrado;lentes;X;8;10\n;Nuevo;armazones;X;3;10\n'
+        )
+
+        def snapshot():
+            return list(
+                CategoryStockRollup.objects
+                .filter(product_count__gt=0)
+                .order_by('category')
+                .values_list(
+                    'category',
+                    'product_count',
+                    'consignment_count',
+                    'total_stock',
+                )
+            )
+
+        incremental = snapshot()
+        rollups.rebuild()
+        self.assertEqual(snapshot(), incremental)
+
+
+def xlsx(rows):
+    workbook = openpyxl.Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    data = io.BytesIO()
+    workbook.save(data)
+    return data.getvalue()
+
+
+def rezip(data, **replace):
+    """Copia del XLSX con partes reemplazadas (None las quita)"""
+    source = zipfile.ZipFile(io.BytesIO(data))
+    target = io.BytesIO()
+    with zipfile.ZipFile(target, 'w') as archive:
+        for name in source.namelist():
+            content = replace.get(name, source.read(name))
+            if content is not None:
+                archive.writestr(name, content)
+    return target.getvalue()
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class XlsxImportTests(TestCase):
+    HEADER = ['Código', 'Nombre', 'Categoría', 'Proveedor', 'Stock', 'Precio']
+
+    def post(self, data):
+        return self.client.post(
+            '/api/products/import/?format=xlsx',
+            data,
+            content_type='application/octet-stream',
+        )
+
+    def test_imports_a_workbook(self):
+        response = self.post(
+            xlsx([self.HEADER, ['', 'Lente azul', 'lentes', 'Zeiss', 4, 90]])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Product.objects.get(name='Lente azul').stock, 4)
+
+    def test_broken_workbooks_are_a_400(self):
+        data = xlsx([self.HEADER, ['', 'Lente azul', 'lentes', 'Zeiss', 4, 90]])
+        sheet = zipfile.ZipFile(io.BytesIO(data)).read('xl/worksheets/sheet1.xml')
+        cases = {
+            'no es zip': b'PK no es un zip',
+            'sin hoja': rezip(data, **{'xl/worksheets/sheet1.xml': None}),
+            'xml truncado': rezip(
+                data, **{'xl/worksheets/sheet1.xml': sheet[: len(sheet) // 2]}
+            ),
+            'texto compartido inexistente': rezip(
+                data,
+                **{
+                    'xl/worksheets/sheet1.xml': re.sub(
+                        rb'<c r="A1" t="inlineStr">.*?</c>',
+                        b'<c r="A1" t="s"><v>999</v></c>',
+                        sheet,
+                        count=1,
+                    ),
+                },
+            ),
+        }
+        for name, body in cases.items():
+            with self.subTest(name):
+                response = self.post(body)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+        self.assertFalse(Product.objects.exists())
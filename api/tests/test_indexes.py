@@ -0,0 +1,89 @@
+import re
+import unittest
+from datetime import date
+
+from django.db import connection
+from django.test import TestCase
+
+from api import listings
+from api.models import Appointment, Product, Purchase, Sale
+
+FULL_SCAN = re.compile(r'^SCAN (api_\w+)$')
+
+
+@unittest.skipUnless(
+    connection.vendor == 'sqlite', 'Los planes se comparan con el formato de SQLite'
+)
+class HotQueryPlanTests(TestCase):
+    """Las consultas de los listados y del dashboard no recorren tablas enteras"""
+
+    def plan(self, queryset):
+        sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndex(self, queryset, index=None):
+        plan = self.plan(queryset)
+        scans = [step for step in plan if FULL_SCAN.match(step)]
+        self.assertEqual(scans, [], plan)
+        if index is not None:
+            self.assertTrue(any(index in step for step in plan), plan)
+
+    def test_product_list(self):
+        ordering = listings.PRODUCT_CURSOR_ORDERING
+        self.assertUsesIndex(
+            listings.products({}).order_by(*ordering)[:20], 'product_created_at_idx'
+        )
+        self.assertUsesIndex(
+            listings.products({'category': 'Lentes'}).order_by(*ordering)[:20],
+            'product_category_created_idx',
+        )
+        self.assertUsesIndex(
+            listings.products({'type': 'consignacion'}).order_by(*ordering)[:20],
+            'product_type_created_idx',
+        )
+
+    def test_low_stock(self):
+        products = Product.objects.filter(status__in=['bajo', 'critico']).order_by(
+            'stock'
+        )[:10]
+        self.assertUsesIndex(products, 'product_status_stock_idx')
+
+    def test_patient_list(self):
+        self.assertUsesIndex(
+            listings.patients({})[:20], 'purchase_hist_patient_date_idx'
+        )
+        self.assertUsesIndex(
+            listings.patients({'status': 'activo'})[:20], 'patient_status_name_idx'
+        )
+
+    def test_recent_purchases(self):
+        self.assertUsesIndex(
+            listings.recent_purchases([1, 2, 3]), 'purchase_hist_patient_date_idx'
+        )
+
+    def test_appointments(self):
+        today = date.today()
+        upcoming = Appointment.objects.filter(date__gte=today).order_by('date', 'time')[
+            :5
+        ]
+        self.assertUsesIndex(upcoming, 'appointment_date_time_idx')
+        self.assertUsesIndex(
+            listings.appointments(today, today, {}), 'appointment_date_time_idx'
+        )
+        self.assertUsesIndex(
+            Appointment.objects.filter(status='pendiente'), 'appointment_status_idx'
+        )
+
+    def test_sales_and_purchases(self):
+        self.assertUsesIndex(
+            Sale.objects.order_by('-created_at', '-id')[:20], 'sale_created_status_idx'
+        )
+        self.assertUsesIndex(
+            Sale.objects.filter(status__in=['pendiente', 'procesando']),
+            'sale_status_idx',
+        )
+        self.assertUsesIndex(
+            Purchase.objects.order_by('-created_at')[:20], 'purchase_created_at_idx'
+        )
@@ -0,0 +1,114 @@
+import json
+import tempfile
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from api import jobs
+from api.models import ExportJob
+
+from . import factories
+
+
+class ExportJobTests(TransactionTestCase):
+    """Los trabajos guardan su estado desde otro hilo: datos confirmados"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(
+            EXPORT_JOBS_DIR=self.directory, API_CACHE_ENABLED=False
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for _ in range(3):
+            factories.product()
+
+    def _enqueue(self, **payload):
+        body = json.dumps({'export': 'productos', 'format': 'csv', **payload})
+        return self.client.post(
+            '/api/exports/jobs/', body, content_type='application/json'
+        )
+
+    def test_enqueue_deduplicates_active_jobs(self):
+        first, second = self._enqueue(), self._enqueue()
+        self.assertEqual((first.status_code, second.status_code), (202, 202))
+        self.assertTrue(second.json()['deduplicated'])
+        self.assertEqual(first.json()['job']['token'], second.json()['job']['token'])
+        self.assertFalse(self._enqueue(format='xlsx').json()['deduplicated'])
+
+    def test_invalid_requests_are_a_400(self):
+        for payload in ({'export': 'ventas'}, {'format': 'pdf'}):
+            with self.subTest(payload=payload):
+                self.assertEqual(self._enqueue(**payload).status_code, 400)
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_run_and_download(self):
+        token = self._enqueue().json()['job']['token']
+        job_id = jobs.claim_next()
+        self.assertIsNotNone(job_id)
+        self.assertIsNone(jobs.claim_next())
+
+        self.assertEqual(jobs.run(job_id), 'completado')
+        job = self.client.get(f'/api/exports/jobs/{token}/').json()['job']
+        self.assertEqual(
+            (job['status'], job['progress'], job['total']), ('completado', 3, 3)
+        )
+        self.assertEqual(
+            [path.name for path in self.directory.iterdir()], [f'{token}.csv']
+        )
+
+        response = self.client.get(f'/api/exports/jobs/{token}/download/')
+        self.assertEqual(
+            response['Content-Disposition'], 'attachment; filename="productos.csv"'
+        )
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        response.close()
+        self.assertEqual(len(lines), 4)
+
+        self.assertFalse(self._enqueue().json()['deduplicated'])
+
+    def test_cancelled_job_leaves_no_file(self):
+        token = self._enqueue().json()['job']['token']
+        job_id = jobs.claim_next()
+        self.assertEqual(
+            self.client.delete(f'/api/exports/jobs/{token}/').status_code, 200
+        )
+
+        self.assertEqual(jobs.run(job_id), 'cancelado')
+        self.assertEqual(list(self.directory.iterdir()), [])
+        self.assertEqual(
+            self.client.get(f'/api/exports/jobs/{token}/download/').status_code, 409
+        )
+        self.assertEqual(
+            self.client.delete(f'/api/exports/jobs/{token}/').status_code, 404
+        )
+
+    def test_unknown_token(self):
+        token = uuid.uuid4()
+        self.assertEqual(
+            self.client.get(f'/api/exports/jobs/{token}/').status_code, 404
+        )
+        self.assertEqual(
+            self.client.get(f'/api/exports/jobs/{token}/download/').status_code, 404
+        )
+
+    def test_stale_jobs_are_requeued_and_old_ones_purged(self):
+        self._enqueue()
+        job_id = jobs.claim_next()
+        ExportJob.objects.filter(pk=job_id).update(
+            updated_at=timezone.now() - jobs.JOB_STALE_AFTER * 2
+        )
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(jobs.claim_next(), job_id)
+
+        self.assertEqual(jobs.run(job_id), 'completado')
+        ExportJob.objects.filter(pk=job_id).update(
+            finished_at=timezone.now() - jobs.JOB_RETENTION - timedelta(days=1)
+        )
+        self.assertEqual(jobs.purge(), 1)
+        self.assertEqual(list(self.directory.iterdir()), [])
@@ -0,0 +1,191 @@
+import json
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api import async_views, listings
+from api.models import Patient, PatientPurchaseHistory, Product
+
+from . import factories
+
+PATIENTS = 120
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class PatientListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        product = factories.product()
+        patients = Patient.objects.bulk_create([
+            Patient(
+                name=f'Paciente {number:03}',
+                email=f'lista{number}@example.com',
+                phone='555-0000',
+            )
+            for number in range(PATIENTS)
+        ])
+        PatientPurchaseHistory.objects.bulk_create([
+            PatientPurchaseHistory(
+                patient=patient, product=product, quantity=1, price=Decimal('10.00')
+            )
+            for patient in patients
+            for _ in range(7)
+        ])
+
+    def _queries(self, page_size):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/patients/', {'page_size': page_size})
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+    def test_query_count_is_constant_up_to_page_size_100(self):
+        counts = {
+            page_size: self._queries(page_size)[0] for page_size in (1, 5, 20, 50, 100)
+        }
+        self.assertEqual(set(counts.values()), {3}, counts)
+
+    def test_recent_purchases_are_limited_per_patient(self):
+        _, data = self._queries(100)
+        self.assertEqual(len(data['patients']), 100)
+        for patient in data['patients']:
+            self.assertEqual(len(patient['purchase_history']), 5)
+            self.assertEqual(patient['total_purchases'], 7)
+
+    def test_pages_do_not_overlap_when_names_repeat(self):
+        # SQLite suele devolver los empates por rowid; el orden debe desempatar igual
+        # en cualquier base
+        self.assertEqual(
+            list(listings.patients({}).query.order_by), listings.PATIENT_CURSOR_ORDERING
+        )
+        Patient.objects.update(name='Mismo nombre')
+        seen = []
+        for page in range(1, PATIENTS // 25 + 2):
+            data = self.client.get(
+                '/api/patients/', {'page': page, 'page_size': 25}
+            ).json()
+            seen.extend(patient['id'] for patient in data['patients'])
+        self.assertEqual(
+            sorted(seen), sorted(Patient.objects.values_list('id', flat=True))
+        )
+
+
+INVALID_PAGE_PARAMS = [
+    {'page': 'abc'},
+    {'page': '0'},
+    {'page': '-2'},
+    {'page_size': '0'},
+    {'page_size': 'diez'},
+    {'page_size': '-5'},
+]
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class PageParamsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        patient = factories.patient()
+        for _ in range(3):
+            factories.sale(patient, (factories.product(), 1))
+
+    def test_invalid_values_are_a_400(self):
+        for path in (
+            '/api/products/',
+            '/api/patients/',
+            '/api/sales/',
+            '/api/purchases/',
+            '/api/patients/analytics/',
+        ):
+            for params in INVALID_PAGE_PARAMS:
+                with self.subTest(path=path, params=params):
+                    response = self.client.get(path, params)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertFalse(response.json()['success'])
+
+    def test_invalid_values_are_a_400_in_async_views(self):
+        factory = RequestFactory()
+        for view in (
+            async_views.products_view,
+            async_views.patients_view,
+            async_views.sales_view,
+        ):
+            for params in INVALID_PAGE_PARAMS:
+                with self.subTest(view=view.__name__, params=params):
+                    response = async_to_sync(view)(factory.get('/api/', params))
+                    self.assertEqual(response.status_code, 400)
+                    self.assertFalse(json.loads(response.content)['success'])
+
+    def test_valid_and_missing_values(self):
+        data = self.client.get('/api/sales/', {'page': '2', 'page_size': '2'}).json()
+        self.assertEqual(len(data['sales']), 1)
+        self.assertEqual(data['pagination']['current_page'], 2)
+        data = self.client.get('/api/sales/', {'page': '', 'page_size': ''}).json()
+        self.assertEqual(
+            (len(data['sales']), data['pagination']['current_page']), (3, 1)
+        )
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for _ in range(8):
+            factories.product()
+        cls.expected = list(
+            Product.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+
+    def _page(self, **params):
+        response = self.client.get('/api/products/', {'page_size': 3, **params})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [product['id'] for product in data['products']], data['pagination']
+
+    def test_walks_forward_and_back(self):
+        ids, pagination = self._page(cursor='')
+        pages = [ids]
+        while pagination['next_cursor']:
+            ids, pagination = self._page(cursor=pagination['next_cursor'])
+            pages.append(ids)
+        self.assertEqual(sum(pages, []), self.expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        self.assertFalse(pagination['has_next'])
+
+        ids, pagination = self._page(cursor=pagination['previous_cursor'])
+        self.assertEqual(ids, pages[1])
+        ids, pagination = self._page(cursor=pagination['previous_cursor'])
+        self.assertEqual(ids, pages[0])
+        self.assertFalse(pagination['has_previous'])
+
+    def test_rows_added_between_pages_are_not_repeated(self):
+        ids, pagination = self._page(cursor='')
+        factories.product()
+        next_ids, _ = self._page(cursor=pagination['next_cursor'])
+        self.assertEqual(next_ids, self.expected[3:6])
+
+    def test_total_only_on_request(self):
+        _, pagination = self._page(cursor='')
+        self.assertNotIn('total_items', pagination)
+        _, pagination = self._page(cursor='', include_total='1')
+        self.assertEqual(pagination['total_items'], 8)
+
+    def test_invalid_cursor_is_a_400(self):
+        for cursor in ('no-es-base64', 'eyJ2IjogWzFdLCAiZCI6ICJuZXh0In0='):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/products/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+
+    def test_patients_follow_name_order(self):
+        for name in ('Carla', 'Ana', 'Beto', 'Dora'):
+            factories.patient(name=name)
+        first = self.client.get('/api/patients/', {'cursor': '', 'page_size': 2}).json()
+        second = self.client.get(
+            '/api/patients/',
+            {'cursor': first['pagination']['next_cursor'], 'page_size': 2},
+        ).json()
+        self.assertEqual(
+            [p['name'] for p in first['patients'] + second['patients']],
+            ['Ana', 'Beto', 'Carla', 'Dora'],
+        )
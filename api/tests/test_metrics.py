@@ -0,0 +1,68 @@
+import threading
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from api import metrics
+
+from . import factories
+
+
+@override_settings(API_METRICS_ENABLED=True, API_METRICS_TOKEN='secreto')
+class MetricsAccessTests(TestCase):
+    def get(self, **headers):
+        return self.client.get('/api/_metrics', headers=headers)
+
+    def test_anonymous_requests_are_refused(self):
+        # El cliente de pruebas llega desde 127.0.0.1, como lo que pasa por un proxy
+        self.assertEqual(self.get().status_code, 404)
+        self.assertEqual(self.get(authorization='Bearer otro').status_code, 404)
+        self.assertEqual(self.get(authorization='Basic secreto').status_code, 404)
+
+    def test_token(self):
+        response = self.get(authorization='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('api_requests_total', response.content.decode())
+
+    @override_settings(API_METRICS_TOKEN='')
+    def test_empty_token_never_matches(self):
+        self.assertEqual(self.get(authorization='Bearer ').status_code, 404)
+
+    def test_staff_session(self):
+        user = User.objects.create_user('operador', password='x')
+        self.client.force_login(user)
+        self.assertEqual(self.get().status_code, 404)
+        User.objects.filter(pk=user.pk).update(is_staff=True)
+        self.assertEqual(self.get().status_code, 200)
+
+
+def _execute(*args):
+    return None
+
+
+class QueryTimerTests(TestCase):
+    def test_counts_queries_from_several_threads(self):
+        timer = metrics._QueryTimer()
+        barrier = threading.Barrier(8)
+
+        def run():
+            barrier.wait()
+            for _ in range(5000):
+                timer(_execute, 'SELECT 1', (), False, {})
+
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(timer.count, 40000)
+
+    @override_settings(API_CACHE_ENABLED=False)
+    def test_dashboard_queries_are_recorded(self):
+        factories.sale(factories.patient(), (factories.product(), 1))
+        metrics.registry.reset()
+        self.assertEqual(self.client.get('/api/dashboard/').status_code, 200)
+        self.assertIn(
+            'api_sql_queries_sum{method="GET",route="/api/dashboard/"} 4\n',
+            metrics.registry.render(),
+        )
@@ -0,0 +1,121 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api import patient_stats, rollups
+from api.models import DailySalesRollup, Patient, Purchase, PurchaseItem, Sale, SaleItem
+
+from . import factories
+
+
+def stored_total(purchase):
+    return Purchase.objects.get(pk=purchase.pk).total_amount
+
+
+def items_total(purchase):
+    return (
+        PurchaseItem.objects.filter(purchase=purchase).aggregate(
+            total=Sum('total_cost')
+        )['total']
+        or 0
+    )
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class OrderTotalTests(TestCase):
+    def setUp(self):
+        self.product = factories.product()
+        self.purchase = Purchase.objects.create(supplier='Proveedor')
+
+    def _item(self, purchase=None, quantity=1, unit_cost='10.00'):
+        return PurchaseItem.objects.create(
+            purchase=purchase or self.purchase,
+            product=self.product,
+            quantity=quantity,
+            unit_cost=Decimal(unit_cost),
+        )
+
+    def test_adding_editing_and_deleting_lines(self):
+        first = self._item(quantity=2)
+        second = self._item(unit_cost='5.50')
+        self.assertEqual(stored_total(self.purchase), Decimal('25.50'))
+
+        first.quantity = 3
+        first.save()
+        self.assertEqual(stored_total(self.purchase), Decimal('35.50'))
+
+        second.delete()
+        self.assertEqual(stored_total(self.purchase), items_total(self.purchase))
+        self.assertEqual(stored_total(self.purchase), Decimal('30.00'))
+
+    def test_line_moved_to_another_order(self):
+        item = self._item(quantity=4)
+        other = Purchase.objects.create(supplier='Proveedor')
+        item.purchase = other
+        item.save()
+        self.assertEqual(
+            (stored_total(self.purchase), stored_total(other)), (0, Decimal('40.00'))
+        )
+
+    def test_saving_a_line_does_not_reread_the_others(self):
+        for _ in range(10):
+            self._item()
+        item = self._item()
+        item.quantity = 5
+        with CaptureQueriesContext(connection) as queries:
+            item.save()
+        self.assertFalse([
+            query['sql'] for query in queries if query['sql'].startswith('SELECT')
+        ])
+        self.assertEqual(stored_total(self.purchase), items_total(self.purchase))
+
+    def test_create_with_items(self):
+        items = [
+            PurchaseItem(
+                product=self.product, quantity=1 + n % 3, unit_cost=Decimal('2.50')
+            )
+            for n in range(200)
+        ]
+        with self.assertNumQueries(5):
+            purchase = Purchase.objects.create_with_items(items, supplier='Proveedor')
+        self.assertEqual(purchase.items.count(), 200)
+        self.assertEqual(stored_total(purchase), items_total(purchase))
+
+    def test_deleting_the_order_deletes_its_lines(self):
+        self._item()
+        self.purchase.delete()
+        self.assertFalse(PurchaseItem.objects.exists())
+
+    def test_sale_create_with_items_updates_summaries(self):
+        patient = factories.patient()
+        items = [
+            SaleItem(
+                product=self.product, quantity=quantity, unit_price=Decimal('3.00')
+            )
+            for quantity in (1, 4)
+        ]
+        sale = Sale.objects.create_with_items(items, patient=patient)
+        self.assertEqual(Sale.objects.get(pk=sale.pk).total_amount, Decimal('15.00'))
+
+        def summaries():
+            return (
+                list(
+                    DailySalesRollup.objects.values_list(
+                        'date', 'category', 'quantity', 'amount'
+                    )
+                ),
+                list(
+                    Patient.objects.values_list('pk', *patient_stats.FIELDS).order_by(
+                        'pk'
+                    )
+                ),
+            )
+
+        incremental = summaries()
+        self.assertEqual(incremental[0][0][2:], (5, Decimal('15.00')))
+        rollups.rebuild()
+        patient_stats.rebuild()
+        self.assertEqual(summaries(), incremental)
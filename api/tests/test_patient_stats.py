@@ -0,0 +1,126 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api import patient_stats
+from api.models import Patient, PatientActivityRollup, Sale, SaleItem
+
+from . import factories
+
+
+def _state():
+    patients = list(
+        Patient.objects.order_by('pk').values_list('pk', *patient_stats.FIELDS)
+    )
+    cells = list(PatientActivityRollup.objects.filter(patients__gt=0).order_by(
+        'sale_count', 'last_purchase_date',
+    ).values_list('sale_count', 'last_purchase_date', 'patients', 'lifetime_spend'))
+    return patients, cells
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class PatientStatsTests(TestCase):
+    def assertMatchesRebuild(self):
+        incremental = _state()
+        patient_stats.rebuild()
+        self.assertEqual(_state(), incremental)
+
+    def counters(self, patient):
+        return Patient.objects.values_list('sale_count', 'lifetime_spend').get(
+            pk=patient.pk
+        )
+
+    def setUp(self):
+        self.patient = factories.patient()
+        self.other = factories.patient()
+        self.product = factories.product(stock=50, price=Decimal('100.00'))
+
+    def sale(self, patient=None, quantity=1, days=0, **fields):
+        sale = factories.sale(
+            patient or self.patient, (self.product, quantity), **fields
+        )
+        if days:
+            Sale.objects.filter(pk=sale.pk).update(
+                created_at=timezone.now() - timedelta(days=days)
+            )
+            patient_stats.rebuild()
+        return Sale.objects.get(pk=sale.pk)
+
+    def test_cancelled_sales_do_not_count(self):
+        self.sale(quantity=2)
+        self.sale(quantity=3, status='cancelado')
+        self.assertEqual(self.counters(self.patient), (1, Decimal('200.00')))
+        self.assertMatchesRebuild()
+
+    def test_cancel_and_reactivate(self):
+        first = self.sale(quantity=1, days=3)
+        sale = self.sale(quantity=2)
+        sale.status = 'cancelado'
+        sale.save()
+        self.assertEqual(self.counters(self.patient), (1, Decimal('100.00')))
+        patient = Patient.objects.get(pk=self.patient.pk)
+        self.assertEqual(patient.last_purchase_at, first.created_at)
+        self.assertMatchesRebuild()
+
+        sale.status = 'entregado'
+        sale.save()
+        self.assertEqual(self.counters(self.patient), (2, Decimal('300.00')))
+        self.assertMatchesRebuild()
+
+    def test_stale_instance_does_not_cancel_twice(self):
+        self.sale(quantity=1)
+        sale = self.sale(quantity=2)
+        stale = Sale.objects.get(pk=sale.pk)
+        sale.status = 'cancelado'
+        sale.save()
+        stale.status = 'cancelado'
+        stale.save()
+        self.assertEqual(self.counters(self.patient), (1, Decimal('100.00')))
+        self.assertMatchesRebuild()
+
+    def test_cancelled_sale_edits_and_moves(self):
+        sale = self.sale(quantity=2, status='cancelado')
+        item = SaleItem.objects.get(sale=sale)
+        item.quantity = 4
+        item.save()
+        sale.refresh_from_db()
+        sale.patient = self.other
+        sale.save()
+        self.assertEqual(self.counters(self.patient), (0, Decimal('0')))
+        self.assertEqual(self.counters(self.other), (0, Decimal('0')))
+        self.assertMatchesRebuild()
+
+        sale.status = 'nuevo'
+        sale.save()
+        self.assertEqual(self.counters(self.other), (1, Decimal('400.00')))
+        self.assertMatchesRebuild()
+
+    def test_move_between_patients(self):
+        sale = self.sale(quantity=2)
+        sale.patient = self.other
+        sale.save()
+        self.assertEqual(self.counters(self.patient), (0, Decimal('0')))
+        self.assertEqual(self.counters(self.other), (1, Decimal('200.00')))
+        self.assertMatchesRebuild()
+
+    def test_deleting_cancelled_and_active_sales(self):
+        self.sale(quantity=1)
+        cancelled = self.sale(quantity=2, status='cancelado')
+        active = self.sale(quantity=3)
+        cancelled.delete()
+        self.assertEqual(self.counters(self.patient), (2, Decimal('400.00')))
+        active.delete()
+        self.assertEqual(self.counters(self.patient), (1, Decimal('100.00')))
+        self.assertMatchesRebuild()
+
+    def test_item_changes(self):
+        sale = self.sale(quantity=1)
+        item = SaleItem.objects.get(sale=sale)
+        item.quantity = 5
+        item.save()
+        self.assertEqual(self.counters(self.patient), (1, Decimal('500.00')))
+        item.delete()
+        self.assertEqual(self.counters(self.patient), (1, Decimal('0.00')))
+        self.assertMatchesRebuild()
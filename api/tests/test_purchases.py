@@ -0,0 +1,112 @@
+import json
+
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from api import purchases
+from api.models import Purchase
+
+from . import factories
+from .threads import run_concurrently
+
+RECEIVERS = 10
+
+
+def post(client, path, payload=None):
+    return client.post(path, json.dumps(payload or {}), content_type='application/json')
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class PurchaseTests(TestCase):
+    def setUp(self):
+        self.frames = factories.product(stock=2)
+        self.lenses = factories.product(stock=0, category='lentes')
+
+    def _create(self, **fields):
+        return post(self.client, '/api/purchases/', {
+            'supplier': 'Óptica Sur',
+            'items': [
+                {'product': self.frames.pk, 'quantity': 3, 'unit_cost': '12.50'},
+                {'product': self.lenses.pk, 'quantity': 5, 'unit_cost': 4},
+                {'product': self.frames.pk, 'quantity': 1, 'unit_cost': '12.50'},
+            ],
+            **fields,
+        })
+
+    def _stock(self):
+        self.frames.refresh_from_db()
+        self.lenses.refresh_from_db()
+        return self.frames.stock, self.lenses.stock
+
+    def test_create_does_not_touch_stock(self):
+        response = self._create()
+        self.assertEqual(response.status_code, 200)
+        purchase = Purchase.objects.get()
+        self.assertEqual(
+            (purchase.status, str(purchase.total_amount), purchase.items.count()),
+            ('pendiente', '70.00', 3),
+        )
+        self.assertEqual(self._stock(), (2, 0))
+
+    def test_receive_is_idempotent(self):
+        purchase_id = self._create().json()['purchase']['id']
+        first = post(self.client, f'/api/purchases/{purchase_id}/receive/')
+        second = post(self.client, f'/api/purchases/{purchase_id}/receive/')
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(second.json()['message'], 'La compra ya estaba recibida')
+        self.assertEqual(self._stock(), (6, 5))
+        self.assertIsNotNone(Purchase.objects.get().received_at)
+
+    def test_create_as_received(self):
+        self._create(status='recibido')
+        self.assertEqual(Purchase.objects.get().status, 'recibido')
+        self.assertEqual(self._stock(), (6, 5))
+
+    def test_cancelled_or_missing_purchase(self):
+        purchase_id = self._create().json()['purchase']['id']
+        Purchase.objects.update(status='cancelado')
+        self.assertEqual(
+            post(self.client, f'/api/purchases/{purchase_id}/receive/').status_code, 409
+        )
+        self.assertEqual(
+            post(self.client, f'/api/purchases/{purchase_id + 1}/receive/').status_code,
+            404,
+        )
+        self.assertEqual(self._stock(), (2, 0))
+
+    def test_invalid_payloads_are_a_400(self):
+        cases = [
+            {'supplier': ''},
+            {'status': 'cancelado'},
+            {'items': []},
+            {'items': [{'product': self.frames.pk, 'quantity': 0, 'unit_cost': 1}]},
+            {'items': [{'product': self.frames.pk, 'unit_cost': 'gratis'}]},
+            {'items': [{'product': self.frames.pk, 'unit_cost': -1}]},
+            {'items': [{'product': self.frames.pk, 'unit_cost': 'NaN'}]},
+            {'items': [{'product': self.frames.pk, 'unit_cost': 'sNaN'}]},
+            {'items': [{'product': self.frames.pk, 'unit_cost': 'Infinity'}]},
+            {'items': [{'product': 0, 'unit_cost': 1}]},
+            {'items': [{'product': self.lenses.pk + 100, 'unit_cost': 1}]},
+        ]
+        for fields in cases:
+            with self.subTest(fields=fields):
+                self.assertEqual(self._create(**fields).status_code, 400)
+        self.assertFalse(Purchase.objects.exists())
+
+
+class ConcurrentReceiveTests(TransactionTestCase):
+    def test_stock_is_added_once(self):
+        product = factories.product(stock=1)
+        purchase = purchases.create_purchase({
+            'supplier': 'Proveedor',
+            'items': [{'product': product.pk, 'quantity': 4, 'unit_cost': 1}],
+        })
+        results = run_concurrently(
+            lambda: purchases.receive_purchase(purchase.pk), RECEIVERS
+        )
+
+        self.assertEqual(
+            sorted(received for _, received in results),
+            [False] * (RECEIVERS - 1) + [True],
+        )
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 5)
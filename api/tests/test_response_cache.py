@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from api import response_cache
+
+from . import factories
+
+LOCMEM = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'pruebas',
+}
+
+
+class VersionCacheCheckTests(TestCase):
+    def test_default_settings_share_versions(self):
+        self.assertEqual(response_cache.check_version_cache(), [])
+
+    @override_settings(
+        CACHES={'default': LOCMEM},
+        API_CACHE_VERSION_ALIAS='default',
+        API_CACHE_ENABLED=True,
+    )
+    def test_rejects_process_local_versions(self):
+        self.assertEqual(
+            [error.id for error in response_cache.check_version_cache()], ['api.E001']
+        )
+
+    @override_settings(
+        CACHES={'default': LOCMEM},
+        API_CACHE_VERSION_ALIAS='default',
+        API_CACHE_ENABLED=False,
+    )
+    def test_allows_locmem_with_cache_disabled(self):
+        self.assertEqual(response_cache.check_version_cache(), [])
+
+
+@override_settings(API_CACHE_ENABLED=True)
+class CrossProcessInvalidationTests(TestCase):
+    def get(self):
+        return self.client.get('/api/products/')['X-Cache']
+
+    def test_write_from_another_process_invalidates(self):
+        factories.product()
+        self.assertEqual([self.get(), self.get()], ['MISS', 'HIT'])
+
+        # Como lo haría run_jobs o import_products: otro proceso, misma configuración
+        subprocess.run(
+            [sys.executable, 'manage.py', 'shell', '-c',
+             'from api import response_cache; from api.models import Product; '
+             'response_cache.invalidate(Product)'],
+            cwd=settings.BASE_DIR, env=os.environ, check=True, capture_output=True,
+        )
+        self.assertEqual(self.get(), 'MISS')
@@ -0,0 +1,99 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from api import rollups, stock
+from api.models import CategoryStockRollup, DailySalesRollup, Product, Sale, SaleItem
+
+from . import factories
+
+
+def _snapshot():
+    """Filas no vacías de las tablas de resumen"""
+    return (
+        sorted(
+            row
+            for row in CategoryStockRollup.objects.values_list(
+                'category',
+                'product_count',
+                'consignment_count',
+                'total_stock',
+            )
+            if any(row[1:])
+        ),
+        sorted(
+            row
+            for row in DailySalesRollup.objects.values_list(
+                'date', 'category', 'quantity', 'amount'
+            )
+            if any(row[2:])
+        ),
+    )
+
+
+class IncrementalRollupTests(TestCase):
+    def assertMatchesRebuild(self):
+        incremental = _snapshot()
+        rollups.rebuild()
+        self.assertEqual(incremental, _snapshot())
+
+    def setUp(self):
+        self.frame = factories.product(category='armazones', stock=10)
+        self.lens = factories.product(category='lentes', stock=5, type='consignacion')
+        self.customer = factories.patient()
+
+    def test_product_create_update_and_delete(self):
+        self.frame.stock = 7
+        self.frame.save()
+        self.lens.type = 'propio'
+        self.lens.save()
+        self.assertMatchesRebuild()
+        self.lens.delete()
+        self.assertMatchesRebuild()
+
+    def test_stale_instance_after_atomic_stock_change(self):
+        stale = Product.objects.get(pk=self.frame.pk)
+        stock.apply_stock_deltas({self.frame.pk: -2})
+        stale.name = 'Renombrado'
+        stale.save()
+        self.assertMatchesRebuild()
+        self.assertEqual(
+            CategoryStockRollup.objects.get(category='armazones').total_stock,
+            Product.objects.get(pk=self.frame.pk).stock,
+        )
+
+    def test_stale_instance_stock_edit(self):
+        stale = Product.objects.get(pk=self.frame.pk)
+        stock.apply_stock_deltas({self.frame.pk: -2})
+        stale.stock = 12
+        stale.save()
+        self.assertMatchesRebuild()
+
+    def test_stale_category_move(self):
+        factories.sale(self.customer, (self.frame, 1))
+        stale = Product.objects.get(pk=self.frame.pk)
+        stock.apply_stock_deltas({self.frame.pk: -3})
+        stale.category = 'accesorios'
+        stale.save()
+        self.assertMatchesRebuild()
+
+    def test_stale_instance_delete(self):
+        stale = Product.objects.get(pk=self.frame.pk)
+        stock.apply_stock_deltas({self.frame.pk: 4})
+        stale.delete()
+        self.assertMatchesRebuild()
+
+    def test_sales_and_items(self):
+        sale = factories.sale(self.customer, (self.frame, 2), (self.lens, 1))
+        self.assertMatchesRebuild()
+        item = sale.items.get(product=self.frame)
+        item.quantity = 3
+        item.save()
+        SaleItem.objects.create(
+            sale=sale, product=self.lens, quantity=1, unit_price=Decimal('20')
+        )
+        self.assertMatchesRebuild()
+        item.delete()
+        self.assertMatchesRebuild()
+        Sale.objects.get(pk=sale.pk).delete()
+        self.assertMatchesRebuild()
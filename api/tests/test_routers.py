@@ -0,0 +1,90 @@
+import os
+import tempfile
+from datetime import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TransactionTestCase, override_settings
+
+from api.models import Appointment, Patient, Product, SaleItem
+from api.routers import REPLICA_ALIAS, ReplicaRouter, reading_from_replica
+
+from . import factories
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """Primaria y réplica en dos bases SQLite: lo escrito en una no aparece en la otra
+
+    La réplica se agrega después de preparar la clase, en un archivo
+    temporal propio, así el resto de las pruebas sigue sin réplica.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._directory = tempfile.TemporaryDirectory()
+        replica = {
+            **connections[DEFAULT_DB_ALIAS].settings_dict,
+            'NAME': os.path.join(cls._directory.name, 'replica.sqlite3'),
+        }
+        # connections.settings es el mismo diccionario que settings.DATABASES
+        cls._databases = mock.patch.dict(settings.DATABASES, {REPLICA_ALIAS: replica})
+        cls._databases.start()
+        call_command('migrate', database=REPLICA_ALIAS, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA_ALIAS].close()
+        del connections[REPLICA_ALIAS]
+        cls._databases.stop()
+        cls._directory.cleanup()
+        super().tearDownClass()
+
+    def tearDown(self):
+        call_command('flush', database=REPLICA_ALIAS, interactive=False, verbosity=0)
+        super().tearDown()
+
+    def test_marked_reads_go_to_replica(self):
+        factories.product()
+        self.assertEqual(Product.objects.count(), 1)
+        with reading_from_replica():
+            self.assertEqual(Product.objects.count(), 0)
+        with override_settings(API_CACHE_ENABLED=False):
+            self.assertEqual(self.client.get('/api/products/').json()['products'], [])
+
+    def test_relations_follow_instance_from_primary(self):
+        factories.sale(factories.patient(), (factories.product(), 2))
+        item = SaleItem.objects.get()
+        with reading_from_replica():
+            self.assertEqual(item.sale.items.count(), 1)
+            self.assertEqual(item.product.pk, item.product_id)
+
+    def test_relations_follow_instance_from_replica(self):
+        patient = Patient.objects.using(REPLICA_ALIAS).create(
+            name='Réplica', email='replica@example.com', phone='1'
+        )
+        Appointment.objects.using(REPLICA_ALIAS).create(
+            patient=patient, date='2026-01-05', time=time(9), type='control'
+        )
+
+        patient = Patient.objects.using(REPLICA_ALIAS).get()
+        self.assertEqual(patient.appointments.count(), 1)
+        appointment = patient.appointments.get()
+        self.assertEqual(appointment.patient.name, 'Réplica')
+        self.assertEqual(Appointment.objects.count(), 0)
+
+    def test_writes_always_go_to_primary(self):
+        router = ReplicaRouter()
+        replica_patient = Patient(name='x')
+        replica_patient._state.db = REPLICA_ALIAS
+        with reading_from_replica():
+            self.assertEqual(
+                router.db_for_write(Patient, instance=replica_patient), DEFAULT_DB_ALIAS
+            )
+            self.assertEqual(router.db_for_read(Patient), REPLICA_ALIAS)
+        self.assertEqual(
+            router.db_for_read(Patient, instance=replica_patient), REPLICA_ALIAS
+        )
+        self.assertEqual(router.db_for_read(Patient), DEFAULT_DB_ALIAS)
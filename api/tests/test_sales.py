@@ -0,0 +1,216 @@
+import json
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory, TestCase, override_settings
+
+from api import async_views
+from api.models import Patient, PatientPurchaseHistory, Product, Sale, SaleItem
+
+from . import factories
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class SalesApiTests(TestCase):
+    def setUp(self):
+        self.patient = factories.patient()
+        self.frame = factories.product(stock=10, price=Decimal('100.00'))
+        self.lens = factories.product(
+            stock=4, price=Decimal('250.00'), category='lentes'
+        )
+
+    def post(self, payload, path='/api/sales/'):
+        return self.client.post(
+            path, json.dumps(payload), content_type='application/json'
+        )
+
+    def stock(self, product):
+        return Product.objects.values_list('stock', flat=True).get(pk=product.pk)
+
+    def test_create_sale(self):
+        response = self.post({
+            'patient': self.patient.pk,
+            'items': [
+                {'product': self.frame.pk, 'quantity': 2},
+                {'product': self.lens.pk, 'quantity': 1, 'unit_price': '200.00'},
+            ],
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['sales'][0]['amount'], 400.0)
+
+        sale = Sale.objects.get(pk=data['sales'][0]['id'])
+        self.assertEqual(sale.total_amount, Decimal('400.00'))
+        self.assertEqual(sorted(sale.items.values_list('quantity', 'unit_price')), [
+            (1, Decimal('200.00')), (2, Decimal('100.00')),
+        ])
+        self.assertEqual((self.stock(self.frame), self.stock(self.lens)), (8, 3))
+        self.assertEqual(
+            PatientPurchaseHistory.objects.filter(patient=self.patient).count(), 2
+        )
+        patient = Patient.objects.get(pk=self.patient.pk)
+        self.assertEqual(
+            (patient.sale_count, patient.lifetime_spend), (1, Decimal('400.00'))
+        )
+
+    def test_create_batch(self):
+        other = factories.patient()
+        response = self.post({
+            'sales': [
+                {
+                    'patient': self.patient.pk,
+                    'items': [{'product': self.frame.pk, 'quantity': 3}],
+                },
+                {
+                    'patient': other.pk,
+                    'items': [{'product': self.frame.pk, 'quantity': 4}],
+                    'status': 'entregado',
+                },
+            ]
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['sales']), 2)
+        self.assertEqual(self.stock(self.frame), 3)
+        self.assertEqual(
+            list(Sale.objects.order_by('id').values_list('status', flat=True)),
+            ['nuevo', 'entregado'],
+        )
+
+    def test_invalid_payloads(self):
+        cases = [
+            [],
+            {'patient': self.patient.pk, 'items': []},
+            {
+                'patient': self.patient.pk,
+                'items': [{'product': self.frame.pk, 'quantity': 0}],
+            },
+            {
+                'patient': self.patient.pk,
+                'items': [{'product': self.frame.pk}],
+                'status': 'perdido',
+            },
+            {
+                'patient': self.patient.pk,
+                'items': [{'product': self.frame.pk, 'unit_price': 'gratis'}],
+            },
+            {
+                'patient': self.patient.pk,
+                'items': [{'product': self.frame.pk, 'unit_price': -5}],
+            },
+            {
+                'patient': self.patient.pk,
+                'items': [{'product': self.frame.pk, 'unit_price': 'NaN'}],
+            },
+            {
+                'patient': self.patient.pk,
+                'items': [{'product': self.frame.pk, 'unit_price': 'Infinity'}],
+            },
+            {'patient': 999999, 'items': [{'product': self.frame.pk}]},
+            {'patient': self.patient.pk, 'items': [{'product': 999999}]},
+            {
+                'patient': self.patient.pk,
+                'items': [{'product': self.frame.pk}],
+                'reservation': 'no-es-un-token',
+            },
+        ]
+        for payload in cases:
+            with self.subTest(payload=payload):
+                response = self.post(payload)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+        self.assertFalse(Sale.objects.exists())
+        self.assertEqual(self.stock(self.frame), 10)
+
+    def test_insufficient_stock_rolls_back_the_batch(self):
+        response = self.post({
+            'sales': [
+                {
+                    'patient': self.patient.pk,
+                    'items': [{'product': self.frame.pk, 'quantity': 1}],
+                },
+                {
+                    'patient': self.patient.pk,
+                    'items': [{'product': self.lens.pk, 'quantity': 5}],
+                },
+            ]
+        })
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Sale.objects.exists())
+        self.assertFalse(SaleItem.objects.exists())
+        self.assertEqual((self.stock(self.frame), self.stock(self.lens)), (10, 4))
+        self.assertEqual(Patient.objects.get(pk=self.patient.pk).sale_count, 0)
+
+    def test_sale_from_reservation(self):
+        token = self.post(
+            {'items': [{'product': self.lens.pk, 'quantity': 3}]},
+            '/api/stock/reservations/',
+        ).json()['token']
+        # Lo apartado no se puede vender a otro
+        response = self.post({
+            'patient': self.patient.pk,
+            'items': [{'product': self.lens.pk, 'quantity': 2}],
+        })
+        self.assertEqual(response.status_code, 409)
+
+        mismatch = self.post({
+            'patient': self.patient.pk,
+            'items': [{'product': self.lens.pk, 'quantity': 2}],
+            'reservation': token,
+        })
+        self.assertEqual(mismatch.status_code, 400)
+
+        response = self.post({
+            'patient': self.patient.pk,
+            'items': [{'product': self.lens.pk, 'quantity': 3}],
+            'reservation': token,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            Product.objects.values_list('stock', 'reserved').get(pk=self.lens.pk),
+            (1, 0),
+        )
+
+        again = self.post({
+            'patient': self.patient.pk,
+            'items': [{'product': self.lens.pk, 'quantity': 3}],
+            'reservation': token,
+        })
+        self.assertEqual(again.status_code, 400)
+        self.assertEqual(self.stock(self.lens), 1)
+
+    def test_list(self):
+        other = factories.patient()
+        factories.sale(self.patient, (self.frame, 1), (self.lens, 1))
+        factories.sale(other, (self.frame, 2), status='cancelado')
+
+        response = self.client.get('/api/sales/')
+        self.assertEqual(response.status_code, 200)
+        sales = response.json()['sales']
+        self.assertEqual(len(sales), 2)
+        items = {sale['patient_id']: sale['items'] for sale in sales}
+        self.assertEqual(
+            [item['product_id'] for item in items[self.patient.pk]],
+            [self.frame.pk, self.lens.pk],
+        )
+        self.assertEqual(items[other.pk][0]['quantity'], 2)
+
+        cancelled = self.client.get('/api/sales/', {'status': 'cancelado'}).json()[
+            'sales'
+        ]
+        self.assertEqual([sale['patient_id'] for sale in cancelled], [other.pk])
+        mine = self.client.get('/api/sales/', {'patient': self.patient.pk}).json()[
+            'sales'
+        ]
+        self.assertEqual([sale['amount'] for sale in mine], [350.0])
+
+    def test_invalid_patient_filter_is_a_400(self):
+        for patient in ('abc', '0', '-3'):
+            with self.subTest(patient=patient):
+                response = self.client.get('/api/sales/', {'patient': patient})
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+                request = RequestFactory().get('/api/sales/', {'patient': patient})
+                self.assertEqual(
+                    async_to_sync(async_views.sales_view)(request).status_code, 400
+                )
@@ -0,0 +1,108 @@
+import importlib
+from types import SimpleNamespace
+
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from api import search
+from api.models import Patient, Product
+
+from . import factories
+
+migration = importlib.import_module('api.migrations.0004_search_index')
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ray_ban = factories.product(
+            name='Armazón Ray-Ban Clásico', supplier='Luxottica'
+        )
+        cls.oakley = factories.product(name='Armazón Oakley', supplier='Oakley Inc')
+        cls.lens = factories.product(
+            name='Lente progresivo', category='lentes', supplier='Essilor'
+        )
+        cls.ana = factories.patient(name='Ana Gómez', email='ana@example.com')
+        cls.andres = factories.patient(name='Andrés Pérez', email='andres@example.com')
+
+    def names(self, queryset, text):
+        return [row.name for row in search.search(queryset, text)]
+
+    def test_prefix_terms_must_all_match(self):
+        self.assertEqual(
+            self.names(Product.objects.all(), 'arma ray'), ['Armazón Ray-Ban Clásico']
+        )
+        self.assertCountEqual(
+            self.names(Product.objects.all(), 'armazon'),
+            ['Armazón Ray-Ban Clásico', 'Armazón Oakley'],
+        )
+        self.assertEqual(self.names(Product.objects.all(), 'xyz'), [])
+
+    def test_category_label_and_diacritics(self):
+        self.assertEqual(
+            self.names(Product.objects.all(), 'lentes'), ['Lente progresivo']
+        )
+        self.assertEqual(self.names(Patient.objects.all(), 'andres'), ['Andrés Pérez'])
+
+    def test_orders_by_rank(self):
+        # Oakley aparece en el nombre y en el proveedor
+        self.assertEqual(
+            self.names(Product.objects.all(), 'oakley')[0], 'Armazón Oakley'
+        )
+        ranked = list(
+            search.search(Product.objects.all(), 'armazon').values_list(
+                'search_rank', flat=True
+            )
+        )
+        self.assertEqual(ranked, sorted(ranked, reverse=True))
+
+    def test_rank_comes_from_one_join(self):
+        sql = str(search.search(Product.objects.all(), 'armazon').query)
+        self.assertIn('INNER JOIN "api_product_search"', sql)
+        self.assertEqual(sql.count('SELECT'), 1)
+
+    def test_composes_with_filters_and_aggregates(self):
+        products = search.search(
+            Product.objects.filter(supplier='Luxottica'), 'armazon'
+        )
+        self.assertEqual([product.pk for product in products], [self.ray_ban.pk])
+        self.assertEqual(search.search(Product.objects.all(), 'armazon').count(), 2)
+
+    def test_follows_saves_and_deletes(self):
+        self.oakley.name = 'Gafas de sol'
+        self.oakley.save()
+        self.assertEqual(self.names(Product.objects.all(), 'gafas'), ['Gafas de sol'])
+        self.oakley.delete()
+        self.assertEqual(self.names(Product.objects.all(), 'gafas'), [])
+
+    def test_list_endpoints(self):
+        response = self.client.get('/api/patients/', {'search': 'ana'})
+        self.assertEqual(
+            [patient['name'] for patient in response.json()['patients']], ['Ana Gómez']
+        )
+        response = self.client.get('/api/products/', {'search': 'progresivo'})
+        self.assertEqual(
+            [product['id'] for product in response.json()['products']], [self.lens.pk]
+        )
+
+    def test_migration_backfill_matches_rebuild(self):
+        def documents():
+            with connection.cursor() as cursor:
+                return {
+                    index.table: cursor.execute(
+                        f'SELECT rowid, * FROM {index.table} ORDER BY rowid'
+                    ).fetchall()
+                    for index in search.INDEXES.values()
+                }
+
+        search.rebuild()
+        expected = documents()
+        with connection.cursor() as cursor:
+            for index in search.INDEXES.values():
+                cursor.execute(f'DELETE FROM {index.table}')
+            # El editor de esquema de SQLite no se abre en la transacción de la prueba
+            migration.create_search_index(
+                None, SimpleNamespace(connection=connection, execute=cursor.execute)
+            )
+        self.assertEqual(documents(), expected)
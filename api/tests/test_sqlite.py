@@ -0,0 +1,66 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import SimpleTestCase, override_settings
+
+from api import sqlite
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Perfiles solo para SQLite')
+class SqliteProfileTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'perfil.sqlite3'
+
+    def _pragmas(self, *names, name=None):
+        """Abre una conexión nueva (dispara connection_created) y lee los PRAGMA"""
+        wrapper = type(connections[DEFAULT_DB_ALIAS])(
+            {**connection.settings_dict, 'NAME': name or self.path}, alias='perfil'
+        )
+        try:
+            with wrapper.cursor() as cursor:
+                return {
+                    pragma: cursor.execute(f'PRAGMA {pragma}').fetchone()[0]
+                    for pragma in names
+                }
+        finally:
+            wrapper.close()
+
+    @override_settings(SQLITE_PROFILE='production', SQLITE_PRAGMAS={})
+    def test_production_profile(self):
+        values = self._pragmas(
+            'journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'temp_store'
+        )
+        self.assertEqual(
+            values,
+            {
+                'journal_mode': 'wal',
+                'synchronous': 1,
+                'busy_timeout': 10000,
+                'cache_size': -64000,
+                'temp_store': 2,
+            },
+        )
+
+    @override_settings(SQLITE_PROFILE='default', SQLITE_PRAGMAS={'busy_timeout': 500})
+    def test_default_profile_undoes_wal_and_accepts_overrides(self):
+        with override_settings(SQLITE_PROFILE='production', SQLITE_PRAGMAS={}):
+            self.assertEqual(self._pragmas('journal_mode'), {'journal_mode': 'wal'})
+        self.assertEqual(
+            self._pragmas('journal_mode', 'busy_timeout'),
+            {'journal_mode': 'delete', 'busy_timeout': 500},
+        )
+
+    @override_settings(SQLITE_PROFILE='production')
+    def test_in_memory_databases_are_left_alone(self):
+        self.assertEqual(
+            self._pragmas('journal_mode', name=':memory:'), {'journal_mode': 'memory'}
+        )
+
+    @override_settings(SQLITE_PROFILE='rapido')
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            sqlite.pragmas()
@@ -0,0 +1,125 @@
+import threading
+from datetime import timedelta
+
+from django.test import TestCase, TransactionTestCase
+
+from api import stock
+from api.models import CategoryStockRollup, Product, Sale, StockReservation
+
+from . import factories
+from .threads import run_concurrently
+
+SELLERS = 50
+
+
+class ProductSaveTests(TestCase):
+    def setUp(self):
+        self.product = factories.product(stock=10)
+
+    def test_stale_save_keeps_concurrent_decrement(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        stock.apply_stock_deltas({self.product.pk: -2})
+        stale.name = 'Renombrado'
+        stale.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 8)
+        self.assertEqual(stale.stock, 8)
+
+    def test_stock_edit_is_applied_as_delta(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        stock.apply_stock_deltas({self.product.pk: -2})
+        stale.stock = 15
+        stale.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 13)
+        self.assertEqual(self.product.status, 'normal')
+        self.assertEqual(
+            CategoryStockRollup.objects.get(category='armazones').total_stock, 13
+        )
+
+    def test_stock_cannot_drop_below_reserved(self):
+        stock.reserve({self.product.pk: 4})
+        self.product.refresh_from_db()
+        self.product.stock = 3
+        with self.assertRaises(stock.InsufficientStock):
+            self.product.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 10)
+
+    def test_status_follows_stock(self):
+        self.product.stock = 0
+        self.product.save()
+        self.assertEqual(Product.objects.get(pk=self.product.pk).status, 'critico')
+
+
+class ExpiredReservationTests(TestCase):
+    def setUp(self):
+        self.product = factories.product(stock=2)
+        self.other = factories.product(stock=5)
+
+    def test_sale_releases_expired_reservations(self):
+        stock.reserve({self.product.pk: 2, self.other.pk: 3}, ttl=timedelta(seconds=-1))
+        self.assertEqual(stock.apply_stock_deltas({self.product.pk: -1}), 1)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (1, 0))
+        self.assertEqual(StockReservation.objects.filter(product=self.other).count(), 1)
+
+    def test_active_reservations_still_hold_their_units(self):
+        stock.reserve({self.product.pk: 2})
+        with self.assertRaises(stock.InsufficientStock):
+            stock.apply_stock_deltas({self.other.pk: -1, self.product.pk: -1})
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.stock, 5)
+
+    def test_batch_is_all_or_nothing_after_release(self):
+        stock.reserve({self.product.pk: 2}, ttl=timedelta(seconds=-1))
+        with self.assertRaises(stock.InsufficientStock):
+            stock.apply_stock_deltas({self.other.pk: -1, self.product.pk: -3})
+        self.assertEqual(Product.objects.get(pk=self.other.pk).stock, 5)
+
+
+class ConcurrentSellersTests(TransactionTestCase):
+    """Muchos vendedores del mismo producto a la vez nunca dejan el stock negativo"""
+
+    def test_no_oversell_with_stock_deltas(self):
+        product = factories.product(stock=30)
+        results = run_concurrently(
+            lambda: stock.apply_stock_deltas({product.pk: -1}), SELLERS
+        )
+
+        self.assertEqual(sum(1 for result in results if result == 1), 30)
+        self.assertTrue(
+            all(
+                result == 1 or isinstance(result, stock.InsufficientStock)
+                for result in results
+            ),
+            results,
+        )
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(product.status, 'critico')
+
+    def test_no_oversell_with_sales(self):
+        product = factories.product(stock=30)
+        customers = [factories.patient() for _ in range(SELLERS)]
+        sellers = iter(customers)
+        sellers_lock = threading.Lock()
+
+        def sell():
+            with sellers_lock:
+                customer = next(sellers)
+            return factories.sale(customer, (product, 1))
+
+        results = run_concurrently(sell, SELLERS)
+
+        sold = [result for result in results if isinstance(result, Sale)]
+        self.assertTrue(all(
+            isinstance(result, (Sale, stock.InsufficientStock)) for result in results
+        ), results)
+        self.assertEqual(len(sold), 30)
+        self.assertEqual(Sale.objects.count(), 30)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(
+            CategoryStockRollup.objects.get(category=product.category).total_stock, 0
+        )
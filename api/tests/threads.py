@@ -0,0 +1,29 @@
+"""Ejecución simultánea para las pruebas de concurrencia (con TransactionTestCase)"""
+import threading
+
+from django.db import connection
+
+
+def run_concurrently(target, count):
+    """Llama ``target`` en ``count`` hilos a la vez; da resultados o excepciones"""
+    barrier = threading.Barrier(count)
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        try:
+            barrier.wait()
+            outcome = target()
+        except Exception as e:
+            outcome = e
+        finally:
+            connection.close()
+        with lock:
+            results.append(outcome)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
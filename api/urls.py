@@ -1,16 +1,59 @@
 
+from django.conf import settings
 from django.urls import path
-from . import views
+
+from . import async_views, views
+
+# Dashboard y listados: versiones asíncronas al servir con ASGI (ver api.async_views)
+read_views = async_views if getattr(settings, 'API_ASYNC_VIEWS', False) else views
 
 urlpatterns = [
-    path('dashboard/', views.dashboard_view, name='dashboard'),
-    path('products/', views.products_view, name='products'),
+    path('_metrics', views.metrics_view, name='metrics'),
+    path('dashboard/', read_views.dashboard_view, name='dashboard'),
+    path('products/', read_views.products_view, name='products'),
     path('products/export/', views.export_products_view, name='export_products'),
-    path('patients/', views.patients_view, name='patients'),
+    path('products/facets/', views.product_facets_view, name='product_facets'),
+    path('products/import/', views.import_products_view, name='import_products'),
+    path('patients/', read_views.patients_view, name='patients'),
     path('patients/export/', views.export_patients_view, name='export_patients'),
-    path('appointments/', views.appointments_view, name='appointments'),
-    path('sales/', views.sales_view, name='sales'),
+    path('patients/analytics/', views.patient_analytics_view, name='patient_analytics'),
+    path('appointments/', read_views.appointments_view, name='appointments'),
+    path(
+        'appointments/availability/',
+        views.appointment_availability_view,
+        name='appointment_availability',
+    ),
+    path('sales/', read_views.sales_view, name='sales'),
+    path(
+        'stock/reservations/', views.stock_reservations_view, name='stock_reservations'
+    ),
+    path(
+        'stock/reservations/<uuid:token>/',
+        views.stock_reservation_detail_view,
+        name='stock_reservation_detail',
+    ),
     path('purchases/', views.purchases_view, name='purchases'),
+    path(
+        'purchases/<int:pk>/receive/',
+        views.receive_purchase_view,
+        name='receive_purchase',
+    ),
     path('purchases/export/', views.export_purchases_view, name='export_purchases'),
+    path('exports/jobs/', views.export_jobs_view, name='export_jobs'),
+    path(
+        'exports/jobs/<uuid:token>/',
+        views.export_job_detail_view,
+        name='export_job_detail',
+    ),
+    path(
+        'exports/jobs/<uuid:token>/download/',
+        views.export_job_download_view,
+        name='export_job_download',
+    ),
     path('consignments/', views.consignments_view, name='consignments'),
+    path(
+        'consignments/settlement/',
+        views.consignment_settlement_view,
+        name='consignment_settlement',
+    ),
 ]
@@ -1,208 +1,76 @@
-from django.http import JsonResponse, HttpResponse
+import io
+import json
+from datetime import date, timedelta
+
+from django.db.models import Count
+from django.http import FileResponse, HttpResponse
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from django.core.paginator import Paginator
-from django.db.models import Q
-import json
-import xlwt
-from .models import Product, Patient, PatientPurchaseHistory, Sale, SaleItem, Appointment, Purchase
+
+from . import (
+    analytics,
+    consignments,
+    dashboard,
+    exports,
+    facets,
+    imports,
+    jobs,
+    listings,
+    metrics,
+    scheduling,
+    serializers,
+    stock,
+)
+from .models import (
+    Appointment,
+    ConsignmentMovement,
+    ExportJob,
+    Patient,
+    PatientPurchaseHistory,
+    Product,
+    Purchase,
+    PurchaseItem,
+    Sale,
+    SaleItem,
+)
+from .pagination import InvalidPagination, paginate
+from .purchases import PurchaseNotReceivable, create_purchase, receive_purchase
+from .response_cache import cached_response
+from .responses import JsonResponse
+from .routers import replica_reads
+from .sales import create_sales
+
 
 @csrf_exempt
 @require_http_methods(["GET"])
+@replica_reads
+@cached_response(Sale, SaleItem, Appointment, Patient, Product)
 def dashboard_view(request):
     """Vista del dashboard con datos completos"""
-    from django.db.models import Sum, Count
-    from datetime import datetime, timedelta
-    
-    today = datetime.now().date()
-    start_of_month = today.replace(day=1)
-    
-    # Calcular ventas diarias y mensuales
-    daily_sales = Sale.objects.filter(created_at__date=today).aggregate(
-        total=Sum('total_amount')
-    )['total'] or 0
-    
-    monthly_sales = Sale.objects.filter(created_at__date__gte=start_of_month).aggregate(
-        total=Sum('total_amount')
-    )['total'] or 0
-    
-    # Citas de hoy
-    today_appointments = Appointment.objects.filter(date=today).count()
-    
-    # Productos en inventario
-    total_inventory = Product.objects.aggregate(total=Sum('stock'))['total'] or 0
-    
-    # Productos de consignación
-    consignments_count = Product.objects.filter(type='consignacion').count()
-    
-    # Ventas recientes (últimas 5)
-    recent_sales = Sale.objects.select_related('patient')[:5]
-    recent_sales_data = []
-    for sale in recent_sales:
-        recent_sales_data.append({
-            'id': sale.id,
-            'customer': sale.patient.name,
-            'amount': float(sale.total_amount),
-            'date': sale.created_at.strftime('%Y-%m-%d'),
-            'status': sale.get_status_display()
-        })
-    
-    # Citas recientes (próximas 5)
-    recent_appointments = Appointment.objects.select_related('patient').filter(
-        date__gte=today
-    ).order_by('date', 'time')[:5]
-    recent_appointments_data = []
-    for apt in recent_appointments:
-        recent_appointments_data.append({
-            'id': apt.id,
-            'patient': apt.patient.name,
-            'time': apt.time.strftime('%H:%M'),
-            'date': apt.date.strftime('%Y-%m-%d'),
-            'type': apt.get_type_display(),
-            'status': apt.get_status_display()
-        })
-    
-    # Resumen de inventario por categoría
-    inventory_summary = Product.objects.values('category').annotate(
-        count=Count('id'),
-        total_stock=Sum('stock')
-    )
-    inventory_by_category = []
-    for item in inventory_summary:
-        category_display = dict(Product.CATEGORY_CHOICES).get(item['category'], item['category'])
-        inventory_by_category.append({
-            'category': category_display,
-            'count': item['count'],
-            'total_stock': item['total_stock'] or 0
-        })
-    
-    # Ventas por categoría (último mes)
-    sales_by_category = []
-    for category_code, category_name in Product.CATEGORY_CHOICES:
-        sales_count = SaleItem.objects.filter(
-            sale__created_at__date__gte=start_of_month,
-            product__category=category_code
-        ).aggregate(
-            total_quantity=Sum('quantity'),
-            total_amount=Sum('total_price')
-        )
-        
-        if sales_count['total_quantity']:
-            sales_by_category.append({
-                'category': category_name,
-                'quantity': sales_count['total_quantity'],
-                'amount': float(sales_count['total_amount'] or 0)
-            })
-    
-    # Productos con stock bajo/crítico
-    low_stock_products = Product.objects.filter(
-        status__in=['bajo', 'critico']
-    ).order_by('stock')[:10]
-    low_stock_data = []
-    for product in low_stock_products:
-        low_stock_data.append({
-            'id': product.id,
-            'name': product.name,
-            'code': product.code,
-            'stock': product.stock,
-            'status': product.get_status_display(),
-            'category': product.get_category_display()
-        })
-    
-    data = {
-        'dailySales': float(daily_sales),
-        'monthlySales': float(monthly_sales),
-        'appointments': today_appointments,
-        'inventory': total_inventory,
-        'consignments': consignments_count,
-        'recentSales': recent_sales_data,
-        'recentAppointments': recent_appointments_data,
-        'inventoryByCategory': inventory_by_category,
-        'salesByCategory': sales_by_category,
-        'lowStockProducts': low_stock_data,
-        'stats': {
-            'totalProducts': Product.objects.count(),
-            'totalPatients': Patient.objects.count(),
-            'pendingAppointments': Appointment.objects.filter(status='pendiente').count(),
-            'activeSales': Sale.objects.filter(status__in=['nuevo', 'en_proceso']).count()
-        }
-    }
-    
-    return JsonResponse(data)
+    return JsonResponse(dashboard.build(dashboard.today()))
 
 @csrf_exempt
 @require_http_methods(["GET", "POST"])
+@replica_reads
+@cached_response(Product)
 def products_view(request):
     """Vista para gestión de productos"""
     if request.method == 'GET':
-        # Get query parameters for filtering and pagination
-        search = request.GET.get('search', '')
-        category = request.GET.get('category', '')
-        supplier = request.GET.get('supplier', '')
-        product_type = request.GET.get('type', '')
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 10))
-
-        # Build query
-        products = Product.objects.all()
-
-        if search:
-            products = products.filter(
-                Q(name__icontains=search) | 
-                Q(category__icontains=search) | 
-                Q(supplier__icontains=search) |
-                Q(code__icontains=search)
+        # Paginate (con ?cursor= se usa keyset y el orden por relevancia no aplica)
+        try:
+            rows, pagination = paginate(
+                request,
+                listings.products(request.GET),
+                listings.PRODUCT_CURSOR_ORDERING,
             )
+        except InvalidPagination as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
 
-        if category:
-            products = products.filter(category=category)
-
-        if supplier:
-            products = products.filter(supplier__icontains=supplier)
-
-        if product_type:
-            products = products.filter(type=product_type)
-
-        # Paginate
-        paginator = Paginator(products, page_size)
-        page_obj = paginator.get_page(page)
-
-        # Serialize products
-        products_data = []
-        for product in page_obj:
-            products_data.append({
-                'id': product.id,
-                'code': product.code,
-                'name': product.name,
-                'category': product.get_category_display(),
-                'supplier': product.supplier,
-                'stock': product.stock,
-                'price': float(product.price),
-                'status': product.get_status_display(),
-                'type': product.get_type_display(),
-                'created_at': product.created_at.isoformat(),
-            })
-
-        # Get unique suppliers and categories for filters
-        suppliers = list(Product.objects.values_list('supplier', flat=True).distinct())
-        categories = [choice[0] for choice in Product.CATEGORY_CHOICES]
-        types = [choice[0] for choice in Product.TYPE_CHOICES]
-
-        return JsonResponse({
-            'products': products_data,
-            'pagination': {
-                'current_page': page,
-                'total_pages': paginator.num_pages,
-                'total_items': paginator.count,
-                'has_next': page_obj.has_next(),
-                'has_previous': page_obj.has_previous(),
-            },
-            'filters': {
-                'suppliers': suppliers,
-                'categories': categories,
-                'types': types,
-            }
-        })
+        # Facetas para los filtros (en caché, ver api.facets)
+        return JsonResponse(
+            listings.product_list(rows, pagination, facets.product_facets())
+        )
 
     elif request.method == 'POST':
         try:
@@ -235,103 +103,64 @@ def products_view(request):
 
 @csrf_exempt
 @require_http_methods(["GET"])
+@replica_reads
+@cached_response(Product)
+def product_facets_view(request):
+    """Facetas de productos: proveedores y conteos por categoría, tipo y estado"""
+    return JsonResponse({'filters': facets.product_facets()})
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@replica_reads
 def export_products_view(request):
-    """Export products to Excel"""
-    response = HttpResponse(content_type='application/ms-excel')
-    response['Content-Disposition'] = 'attachment; filename="productos.xls"'
-
-    wb = xlwt.Workbook(encoding='utf-8')
-    ws = wb.add_sheet('Productos')
-
-    # Header row
-    headers = ['Código', 'Nombre', 'Categoría', 'Proveedor', 'Stock', 'Precio', 'Estado', 'Tipo', 'Fecha Creación']
-    for col, header in enumerate(headers):
-        ws.write(0, col, header)
-
-    # Data rows
-    products = Product.objects.all()
-    for row, product in enumerate(products, 1):
-        ws.write(row, 0, product.code)
-        ws.write(row, 1, product.name)
-        ws.write(row, 2, product.get_category_display())
-        ws.write(row, 3, product.supplier)
-        ws.write(row, 4, product.stock)
-        ws.write(row, 5, float(product.price))
-        ws.write(row, 6, product.get_status_display())
-        ws.write(row, 7, product.get_type_display())
-        ws.write(row, 8, product.created_at.strftime('%Y-%m-%d %H:%M'))
-
-    wb.save(response)
-    return response
+    """Export products to Excel/CSV"""
+    return exports.export_response(request, exports.EXPORTS['productos'])
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def import_products_view(request):
+    """Importa productos desde un CSV o XLSX (campo ``file`` o cuerpo de la petición)"""
+    upload = request.FILES.get('file')
+    if upload is not None:
+        fileobj, filename = upload, upload.name
+    else:
+        fileobj, filename = request, ''
+    file_format = imports.detect_format(filename, request.GET.get('format', ''))
+    if upload is None and file_format == 'xlsx':
+        fileobj = io.BytesIO(request.body)
+    try:
+        result = imports.import_products(imports.read_rows(fileobj, file_format))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    return JsonResponse({
+        'success': True,
+        'message': (
+            f'{result.created} productos creados, {result.updated} actualizados, '
+            f'{result.error_count} filas con errores'
+        ),
+        **result.as_dict(),
+    })
 
 @csrf_exempt
 @require_http_methods(["GET", "POST"])
+@replica_reads
+@cached_response(Patient, PatientPurchaseHistory, Product)
 def patients_view(request):
     """Vista para gestión de pacientes"""
     if request.method == 'GET':
-        # Get query parameters
-        search = request.GET.get('search', '')
-        status = request.GET.get('status', '')
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 10))
-
-        # Build query
-        patients = Patient.objects.all()
-
-        if search:
-            patients = patients.filter(
-                Q(name__icontains=search) | 
-                Q(email__icontains=search) | 
-                Q(phone__icontains=search)
+        # Paginate (con ?cursor= se usa keyset y el orden por relevancia no aplica)
+        try:
+            rows, pagination = paginate(
+                request,
+                listings.patients(request.GET),
+                listings.PATIENT_CURSOR_ORDERING,
             )
-
-        if status:
-            patients = patients.filter(status=status)
-
-        # Paginate
-        paginator = Paginator(patients, page_size)
-        page_obj = paginator.get_page(page)
+        except InvalidPagination as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
 
         # Serialize patients with purchase history
-        patients_data = []
-        for patient in page_obj:
-            # Get purchase history
-            purchase_history = PatientPurchaseHistory.objects.filter(patient=patient)[:5]
-            history_data = []
-            for purchase in purchase_history:
-                history_data.append({
-                    'product': purchase.product.name,
-                    'quantity': purchase.quantity,
-                    'price': float(purchase.price),
-                    'date': purchase.date.isoformat(),
-                })
-
-            patients_data.append({
-                'id': patient.id,
-                'name': patient.name,
-                'email': patient.email,
-                'phone': patient.phone,
-                'status': patient.get_status_display(),
-                'address': patient.address,
-                'notes': patient.notes,
-                'created_at': patient.created_at.isoformat(),
-                'purchase_history': history_data,
-                'total_purchases': purchase_history.count(),
-            })
-
-        return JsonResponse({
-            'patients': patients_data,
-            'pagination': {
-                'current_page': page,
-                'total_pages': paginator.num_pages,
-                'total_items': paginator.count,
-                'has_next': page_obj.has_next(),
-                'has_previous': page_obj.has_previous(),
-            },
-            'filters': {
-                'statuses': [choice[0] for choice in Patient.STATUS_CHOICES],
-            }
-        })
+        history = listings.recent_purchases([row['id'] for row in rows])
+        return JsonResponse(listings.patient_list(rows, history, pagination))
 
     elif request.method == 'POST':
         try:
@@ -362,119 +191,457 @@ def patients_view(request):
 
 @csrf_exempt
 @require_http_methods(["GET"])
+@replica_reads
+@cached_response(Patient, Sale)
+def patient_analytics_view(request):
+    """Valor de vida, frecuencia de compra y segmentos RFM de los pacientes"""
+    try:
+        top = int(request.GET.get('top', analytics.TOP_DEFAULT))
+        if not 1 <= top <= analytics.TOP_MAX:
+            raise ValueError(f'top debe estar entre 1 y {analytics.TOP_MAX}')
+        segment = request.GET.get('segment', '')
+        cells = analytics.cells()
+        cuts = analytics.thresholds(cells)
+        segment_totals = analytics.segments(cells, cuts)
+        patients = analytics.patients(cuts, segment, request.GET.get('order', 'spend'))
+        # Los totales por segmento ya dan el tamaño de la lista
+        count = (
+            segment_totals[segment]['patients']
+            if segment
+            else sum(entry['patients'] for entry in segment_totals.values())
+        )
+        rows, pagination = paginate(request, patients, count=count)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    return JsonResponse(analytics.patient_analytics(
+        cuts, segment_totals, list(analytics.top_patients(top)), rows, pagination,
+    ))
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@replica_reads
 def export_patients_view(request):
-    """Export patients to Excel"""
-    response = HttpResponse(content_type='application/ms-excel')
-    response['Content-Disposition'] = 'attachment; filename="pacientes.xls"'
-
-    wb = xlwt.Workbook(encoding='utf-8')
-    ws = wb.add_sheet('Pacientes')
-
-    # Header row
-    headers = ['Nombre', 'Email', 'Teléfono', 'Estado', 'Dirección', 'Notas', 'Total Compras', 'Fecha Registro']
-    for col, header in enumerate(headers):
-        ws.write(0, col, header)
-
-    # Data rows
-    patients = Patient.objects.all()
-    for row, patient in enumerate(patients, 1):
-        total_purchases = PatientPurchaseHistory.objects.filter(patient=patient).count()
-        ws.write(row, 0, patient.name)
-        ws.write(row, 1, patient.email)
-        ws.write(row, 2, patient.phone)
-        ws.write(row, 3, patient.get_status_display())
-        ws.write(row, 4, patient.address or '')
-        ws.write(row, 5, patient.notes or '')
-        ws.write(row, 6, total_purchases)
-        ws.write(row, 7, patient.created_at.strftime('%Y-%m-%d %H:%M'))
-
-    wb.save(response)
-    return response
+    """Export patients to Excel/CSV"""
+    return exports.export_response(request, exports.EXPORTS['pacientes'])
 
 @csrf_exempt
 @require_http_methods(["GET", "POST"])
+@replica_reads
+@cached_response(Appointment, Patient)
 def appointments_view(request):
     """Vista para gestión de citas"""
     if request.method == 'GET':
-        appointments = [
-            {'id': 1, 'patient': 'Ana Martín', 'date': '2024-01-16', 'time': '10:00', 'type': 'Examen Visual', 'status': 'Confirmada'},
-            {'id': 2, 'patient': 'Luis Pérez', 'date': '2024-01-16', 'time': '11:30', 'type': 'Control', 'status': 'Pendiente'},
-        ]
-        return JsonResponse({'appointments': appointments})
+        try:
+            start, end = scheduling.parse_range(request.GET)
+        except scheduling.ScheduleError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+        rows = listings.appointments(start, end, request.GET)
+        return JsonResponse(listings.appointment_list(rows, start, end))
 
     elif request.method == 'POST':
-        data = json.loads(request.body)
-        return JsonResponse({'success': True, 'message': 'Cita agendada exitosamente'})
+        try:
+            data = json.loads(request.body)
+            appointment = scheduling.book(data)
+        except scheduling.SlotTaken as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=409)
+        except (ValueError, KeyError, TypeError) as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+        return JsonResponse({
+            'success': True,
+            'message': 'Cita agendada exitosamente',
+            'appointment': {
+                'id': appointment.id,
+                'date': appointment.date.strftime('%Y-%m-%d'),
+                'time': appointment.time.strftime('%H:%M'),
+                'doctor': appointment.doctor,
+                'status': appointment.get_status_display(),
+            },
+        })
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@cached_response(Appointment)
+def appointment_availability_view(request):
+    """Horarios libres por doctor (por defecto, la semana desde hoy)"""
+    try:
+        start, end = scheduling.parse_range(request.GET)
+    except scheduling.ScheduleError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    doctors = request.GET.getlist('doctor')
+    return JsonResponse({
+        'slot_minutes': scheduling.SLOT_MINUTES,
+        'range': {'start': start.isoformat(), 'end': end.isoformat()},
+        'availability': scheduling.availability(start, end, doctors),
+    })
 
 @csrf_exempt
 @require_http_methods(["GET", "POST"])
+@replica_reads
+@cached_response(Sale, SaleItem, Patient, Product)
 def sales_view(request):
     """Vista para gestión de ventas"""
     if request.method == 'GET':
-        sales = [
-            {'id': 1, 'customer': 'María González', 'amount': 350, 'date': '2024-01-15', 'status': 'Entregado'},
-            {'id': 2, 'customer': 'Carlos López', 'amount': 520, 'date': '2024-01-15', 'status': 'En Proceso'},
-        ]
-        return JsonResponse({'sales': sales})
+        try:
+            rows, pagination = paginate(request, listings.sales(request.GET))
+        except (InvalidPagination, listings.InvalidFilter) as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+        items = listings.sale_items([row['id'] for row in rows])
+        return JsonResponse(listings.sale_list(rows, items, pagination))
 
     elif request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            sales = create_sales(data)
+        except (stock.InsufficientStock, stock.ReservationNotFound) as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=409)
+        except (ValueError, KeyError, TypeError) as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+        return JsonResponse({
+            'success': True,
+            'message': (
+                'Venta registrada exitosamente'
+                if len(sales) == 1
+                else f'{len(sales)} ventas registradas exitosamente'
+            ),
+            'sales': [
+                {
+                    'id': sale.id,
+                    'order_number': sale.order_number,
+                    'amount': float(sale.total_amount),
+                    'status': sale.get_status_display(),
+                }
+                for sale in sales
+            ],
+        })
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def stock_reservations_view(request):
+    """Aparta stock para una orden en curso"""
+    try:
         data = json.loads(request.body)
-        return JsonResponse({'success': True, 'message': 'Venta registrada exitosamente'})
+        quantities = {}
+        for item in data['items']:
+            product_id, quantity = int(item['product']), int(item.get('quantity', 1))
+            if quantity <= 0:
+                raise ValueError('quantity debe ser un entero positivo')
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        ttl = (
+            timedelta(seconds=int(data['ttl_seconds']))
+            if data.get('ttl_seconds')
+            else stock.RESERVATION_TTL
+        )
+        token = stock.reserve(quantities, ttl=ttl)
+    except stock.InsufficientStock as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=409)
+    except (ValueError, KeyError, TypeError) as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    return JsonResponse({
+        'success': True,
+        'message': 'Stock reservado',
+        'token': str(token),
+        'expires_in': int(ttl.total_seconds()),
+    })
+
+@csrf_exempt
+@require_http_methods(["DELETE"])
+def stock_reservation_detail_view(request, token):
+    """Libera una reserva de stock"""
+    if not stock.release(token):
+        return JsonResponse(
+            {'success': False, 'message': 'Reserva no encontrada'}, status=404
+        )
+    return JsonResponse({'success': True, 'message': 'Reserva liberada'})
 
 @csrf_exempt
 @require_http_methods(["GET", "POST"])
+@replica_reads
+@cached_response(Purchase, PurchaseItem)
 def purchases_view(request):
     """Vista para gestión de compras"""
     if request.method == 'GET':
-        purchases = [
-            {'id': 1, 'supplier': 'Proveedor A', 'amount': 1200, 'date': '2024-01-10', 'status': 'Recibido'},
-            {'id': 2, 'supplier': 'Proveedor B', 'amount': 800, 'date': '2024-01-12', 'status': 'Pendiente'},
-        ]
-        return JsonResponse({'purchases': purchases})
+        status = request.GET.get('status', '')
+        supplier = request.GET.get('supplier', '')
+
+        purchases = Purchase.objects.annotate(item_count=Count('items'))
+
+        if status:
+            purchases = purchases.filter(status=status)
+
+        if supplier:
+            purchases = purchases.filter(supplier__icontains=supplier)
+
+        try:
+            rows, pagination = paginate(
+                request,
+                serializers.PURCHASE_LIST.values(purchases.order_by('-created_at')),
+            )
+        except InvalidPagination as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+        return JsonResponse({
+            'purchases': serializers.PURCHASE_LIST.serialize(rows),
+            'pagination': pagination,
+            'filters': {
+                'statuses': [choice[0] for choice in Purchase.STATUS_CHOICES],
+            }
+        })
 
     elif request.method == 'POST':
-        data = json.loads(request.body)
-        return JsonResponse({'success': True, 'message': 'Compra registrada exitosamente'})
+        try:
+            data = json.loads(request.body)
+            purchase = create_purchase(data)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+        return JsonResponse({
+            'success': True,
+            'message': 'Compra registrada exitosamente',
+            'purchase': _purchase_data(purchase),
+        })
+
+def _purchase_data(purchase):
+    return {
+        'id': purchase.id,
+        'purchase_number': purchase.purchase_number,
+        'supplier': purchase.supplier,
+        'amount': float(purchase.total_amount),
+        'status': purchase.get_status_display(),
+        'received_at': (
+            purchase.received_at.strftime('%Y-%m-%d %H:%M')
+            if purchase.received_at
+            else None
+        ),
+    }
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def receive_purchase_view(request, pk):
+    """Marca la compra como recibida y suma sus productos al stock (idempotente)"""
+    try:
+        purchase, received = receive_purchase(pk)
+    except Purchase.DoesNotExist:
+        return JsonResponse(
+            {'success': False, 'message': 'Compra no encontrada'}, status=404
+        )
+    except PurchaseNotReceivable as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=409)
+    return JsonResponse({
+        'success': True,
+        'message': (
+            'Compra recibida exitosamente'
+            if received
+            else 'La compra ya estaba recibida'
+        ),
+        'purchase': _purchase_data(purchase),
+    })
 
 @csrf_exempt
 @require_http_methods(["GET", "POST"])
+@replica_reads
+@cached_response(ConsignmentMovement, Sale, SaleItem, Product)
 def consignments_view(request):
     """Vista para gestión de consignaciones"""
     if request.method == 'GET':
-        consignments = [
-            {'id': 1, 'supplier': 'Telko', 'product': 'Lentes Premium', 'quantity': 10, 'status': 'Activa'},
-            {'id': 2, 'supplier': 'Telko', 'product': 'Armazones Designer', 'quantity': 5, 'status': 'Vendida'},
-        ]
-        return JsonResponse({'consignments': consignments})
+        supplier = request.GET.get('supplier', '')
+        try:
+            until = (
+                date.fromisoformat(request.GET['date'])
+                if request.GET.get('date')
+                else None
+            )
+        except ValueError:
+            return JsonResponse(
+                {
+                    'success': False,
+                    'message': 'Fecha inválida, use el formato YYYY-MM-DD',
+                },
+                status=400,
+            )
+
+        rows, suppliers = consignments.balances(until, supplier)
+        return JsonResponse({
+            'consignments': [
+                {
+                    'supplier': row['supplier'],
+                    'product_id': row['product_id'],
+                    'product': row['product'],
+                    'received': row['received'],
+                    'returned': row['returned'],
+                    'sold': row['sold'],
+                    'balance': row['balance'],
+                    'status': 'Activa' if row['balance'] > 0 else 'Cerrada',
+                }
+                for row in rows
+            ],
+            'suppliers': [
+                {**entry, 'sold_amount': float(entry['sold_amount'])}
+                for entry in suppliers
+            ],
+        })
 
     elif request.method == 'POST':
-        data = json.loads(request.body)
-        return JsonResponse({'success': True, 'message': 'Consignación registrada exitosamente'})
+        try:
+            data = json.loads(request.body)
+            movement = consignments.record_movement(data)
+        except stock.InsufficientStock as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=409)
+        except (ValueError, KeyError, TypeError) as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+        return JsonResponse({
+            'success': True,
+            'message': 'Consignación registrada exitosamente',
+            'movement': {
+                'id': movement.id,
+                'supplier': movement.supplier,
+                'product_id': movement.product_id,
+                'kind': movement.get_kind_display(),
+                'quantity': movement.quantity,
+                'date': movement.date.strftime('%Y-%m-%d'),
+            },
+        })
 
 @csrf_exempt
 @require_http_methods(["GET"])
+@replica_reads
+@cached_response(ConsignmentMovement, Sale, SaleItem, Product)
+def consignment_settlement_view(request):
+    """Liquidación de consignaciones por período (por defecto, el mes en curso)"""
+    today = timezone.localdate()
+    try:
+        start = (
+            date.fromisoformat(request.GET['start'])
+            if request.GET.get('start')
+            else today.replace(day=1)
+        )
+        end = (
+            date.fromisoformat(request.GET['end']) if request.GET.get('end') else today
+        )
+    except ValueError:
+        return JsonResponse(
+            {'success': False, 'message': 'Fecha inválida, use el formato YYYY-MM-DD'},
+            status=400,
+        )
+    if end < start:
+        return JsonResponse(
+            {'success': False, 'message': 'La fecha final es anterior a la inicial'},
+            status=400,
+        )
+
+    rows = consignments.settlement(start, end, request.GET.get('supplier', ''))
+    return JsonResponse({
+        'period': {'start': start.isoformat(), 'end': end.isoformat()},
+        'settlement': [
+            {**row, 'sold_amount': float(row['sold_amount'])}
+            for row in rows
+        ],
+    })
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@replica_reads
 def export_purchases_view(request):
-    """Export purchases to Excel"""
-    response = HttpResponse(content_type='application/ms-excel')
-    response['Content-Disposition'] = 'attachment; filename="compras.xls"'
-
-    wb = xlwt.Workbook(encoding='utf-8')
-    ws = wb.add_sheet('Compras')
-
-    # Header row
-    headers = ['Número', 'Proveedor', 'Valor Total', 'Estado', 'Notas', 'Fecha Creación']
-    for col, header in enumerate(headers):
-        ws.write(0, col, header)
-
-    # Data rows
-    purchases = Purchase.objects.all()
-    for row, purchase in enumerate(purchases, 1):
-        ws.write(row, 0, purchase.purchase_number)
-        ws.write(row, 1, purchase.supplier)
-        ws.write(row, 2, float(purchase.total_amount))
-        ws.write(row, 3, purchase.get_status_display())
-        ws.write(row, 4, purchase.notes or '')
-        ws.write(row, 5, purchase.created_at.strftime('%Y-%m-%d %H:%M'))
-
-    wb.save(response)
-    return response
\ No newline at end of file
+    """Export purchases to Excel/CSV"""
+    return exports.export_response(request, exports.EXPORTS['compras'])
+
+def _export_job_data(job):
+    return {
+        'token': str(job.token),
+        'export': job.export,
+        'format': job.format,
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def export_jobs_view(request):
+    """Encola una exportación en segundo plano (la ejecuta el comando run_jobs)"""
+    try:
+        data = json.loads(request.body)
+        job, created = jobs.enqueue(data['export'], data.get('format', ''))
+    except (ValueError, KeyError, TypeError) as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    return JsonResponse(
+        {
+            'success': True,
+            'message': (
+                'Exportación encolada'
+                if created
+                else 'Ya hay una exportación igual en curso'
+            ),
+            'deduplicated': not created,
+            'job': _export_job_data(job),
+        },
+        status=202,
+    )
+
+@csrf_exempt
+@require_http_methods(["GET", "DELETE"])
+def export_job_detail_view(request, token):
+    """Estado y avance de una exportación en segundo plano; DELETE la cancela"""
+    if request.method == 'DELETE':
+        if not jobs.cancel(token):
+            return JsonResponse(
+                {
+                    'success': False,
+                    'message': 'Exportación no encontrada o ya terminada',
+                },
+                status=404,
+            )
+        return JsonResponse({'success': True, 'message': 'Exportación cancelada'})
+
+    try:
+        job = ExportJob.objects.get(token=token)
+    except ExportJob.DoesNotExist:
+        return JsonResponse(
+            {'success': False, 'message': 'Exportación no encontrada'}, status=404
+        )
+    return JsonResponse({'job': _export_job_data(job)})
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def export_job_download_view(request, token):
+    """Descarga el archivo de una exportación terminada"""
+    try:
+        job = ExportJob.objects.get(token=token)
+    except ExportJob.DoesNotExist:
+        return JsonResponse(
+            {'success': False, 'message': 'Exportación no encontrada'}, status=404
+        )
+    if job.status != 'completado':
+        return JsonResponse(
+            {
+                'success': False,
+                'message': f'La exportación está {job.get_status_display().lower()}',
+            },
+            status=409,
+        )
+    try:
+        # FileResponse es dueña del archivo y lo cierra al terminar de enviarlo
+        return FileResponse(
+            open(job.file_path, 'rb'),
+            as_attachment=True,
+            filename=f'{job.export}.{job.format}',
+            content_type=exports.FORMATS[job.format],
+        )
+    except OSError:
+        return JsonResponse(
+            {'success': False, 'message': 'El archivo ya no está disponible'},
+            status=404,
+        )
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """Métricas de la API en formato de texto de Prometheus"""
+    if not metrics.is_allowed(request):
+        return JsonResponse({'success': False, 'message': 'No encontrado'}, status=404)
+    return HttpResponse(
+        metrics.registry.render(), content_type=metrics.PROMETHEUS_CONTENT_TYPE
+    )
\ No newline at end of file
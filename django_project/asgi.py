@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'django_project.settings')
+# Bajo ASGI el dashboard y los listados usan las vistas asíncronas (api.async_views)
+os.environ.setdefault('API_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -13,6 +13,9 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 import os
 from pathlib import Path
 
+import django
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -43,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,12 +83,147 @@ WSGI_APPLICATION = 'django_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE: sqlite (por defecto) o postgresql, configurado con las variables
+# de libpq (PGHOST, PGPORT, PGDATABASE, PGUSER, PGPASSWORD). Con
+# DB_REPLICA_HOST (o SQLITE_REPLICA_PATH) se agrega la base ``replica``, de la
+# que leen el dashboard, los listados y las exportaciones (ver api.routers).
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+# SQLITE_PROFILE: production (WAL y PRAGMA de rendimiento en cada conexión,
+# conexiones persistentes) o default (SQLite sin configurar). Ver api.sqlite.
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'production')
+
+
+def _postgresql_database(host, port):
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('PGDATABASE', 'postgres'),
+        'USER': os.environ.get('PGUSER', 'postgres'),
+        'PASSWORD': os.environ.get('PGPASSWORD', ''),
+        'HOST': host,
+        'PORT': port,
+        'CONN_HEALTH_CHECKS': True,
+    }
+    if django.VERSION >= (5, 1):
+        # Pool de conexiones de psycopg (requiere psycopg[pool]); reemplaza CONN_MAX_AGE
+        database['OPTIONS'] = {'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }}
+    else:
+        database['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+    return database
+
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': _postgresql_database(
+            os.environ.get('PGHOST', 'localhost'), os.environ.get('PGPORT', '5432')
+        ),
+    }
+    if os.environ.get('DB_REPLICA_HOST'):
+        DATABASES['replica'] = _postgresql_database(
+            os.environ['DB_REPLICA_HOST'],
+            os.environ.get('DB_REPLICA_PORT', os.environ.get('PGPORT', '5432')),
+        )
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            # Reusar la conexión entre peticiones evita reabrir el archivo y los PRAGMA
+            'CONN_MAX_AGE': int(
+                os.environ.get(
+                    'DB_CONN_MAX_AGE', 60 if SQLITE_PROFILE == 'production' else 0
+                )
+            ),
+            'CONN_HEALTH_CHECKS': True,
+            # Base de pruebas en archivo: en memoria los hilos de las pruebas de
+            # concurrencia comparten caché y fallan en vez de esperar el bloqueo
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+    if os.environ.get('SQLITE_REPLICA_PATH'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'NAME': os.environ['SQLITE_REPLICA_PATH'],
+        }
+else:
+    raise ImproperlyConfigured(
+        f'DB_ENGINE desconocido "{DB_ENGINE}", use sqlite o postgresql'
+    )
+
+if 'replica' in DATABASES:
+    # En las pruebas la réplica es la misma base que la primaria
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['api.routers.ReplicaRouter']
+
+# Cache
+# API_CACHE_BACKEND elige el backend: locmem (por defecto, por proceso),
+# file (compartido entre procesos de la misma máquina) o redis (REDIS_URL).
+API_CACHE_BACKEND = os.environ.get('API_CACHE_BACKEND', 'locmem')
+
+if API_CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0'),
+        }
+    }
+elif API_CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('API_CACHE_DIR', BASE_DIR / '.cache' / 'django'),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'optica-api',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# Las versiones de api.response_cache tienen que verse desde todos los
+# procesos (servidor, run_jobs, import_products, seed_data...), que también
+# escriben. Con locmem van a una caché en archivos aparte; file y redis ya
+# se comparten. Una caché de versiones locmem es un error de configuración.
+if API_CACHE_BACKEND == 'locmem':
+    CACHES['api_versions'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'API_CACHE_VERSIONS_DIR', BASE_DIR / '.cache' / 'api-versions'
+        ),
     }
-}
+    API_CACHE_VERSION_ALIAS = 'api_versions'
+
+# Caché de respuestas GET de la API (ver api.response_cache)
+API_CACHE_ENABLED = os.environ.get('API_CACHE_ENABLED', '1') != '0'
+API_CACHE_TIMEOUT = int(os.environ.get('API_CACHE_TIMEOUT', 300))
+
+# Codificación JSON de las respuestas (ver api.serializers): auto usa
+# orjson si está instalado; json fuerza el codificador estándar.
+API_JSON_BACKEND = os.environ.get('API_JSON_BACKEND', 'auto')
+
+# Vistas asíncronas del dashboard y los listados (ver api.async_views);
+# django_project.asgi las activa por defecto.
+API_ASYNC_VIEWS = os.environ.get('API_ASYNC_VIEWS', '0') != '0'
+
+# Métricas por endpoint de la API en /api/_metrics (ver api.metrics)
+API_METRICS_ENABLED = os.environ.get('API_METRICS_ENABLED', '1') != '0'
+API_METRICS_SERVER_TIMING = os.environ.get('API_METRICS_SERVER_TIMING', '0') != '0'
+# Token para leer /api/_metrics sin sesión de staff (Authorization: Bearer ...)
+API_METRICS_TOKEN = os.environ.get('API_METRICS_TOKEN', '')
+
+# Exportaciones en segundo plano (ver api.jobs y el comando run_jobs)
+EXPORT_JOBS_DIR = Path(
+    os.environ.get('EXPORT_JOBS_DIR', BASE_DIR / 'media' / 'exports')
+)
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators